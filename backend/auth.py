@@ -5,12 +5,13 @@ from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError, jwt
 from passlib.context import CryptContext
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from google.oauth2 import id_token
 from google.auth.transport import requests as google_requests
 
 from config import get_settings
-from database import get_db
+from database import get_async_db, get_db
 from models import User
 
 
@@ -46,35 +47,63 @@ def get_user_by_email(db: Session, email: str) -> Optional[User]:
     return db.query(User).filter(User.email == email).first()
 
 
-def get_current_user(
-    token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)
-) -> User:
-    credentials_exception = HTTPException(
-        status_code=status.HTTP_401_UNAUTHORIZED,
-        detail="Could not validate credentials",
-        headers={"WWW-Authenticate": "Bearer"},
-    )
+def decode_user_id(token: str) -> Optional[int]:
+    """The user id in a JWT access token, or None if the token is invalid."""
     try:
         payload = jwt.decode(
             token, settings.jwt_secret_key, algorithms=[settings.jwt_algorithm]
         )
         user_id = payload.get("sub")
         if user_id is None:
-            raise credentials_exception
+            return None
     except JWTError:
-        raise credentials_exception
+        return None
 
     try:
-        user_id_int = int(user_id)
+        return int(user_id)
     except (ValueError, TypeError):
-        raise credentials_exception
+        return None
+
+
+def get_user_from_token(db: Session, token: str) -> Optional[User]:
+    """Decode a JWT access token and load its user. Returns None if invalid."""
+    user_id = decode_user_id(token)
+    return db.get(User, user_id) if user_id is not None else None
+
 
-    user = db.get(User, user_id_int)
+async def get_user_from_token_async(db: AsyncSession, token: str) -> Optional[User]:
+    user_id = decode_user_id(token)
+    return await db.get(User, user_id) if user_id is not None else None
+
+
+def get_current_user(
+    token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)
+) -> User:
+    credentials_exception = HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Could not validate credentials",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+    user = get_user_from_token(db, token)
     if user is None:
         raise credentials_exception
     return user
 
 
+async def get_current_user_async(
+    token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_async_db)
+) -> User:
+    """get_current_user for async endpoints, on the async session."""
+    user = await get_user_from_token_async(db, token)
+    if user is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Could not validate credentials",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    return user
+
+
 def verify_google_token(token: str, client_id: str) -> Optional[dict]:
     """
     Verify a Google ID token and return the user info.
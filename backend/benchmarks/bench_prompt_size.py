@@ -0,0 +1,150 @@
+"""
+Benchmark counsellor system prompt size: the original full prompt (first 10
+catalog rows) vs the ranked full prompt vs the compact prompt.
+
+Run with: python backend/benchmarks/bench_prompt_size.py
+Uses tiktoken for exact counts when it is installed, alongside the built-in
+estimate.
+"""
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import llm
+import university_ranking
+from seed_universities import UNIVERSITIES
+
+try:
+    import tiktoken
+
+    _encoding = tiktoken.get_encoding("cl100k_base")
+except ImportError:
+    _encoding = None
+
+
+CATALOG = [{"id": i + 1, **u} for i, u in enumerate(UNIVERSITIES)]
+
+
+def _link(university_id: int, status: str, category: str) -> dict:
+    uni = CATALOG[university_id - 1]
+    return {
+        "id": university_id,
+        "university_id": university_id,
+        "status": status,
+        "category": category,
+        "university": {
+            "name": uni["name"],
+            "country": uni["country"],
+            "tuition_per_year": uni["tuition_per_year"],
+        },
+    }
+
+
+PROFILES = {
+    "new student, no shortlist": (
+        {
+            "current_education_level": "bachelors",
+            "degree_major": "Computer Science",
+            "graduation_year": 2025,
+            "gpa": None,
+            "intended_degree": "masters",
+            "field_of_study": "Data Science",
+            "target_intake_year": 2026,
+            "preferred_countries": ["Germany", "Netherlands"],
+            "budget_per_year": 20000,
+            "funding_plan": "loan",
+            "ielts_toefl_status": "not_started",
+            "gre_gmat_status": "not_started",
+            "sop_status": "not_started",
+        },
+        "discovering_universities",
+        [],
+    ),
+    "shortlisting, UK/US": (
+        {
+            "current_education_level": "bachelors",
+            "degree_major": "Electrical Engineering",
+            "graduation_year": 2024,
+            "gpa": 8.4,
+            "intended_degree": "MS",
+            "field_of_study": "Computer Science",
+            "target_intake_year": 2026,
+            "preferred_countries": ["UK", "United States"],
+            "budget_per_year": 40000,
+            "funding_plan": "self",
+            "ielts_toefl_status": "completed",
+            "gre_gmat_status": "in_progress",
+            "sop_status": "draft",
+        },
+        "finalizing_universities",
+        [_link(5, "shortlisted", "target"), _link(11, "shortlisted", "target"), _link(8, "shortlisted", "dream")],
+    ),
+    "MBA, locked": (
+        {
+            "current_education_level": "masters",
+            "degree_major": "Finance",
+            "graduation_year": 2020,
+            "gpa": 3.6,
+            "intended_degree": "mba",
+            "field_of_study": "Business Administration",
+            "target_intake_year": 2026,
+            "preferred_countries": ["France", "UK", "USA"],
+            "budget_per_year": 90000,
+            "funding_plan": "scholarship",
+            "ielts_toefl_status": "completed",
+            "gre_gmat_status": "completed",
+            "sop_status": "ready",
+        },
+        "preparing_applications",
+        [_link(36, "locked", "dream"), _link(37, "shortlisted", "dream")],
+    ),
+}
+
+
+def _count(text: str) -> str:
+    estimate = llm.estimate_tokens(text)
+    if _encoding is None:
+        return f"{len(text):>6} chars  ~{estimate:>5} tok"
+    return f"{len(text):>6} chars  ~{estimate:>5} tok ({len(_encoding.encode(text))} exact)"
+
+
+def main() -> None:
+    for name, (profile, stage, links) in PROFILES.items():
+        ranked = university_ranking.rank_universities(
+            profile,
+            CATALOG,
+            top_k=10,
+            exclude_ids={link["university_id"] for link in links},
+        )
+
+        before = llm.build_system_prompt(
+            profile, stage, links, CATALOG[:10], catalog_size=len(CATALOG), compact=False
+        )
+        full = llm.build_system_prompt(
+            profile,
+            stage,
+            links,
+            ranked,
+            catalog_size=len(CATALOG),
+            universities_token_budget=400,
+            compact=False,
+        )
+        compact = llm.build_system_prompt(
+            profile, stage, links, ranked, catalog_size=len(CATALOG), compact=True, token_budget=1200
+        )
+        compact_tight = llm.build_system_prompt(
+            profile, stage, links, ranked, catalog_size=len(CATALOG), compact=True, token_budget=500
+        )
+
+        print(f"== {name}")
+        print(f"  full, first 10 rows   {_count(before)}")
+        print(f"  full, ranked          {_count(full)}")
+        print(f"  compact (1200 budget) {_count(compact)}")
+        print(f"  compact (500 budget)  {_count(compact_tight)}")
+        saved = 1 - llm.estimate_tokens(compact) / llm.estimate_tokens(before)
+        print(f"  compact saves ~{saved:.0%} of prompt tokens")
+
+
+if __name__ == "__main__":
+    main()
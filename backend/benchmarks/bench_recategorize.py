@@ -0,0 +1,173 @@
+"""
+Benchmark recategorizing shortlisted universities over 1M links: the
+set-based UPDATE ... FROM (all at once, per user, and batched) against
+loading links into the ORM and updating them row by row (on a sample,
+extrapolated).
+
+Needs Postgres (DATABASE_URL). Everything runs inside one outer transaction
+that is rolled back at the end, so the database is left as it was.
+
+Run with: python backend/benchmarks/bench_recategorize.py [links] [links_per_user]
+"""
+import os
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session, joinedload
+
+import models
+import shortlist_categories
+import university_ranking
+from database import Base, engine
+
+UNIVERSITIES = 2000
+ORM_SAMPLE = 20_000
+
+
+def _populate(db: Session, links: int, per_user: int) -> tuple[int, int]:
+    """Synthetic users, profiles, universities and links; returns (first user id, last user id)."""
+    users = links // per_user
+    first_user, last_user = db.execute(
+        text(
+            """
+            WITH inserted AS (
+                INSERT INTO users (full_name, email, hashed_password, created_at)
+                SELECT 'Bench ' || g, 'bench-' || g || '-' || md5(random()::text) || '@example.com', 'x', now()
+                FROM generate_series(1, :users) AS g
+                RETURNING id
+            )
+            SELECT min(id), max(id) FROM inserted
+            """
+        ),
+        {"users": users},
+    ).one()
+    db.execute(
+        text(
+            """
+            INSERT INTO profiles (
+                user_id, current_education_level, degree_major, graduation_year, intended_degree,
+                field_of_study, target_intake_year, preferred_countries, budget_per_year, funding_plan,
+                ielts_toefl_status, gre_gmat_status, sop_status, current_stage, is_complete
+            )
+            SELECT id, 'bachelors', 'Computer Science', 2024, 'masters', 'Computer Science', 2026,
+                   'Germany', 5000 + (id % 60) * 1000, 'self',
+                   'NOT_STARTED', 'NOT_STARTED', 'NOT_STARTED', 'DISCOVERING_UNIVERSITIES', true
+            FROM users WHERE id BETWEEN :first AND :last
+            """
+        ),
+        {"first": first_user, "last": last_user},
+    )
+    first_uni = db.execute(
+        text(
+            """
+            WITH inserted AS (
+                INSERT INTO universities (
+                    name, country, city, field_of_study, degree_level, tuition_per_year,
+                    cost_level, competition_level, base_acceptance_chance
+                )
+                SELECT 'Bench University ' || g, 'Germany', 'Berlin', 'Computer Science', 'masters',
+                       (g * 37) % 70000, 'MEDIUM',
+                       (ARRAY['LOW', 'MEDIUM', 'HIGH'])[1 + g % 3]::risklevelenum, 'MEDIUM'
+                FROM generate_series(1, :count) AS g
+                RETURNING id
+            )
+            SELECT min(id) FROM inserted
+            """
+        ),
+        {"count": UNIVERSITIES},
+    ).scalar()
+    # Every link starts as TARGET, so roughly two thirds change on the first pass
+    db.execute(
+        text(
+            """
+            INSERT INTO user_universities (user_id, university_id, category, status, acceptance_chance, created_at)
+            SELECT u.id, :first_uni + ((u.id * 7919 + k * 104729) % :count), 'TARGET', 'SHORTLISTED', 'MEDIUM', now()
+            FROM users u, generate_series(0, :per_user - 1) AS k
+            WHERE u.id BETWEEN :first AND :last
+            ON CONFLICT DO NOTHING
+            """
+        ),
+        {"first_uni": first_uni, "count": UNIVERSITIES, "per_user": per_user, "first": first_user, "last": last_user},
+    )
+    return first_user, last_user
+
+
+def _reset(db: Session, first_user: int, last_user: int) -> None:
+    db.execute(
+        text("UPDATE user_universities SET category = 'TARGET' WHERE user_id BETWEEN :first AND :last"),
+        {"first": first_user, "last": last_user},
+    )
+
+
+def _timed(label: str, fn) -> float:
+    started = time.perf_counter()
+    result = fn()
+    elapsed = time.perf_counter() - started
+    print(f"  {label:<40} {elapsed * 1000:9.0f} ms  ({result} rows changed)")
+    return elapsed
+
+
+def _orm_loop(db: Session, first_user: int, limit: int) -> int:
+    """The per-row alternative: load links with their university and profile, update in Python."""
+    changed = 0
+    links = (
+        db.query(models.UserUniversity)
+        .options(
+            joinedload(models.UserUniversity.university),
+            joinedload(models.UserUniversity.user).joinedload(models.User.profile),
+        )
+        .filter(models.UserUniversity.user_id >= first_user)
+        .order_by(models.UserUniversity.id)
+        .limit(limit)
+        .all()
+    )
+    for link in links:
+        category = models.UniversityCategoryEnum(
+            university_ranking.categorize(
+                link.university.tuition_per_year,
+                link.university.competition_level.value,
+                link.user.profile.budget_per_year,
+            )
+        )
+        if link.category != category:
+            link.category = category
+            changed += 1
+    db.flush()
+    return changed
+
+
+def main() -> None:
+    links = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    per_user = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+    Base.metadata.create_all(bind=engine)
+
+    with engine.connect() as connection:
+        outer = connection.begin()
+        # Commits inside (recategorize_all) only release savepoints
+        db = Session(bind=connection, join_transaction_mode="create_savepoint")
+        try:
+            started = time.perf_counter()
+            first_user, last_user = _populate(db, links, per_user)
+            db.execute(text("ANALYZE user_universities"))
+            print(f"== {links} links over {last_user - first_user + 1} users (setup {time.perf_counter() - started:.1f} s)")
+
+            _timed("set-based, one statement", lambda: db.execute(shortlist_categories.recategorize_statement()).rowcount)
+            _timed("set-based, again (nothing to change)", lambda: db.execute(shortlist_categories.recategorize_statement()).rowcount)
+            _reset(db, first_user, last_user)
+            _timed("set-based, batches of 5000 users", lambda: shortlist_categories.recategorize_all(db, batch_size=5000))
+            _timed("one user (profile update path)", lambda: shortlist_categories.recategorize_user(db, first_user))
+
+            _reset(db, first_user, last_user)
+            db.expire_all()
+            elapsed = _timed(f"ORM row by row, {ORM_SAMPLE} links", lambda: _orm_loop(db, first_user, ORM_SAMPLE))
+            print(f"  {'ORM row by row, extrapolated':<40} {elapsed * links / ORM_SAMPLE * 1000:9.0f} ms")
+        finally:
+            db.close()
+            outer.rollback()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+"""
+Benchmark /recommendations scoring at 1k to 100k programs: the vectorized
+NumPy engine against scoring every program with university_ranking in a
+Python loop.
+
+Run with: python backend/benchmarks/bench_recommendations.py [sizes...]
+"""
+import statistics
+import sys
+import time
+
+from synthetic import synthetic_catalog
+
+import recommendation_engine
+import university_ranking
+
+PROFILE = {
+    "intended_degree": "masters",
+    "field_of_study": "Data Science",
+    "degree_major": "Computer Science",
+    "preferred_countries": ["Germany", "Canada", "UK"],
+    "budget_per_year": 30000,
+}
+
+
+def _time(fn, repeat: int) -> float:
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples)
+
+
+def run(size: int) -> None:
+    catalog = synthetic_catalog(size)
+    started = time.perf_counter()
+    matrix = recommendation_engine.CatalogMatrix(catalog)
+    build_ms = (time.perf_counter() - started) * 1000
+    rows = [vars(u) for u in catalog]
+
+    vectorized = _time(lambda: matrix.recommend(PROFILE, 5), repeat=20)
+    loop = _time(lambda: university_ranking.rank_universities(PROFILE, rows, top_k=15), repeat=3)
+    print(
+        f"== {size:>7} programs: arrays built in {build_ms:6.0f} ms | "
+        f"numpy {vectorized:7.2f} ms | python loop {loop:8.2f} ms ({loop / vectorized:4.0f}x)"
+    )
+
+
+def main() -> None:
+    sizes = [int(arg) for arg in sys.argv[1:]] or [1_000, 10_000, 100_000]
+    for size in sizes:
+        run(size)
+
+
+if __name__ == "__main__":
+    main()
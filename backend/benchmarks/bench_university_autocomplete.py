@@ -0,0 +1,61 @@
+"""
+Benchmark /universities/autocomplete at 10k and 100k programs: the sorted-array
+index against a linear scan of the catalog (what the list endpoint's
+ILIKE-style filtering amounts to) for one- to several-character prefixes.
+
+Run with: python backend/benchmarks/bench_university_autocomplete.py [sizes...]
+"""
+import statistics
+import sys
+import time
+
+from synthetic import synthetic_catalog
+
+import university_autocomplete
+
+PREFIXES = ["u", "to", "uni", "cam", "massa", "univ of t", "germ", "lond", "zzz"]
+
+
+def _scan(catalog, query: str, limit: int) -> list:
+    needle = query.lower()
+    matches = []
+    for uni in catalog:
+        if needle in uni.name.lower() or needle in (uni.city or "").lower() or needle in uni.country.lower():
+            matches.append(uni)
+            if len(matches) >= limit:
+                break
+    return matches
+
+
+def _time(fn, repeat: int = 50) -> tuple[float, float]:
+    samples = []
+    for _ in range(repeat):
+        for prefix in PREFIXES:
+            started = time.perf_counter()
+            fn(prefix)
+            samples.append((time.perf_counter() - started) * 1000)
+    samples.sort()
+    return statistics.median(samples), samples[int(len(samples) * 0.95)]
+
+
+def run(size: int) -> None:
+    catalog = synthetic_catalog(size)
+    started = time.perf_counter()
+    index = university_autocomplete.AutocompleteIndex(catalog)
+    print(f"== {size} programs: index built in {(time.perf_counter() - started) * 1000:.0f} ms")
+    for label, fn in (
+        ("sorted-array index", lambda q: index.suggest(q, 8)),
+        ("linear scan", lambda q: _scan(catalog, q, 8)),
+    ):
+        p50, p95 = _time(fn)
+        print(f"  {label:<19} p50 {p50:8.3f} ms  p95 {p95:8.3f} ms")
+
+
+def main() -> None:
+    sizes = [int(arg) for arg in sys.argv[1:]] or [10_000, 100_000]
+    for size in sizes:
+        run(size)
+
+
+if __name__ == "__main__":
+    main()
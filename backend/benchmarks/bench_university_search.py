@@ -0,0 +1,57 @@
+"""
+Benchmark the in-process /universities/search index at 10k and 100k programs:
+build time, and per-query latency for exact, multi-word, prefix and
+misspelled queries.
+
+Run with: python backend/benchmarks/bench_university_search.py [sizes...]
+Only the in-process index is measured here; the Postgres path needs a database.
+"""
+import statistics
+import sys
+import time
+
+from synthetic import synthetic_catalog
+
+import university_search
+
+QUERIES = {
+    "exact": ["computer science", "london", "finance", "robotics"],
+    "prefix": ["comp", "mach", "univ of", "biotech"],
+    "typo": ["compter", "enginering", "cambrige", "finanse"],
+    "multi-word": ["data science germany", "business school toronto", "public health masters"],
+}
+
+
+def _percentile(samples: list[float], pct: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct))]
+
+
+def run(size: int, repeat: int = 20) -> None:
+    catalog = synthetic_catalog(size)
+    started = time.perf_counter()
+    index = university_search.SearchIndex(catalog)
+    build_ms = (time.perf_counter() - started) * 1000
+    print(f"== {size} programs: index built in {build_ms:.0f} ms, {len(index.vocabulary)} terms")
+
+    for kind, queries in QUERIES.items():
+        samples = []
+        for _ in range(repeat):
+            for query in queries:
+                started = time.perf_counter()
+                index.search(query, 20)
+                samples.append((time.perf_counter() - started) * 1000)
+        print(
+            f"  {kind:<10} p50 {statistics.median(samples):7.2f} ms"
+            f"  p95 {_percentile(samples, 0.95):7.2f} ms"
+        )
+
+
+def main() -> None:
+    sizes = [int(arg) for arg in sys.argv[1:]] or [10_000, 100_000]
+    for size in sizes:
+        run(size)
+
+
+if __name__ == "__main__":
+    main()
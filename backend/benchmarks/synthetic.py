@@ -0,0 +1,54 @@
+"""
+Synthetic university catalogs for the benchmarks: the seed rows, recombined
+with made-up names, cities and fields until the catalog has `size` programs.
+"""
+import os
+import random
+import sys
+from types import SimpleNamespace
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from seed_universities import UNIVERSITIES
+
+FIELDS = [
+    "Computer Science", "Data Science", "Artificial Intelligence", "Electrical Engineering",
+    "Mechanical Engineering", "Business Administration", "Finance", "Economics",
+    "Public Health", "Biotechnology", "Environmental Science", "Architecture",
+    "International Relations", "Psychology", "Law", "Applied Mathematics",
+]
+DEGREES = ["bachelors", "masters", "mba", "phd"]
+PREFIXES = ["University of", "Institute of", "College of", "Technical University of", "School of"]
+SUFFIXES = ["University", "Institute of Technology", "Polytechnic", "Business School", "College"]
+
+
+def synthetic_catalog(size: int, seed: int = 7) -> list[SimpleNamespace]:
+    rng = random.Random(seed)
+    cities = sorted({u["city"] for u in UNIVERSITIES})
+    # Made-up place names so the vocabulary grows with the catalog
+    syllables = ["ber", "lin", "ton", "ham", "ford", "vale", "mar", "dor", "kes", "wick", "stad", "burg", "ria"]
+    places = cities + [
+        "".join(rng.choice(syllables) for _ in range(rng.randint(2, 3))).capitalize()
+        for _ in range(max(50, size // 20))
+    ]
+    catalog = []
+    for i in range(size):
+        base = UNIVERSITIES[i % len(UNIVERSITIES)]
+        place = rng.choice(places)
+        name = f"{rng.choice(PREFIXES)} {place}" if rng.random() < 0.5 else f"{place} {rng.choice(SUFFIXES)}"
+        field = rng.choice(FIELDS)
+        catalog.append(
+            SimpleNamespace(
+                **{
+                    **base,
+                    "id": i + 1,
+                    "name": name if i >= len(UNIVERSITIES) else base["name"],
+                    "city": place if i >= len(UNIVERSITIES) else base["city"],
+                    "field_of_study": field if i >= len(UNIVERSITIES) else base["field_of_study"],
+                    "degree_level": rng.choice(DEGREES) if i >= len(UNIVERSITIES) else base["degree_level"],
+                    "tuition_per_year": rng.randrange(0, 80000, 500),
+                    "description": f"{base['description']} Known for {field.lower()} in {place}.",
+                }
+            )
+        )
+    return catalog
@@ -1,5 +1,6 @@
 import os
 from functools import lru_cache
+from typing import List
 
 from pydantic import BaseModel
 from dotenv import load_dotenv
@@ -13,6 +14,77 @@ class Settings(BaseModel):
     jwt_access_token_expires_minutes: int = 60 * 24
     openrouter_api_key: str = ""
 
+    # Outbound LLM HTTP client (shared connection pool)
+    llm_http2: bool = True
+    llm_max_connections: int = 20
+    llm_max_keepalive_connections: int = 10
+    llm_keepalive_expiry: float = 60.0
+    llm_connect_timeout: float = 5.0
+    llm_read_timeout: float = 60.0
+    llm_write_timeout: float = 10.0
+    llm_pool_timeout: float = 5.0
+
+    # LLM response cache
+    llm_cache_enabled: bool = True
+    llm_cache_max_entries: int = 1000
+    llm_cache_max_bytes: int = 16 * 1024 * 1024
+    llm_cache_ttl_seconds: int = 60 * 60 * 6
+    llm_cache_db_tier: bool = False
+
+    # Outbound LLM concurrency (per worker)
+    llm_max_concurrency: int = 16
+    llm_max_queue: int = 64
+    llm_queue_timeout: float = 15.0
+
+    # Model fallback chain, retries and hedging. Empty llm_models means the
+    # built-in default model in llm.py.
+    llm_models: List[str] = []
+    llm_attempt_timeout: float = 30.0
+    llm_max_retries: int = 2
+    llm_backoff_base: float = 0.5
+    llm_backoff_max: float = 8.0
+    llm_hedge_enabled: bool = False
+    llm_hedge_after_ms: int = 0  # 0 = use the primary model's observed p95
+    llm_hedge_min_samples: int = 20
+
+    # Circuit breaker around OpenRouter
+    llm_breaker_enabled: bool = True
+    llm_breaker_window_seconds: float = 60.0
+    llm_breaker_min_calls: int = 10
+    llm_breaker_error_rate: float = 0.5
+    llm_breaker_slow_call_seconds: float = 20.0
+    llm_breaker_slow_rate: float = 0.8
+    llm_breaker_open_seconds: float = 30.0
+    llm_breaker_half_open_calls: int = 2
+
+    # Counsellor prompt: how many catalog universities to include
+    counsellor_context_top_k: int = 10
+    counsellor_context_token_budget: int = 400
+
+    # Counsellor conversation memory: recent turns verbatim, older ones summarized
+    counsellor_memory_turns: int = 6
+    counsellor_memory_message_chars: int = 1500
+    counsellor_summary_max_tokens: int = 300
+    counsellor_summary_batch: int = 20
+
+    # How often a worker checks whether the in-memory catalog is out of date
+    catalog_refresh_seconds: float = 30.0
+    # /universities/search: "postgres" (tsvector + GIN) or "memory" (in-process BM25)
+    university_search_backend: str = "postgres"
+    # Directory to save and memory-map the semantic index in ("" = build in memory only)
+    semantic_index_path: str = ""
+
+    # "Students like you also shortlisted": neighbours kept per university, and
+    # how many to add to the counsellor prompt (0 = leave them out)
+    similar_universities_top_k: int = 20
+    counsellor_similar_universities: int = 0
+
+    # "full" (markdown) or "compact" (terse rows) system prompt
+    llm_prompt_mode: str = "full"
+    llm_prompt_token_budget: int = 1200
+    # Mark the static prompt prefix with cache_control for providers that need it
+    llm_prompt_cache_hints: bool = True
+
 
 @lru_cache
 def get_settings() -> Settings:
@@ -42,5 +114,55 @@ def get_settings() -> Settings:
             os.getenv("JWT_ACCESS_TOKEN_EXPIRES_MINUTES", "1440")
         ),
         openrouter_api_key=os.getenv("OPENROUTER_API_KEY", ""),
+        llm_http2=os.getenv("LLM_HTTP2", "true").lower() in ("1", "true", "yes"),
+        llm_max_connections=int(os.getenv("LLM_MAX_CONNECTIONS", "20")),
+        llm_max_keepalive_connections=int(
+            os.getenv("LLM_MAX_KEEPALIVE_CONNECTIONS", "10")
+        ),
+        llm_keepalive_expiry=float(os.getenv("LLM_KEEPALIVE_EXPIRY", "60")),
+        llm_connect_timeout=float(os.getenv("LLM_CONNECT_TIMEOUT", "5")),
+        llm_read_timeout=float(os.getenv("LLM_READ_TIMEOUT", "60")),
+        llm_write_timeout=float(os.getenv("LLM_WRITE_TIMEOUT", "10")),
+        llm_pool_timeout=float(os.getenv("LLM_POOL_TIMEOUT", "5")),
+        llm_cache_enabled=os.getenv("LLM_CACHE_ENABLED", "true").lower() in ("1", "true", "yes"),
+        llm_cache_max_entries=int(os.getenv("LLM_CACHE_MAX_ENTRIES", "1000")),
+        llm_cache_max_bytes=int(os.getenv("LLM_CACHE_MAX_BYTES", str(16 * 1024 * 1024))),
+        llm_cache_ttl_seconds=int(os.getenv("LLM_CACHE_TTL_SECONDS", str(60 * 60 * 6))),
+        llm_cache_db_tier=os.getenv("LLM_CACHE_DB_TIER", "false").lower() in ("1", "true", "yes"),
+        llm_max_concurrency=int(os.getenv("LLM_MAX_CONCURRENCY", "16")),
+        llm_max_queue=int(os.getenv("LLM_MAX_QUEUE", "64")),
+        llm_queue_timeout=float(os.getenv("LLM_QUEUE_TIMEOUT", "15")),
+        llm_models=[m.strip() for m in os.getenv("LLM_MODELS", "").split(",") if m.strip()],
+        llm_attempt_timeout=float(os.getenv("LLM_ATTEMPT_TIMEOUT", "30")),
+        llm_max_retries=int(os.getenv("LLM_MAX_RETRIES", "2")),
+        llm_backoff_base=float(os.getenv("LLM_BACKOFF_BASE", "0.5")),
+        llm_backoff_max=float(os.getenv("LLM_BACKOFF_MAX", "8")),
+        llm_hedge_enabled=os.getenv("LLM_HEDGE_ENABLED", "false").lower() in ("1", "true", "yes"),
+        llm_hedge_after_ms=int(os.getenv("LLM_HEDGE_AFTER_MS", "0")),
+        llm_hedge_min_samples=int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "20")),
+        llm_breaker_enabled=os.getenv("LLM_BREAKER_ENABLED", "true").lower() in ("1", "true", "yes"),
+        llm_breaker_window_seconds=float(os.getenv("LLM_BREAKER_WINDOW_SECONDS", "60")),
+        llm_breaker_min_calls=int(os.getenv("LLM_BREAKER_MIN_CALLS", "10")),
+        llm_breaker_error_rate=float(os.getenv("LLM_BREAKER_ERROR_RATE", "0.5")),
+        llm_breaker_slow_call_seconds=float(os.getenv("LLM_BREAKER_SLOW_CALL_SECONDS", "20")),
+        llm_breaker_slow_rate=float(os.getenv("LLM_BREAKER_SLOW_RATE", "0.8")),
+        llm_breaker_open_seconds=float(os.getenv("LLM_BREAKER_OPEN_SECONDS", "30")),
+        llm_breaker_half_open_calls=int(os.getenv("LLM_BREAKER_HALF_OPEN_CALLS", "2")),
+        counsellor_context_top_k=int(os.getenv("COUNSELLOR_CONTEXT_TOP_K", "10")),
+        counsellor_context_token_budget=int(
+            os.getenv("COUNSELLOR_CONTEXT_TOKEN_BUDGET", "400")
+        ),
+        counsellor_memory_turns=int(os.getenv("COUNSELLOR_MEMORY_TURNS", "6")),
+        counsellor_memory_message_chars=int(os.getenv("COUNSELLOR_MEMORY_MESSAGE_CHARS", "1500")),
+        counsellor_summary_max_tokens=int(os.getenv("COUNSELLOR_SUMMARY_MAX_TOKENS", "300")),
+        counsellor_summary_batch=int(os.getenv("COUNSELLOR_SUMMARY_BATCH", "20")),
+        catalog_refresh_seconds=float(os.getenv("CATALOG_REFRESH_SECONDS", "30")),
+        university_search_backend=os.getenv("UNIVERSITY_SEARCH_BACKEND", "postgres").lower(),
+        semantic_index_path=os.getenv("SEMANTIC_INDEX_PATH", ""),
+        similar_universities_top_k=int(os.getenv("SIMILAR_UNIVERSITIES_TOP_K", "20")),
+        counsellor_similar_universities=int(os.getenv("COUNSELLOR_SIMILAR_UNIVERSITIES", "0")),
+        llm_prompt_mode=os.getenv("LLM_PROMPT_MODE", "full").lower(),
+        llm_prompt_token_budget=int(os.getenv("LLM_PROMPT_TOKEN_BUDGET", "1200")),
+        llm_prompt_cache_hints=os.getenv("LLM_PROMPT_CACHE_HINTS", "true").lower() in ("1", "true", "yes"),
     )
 
@@ -0,0 +1,235 @@
+"""
+Bounded conversation memory for the AI counsellor.
+
+Each turn the LLM sees the last COUNSELLOR_MEMORY_TURNS turns of the chat
+session verbatim plus a running summary of everything older, so the context
+stays the same size however long the session runs. The summary lives in
+`chat_session_summaries` and is brought up to date in the background, a
+batch of older messages at a time.
+"""
+
+import asyncio
+from typing import Any, Optional
+
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+
+import llm
+import models
+from config import get_settings
+from database import AsyncSessionLocal
+
+
+SUMMARY_PROMPT = """You maintain the running summary of a conversation between a student and their study-abroad counsellor.
+Merge the new messages into the current summary. Keep facts that matter for future advice: the student's goals and concerns, universities discussed (with IDs), decisions made, actions taken and open questions.
+Write plain prose, at most {max_words} words, no preamble."""
+
+# (user_id, session_id) pairs with a refresh running in this worker
+_refreshing: set[tuple[int, str]] = set()
+# Keep references so running refresh tasks aren't garbage collected
+_tasks: set[asyncio.Task] = set()
+_stats = {"refreshes": 0, "messages_folded": 0, "failed": 0}
+
+
+def _clip(text: str, limit: int) -> str:
+    if len(text) <= limit:
+        return text
+    return text[:limit].rstrip() + " …"
+
+
+def _recent_messages(db: Session, user_id: int, session_id: str, limit: int) -> list:
+    rows = (
+        db.query(models.ChatMessage)
+        .filter(
+            models.ChatMessage.user_id == user_id,
+            models.ChatMessage.session_id == session_id,
+        )
+        .order_by(models.ChatMessage.id.desc())
+        .limit(limit)
+        .all()
+    )
+    return list(reversed(rows))
+
+
+def _get_summary(db: Session, user_id: int, session_id: str) -> Optional[models.ChatSessionSummary]:
+    return (
+        db.query(models.ChatSessionSummary)
+        .filter(
+            models.ChatSessionSummary.user_id == user_id,
+            models.ChatSessionSummary.session_id == session_id,
+        )
+        .first()
+    )
+
+
+def _backlog_query(db: Session, user_id: int, session_id: str, after_id: int, before_id: int):
+    """Messages older than the verbatim window that the summary doesn't cover yet."""
+    return (
+        db.query(models.ChatMessage)
+        .filter(
+            models.ChatMessage.user_id == user_id,
+            models.ChatMessage.session_id == session_id,
+            models.ChatMessage.id > after_id,
+            models.ChatMessage.id < before_id,
+        )
+        .order_by(models.ChatMessage.id.asc())
+    )
+
+
+def build_messages(
+    db: Session, user_id: int, session_id: Optional[str], content: str
+) -> tuple[str, list[dict]]:
+    """
+    Return (summary, messages) for one counsellor turn: the session's running
+    summary ("" if none) and the recent turns verbatim, ending with `content`
+    as the user's message.
+
+    Schedules a background summary refresh when messages have fallen out of
+    the verbatim window without being summarized yet.
+    """
+    current = {"role": "user", "content": content}
+    if not session_id:
+        return "", [current]
+
+    settings = get_settings()
+    window = _recent_messages(db, user_id, session_id, settings.counsellor_memory_turns * 2)
+    # Clients usually store the user's message before asking for the reply
+    if window and window[-1].role == models.ChatRoleEnum.USER and window[-1].content.strip() == content.strip():
+        window = window[:-1]
+
+    row = _get_summary(db, user_id, session_id)
+    summary = row.summary if row else ""
+    if window:
+        summarized_through = row.summarized_through_id if row else 0
+        if _backlog_query(db, user_id, session_id, summarized_through, window[0].id).first() is not None:
+            schedule_refresh(user_id, session_id)
+
+    messages = [
+        {"role": m.role.value, "content": _clip(m.content, settings.counsellor_memory_message_chars)}
+        for m in window
+    ]
+    messages.append(current)
+    return summary, messages
+
+
+def with_summary(system_prompt: str, summary: str) -> str:
+    """Append the conversation summary after the (cacheable) system prompt."""
+    if not summary:
+        return system_prompt
+    return system_prompt + f"\n## Earlier in This Conversation (summary)\n{summary}\n"
+
+
+def schedule_refresh(user_id: int, session_id: str) -> None:
+    """Start a background summary refresh unless one is already running."""
+    key = (user_id, session_id)
+    if key in _refreshing:
+        return
+    _refreshing.add(key)
+    task = asyncio.ensure_future(_refresh_summary(user_id, session_id))
+    _tasks.add(task)
+
+    def _done(t: asyncio.Task) -> None:
+        _tasks.discard(t)
+        _refreshing.discard(key)
+
+    task.add_done_callback(_done)
+
+
+def _fold_request(summary: str, backlog: list[dict]) -> str:
+    lines = [f"{m['role']}: {m['content']}" for m in backlog]
+    return (
+        f"Current summary:\n{summary or '(none yet)'}\n\n"
+        "New messages:\n" + "\n".join(lines)
+    )
+
+
+def _load_backlog(db: Session, user_id: int, session_id: str) -> Optional[tuple[str, int, list[dict]]]:
+    """(summary, summarized_through_id, next batch of backlog messages), or None."""
+    settings = get_settings()
+    window = _recent_messages(db, user_id, session_id, settings.counsellor_memory_turns * 2)
+    if not window:
+        return None
+    row = _get_summary(db, user_id, session_id)
+    summary = row.summary if row else ""
+    summarized_through = row.summarized_through_id if row else 0
+    backlog = [
+        {
+            "id": m.id,
+            "role": m.role.value,
+            "content": _clip(m.content, settings.counsellor_memory_message_chars),
+        }
+        for m in _backlog_query(db, user_id, session_id, summarized_through, window[0].id)
+        .limit(settings.counsellor_summary_batch)
+        .all()
+    ]
+    return summary, summarized_through, backlog
+
+
+def _save_summary(
+    db: Session, user_id: int, session_id: str, expected_through: int, summary: str, through: int
+) -> bool:
+    row = _get_summary(db, user_id, session_id)
+    if row is None:
+        row = models.ChatSessionSummary(user_id=user_id, session_id=session_id)
+        db.add(row)
+    elif row.summarized_through_id != expected_through:
+        # Another worker got there first
+        return False
+    row.summary = summary
+    row.summarized_through_id = through
+    try:
+        db.commit()
+    except SQLAlchemyError:
+        db.rollback()
+        return False
+    return True
+
+
+async def _refresh_summary(user_id: int, session_id: str) -> None:
+    """Fold not-yet-summarized messages into the summary, one batch per LLM call."""
+    settings = get_settings()
+    max_chars = settings.counsellor_summary_max_tokens * 4
+    system_prompt = SUMMARY_PROMPT.format(max_words=settings.counsellor_summary_max_tokens * 3 // 4)
+
+    while True:
+        async with AsyncSessionLocal() as db:
+            loaded = await db.run_sync(_load_backlog, user_id, session_id)
+        if not loaded or not loaded[2]:
+            return
+        summary, summarized_through, backlog = loaded
+
+        result = await llm.chat_with_llm(
+            [{"role": "user", "content": _fold_request(summary, backlog)}],
+            system_prompt,
+            cache=False,
+        )
+        if result.get("degraded") or not result.get("content"):
+            # Try again on a later turn rather than storing a fallback reply
+            _stats["failed"] += 1
+            return
+
+        async with AsyncSessionLocal() as db:
+            saved = await db.run_sync(
+                _save_summary,
+                user_id,
+                session_id,
+                summarized_through,
+                _clip(result["content"].strip(), max_chars),
+                backlog[-1]["id"],
+            )
+        if not saved:
+            _stats["failed"] += 1
+            return
+        _stats["refreshes"] += 1
+        _stats["messages_folded"] += len(backlog)
+
+
+def delete_summary(db: Session, user_id: int, session_id: str) -> None:
+    db.query(models.ChatSessionSummary).filter(
+        models.ChatSessionSummary.user_id == user_id,
+        models.ChatSessionSummary.session_id == session_id,
+    ).delete()
+
+
+def get_stats() -> dict[str, Any]:
+    return {**_stats, "refreshing": len(_refreshing)}
@@ -0,0 +1,373 @@
+"""
+Batched executor for the actions in a counsellor reply.
+
+The whole action list is validated up front, every referenced university and
+the user's existing links to them are loaded in one query each, and all
+changes (todos, shortlists, locks and the stage update) are committed in a
+single transaction. Each action gets a structured result.
+
+Actions are idempotent: todos carry a deterministic key under a unique
+index and links are unique per (user, university), so a retried or repeated
+reply resolves to no-ops in the database (INSERT ... ON CONFLICT DO NOTHING,
+conditional UPDATE) instead of racing a read-then-write. A todo's key only
+holds while the todo is open: completing it clears the key, and deleting it
+drops the key with the row, so the same task can be created again later.
+"""
+
+import hashlib
+import json
+import re
+from typing import Optional
+
+from sqlalchemy import or_, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session, joinedload
+
+import counsellor_context
+import models
+import schemas
+import university_similarity
+
+
+EXECUTED = "executed"
+SKIPPED = "skipped"  # valid, but nothing to do (already shortlisted, unknown university)
+INVALID = "invalid"  # missing or malformed payload
+IGNORED = "ignored"  # display-only or unknown action type
+FAILED = "failed"  # the transaction was rolled back
+
+EXECUTABLE_TYPES = {"create_todo", "shortlist_university", "lock_university"}
+
+CATEGORY_ACCEPTANCE = {
+    models.UniversityCategoryEnum.DREAM: models.AcceptanceChanceEnum.LOW,
+    models.UniversityCategoryEnum.TARGET: models.AcceptanceChanceEnum.MEDIUM,
+    models.UniversityCategoryEnum.SAFE: models.AcceptanceChanceEnum.HIGH,
+}
+
+
+def _as_id(value) -> Optional[int]:
+    """LLMs send IDs as ints or numeric strings; anything else is no ID."""
+    if isinstance(value, bool):
+        return None
+    try:
+        number = int(value)
+    except (TypeError, ValueError):
+        return None
+    return number if number > 0 else None
+
+
+def _category(value) -> models.UniversityCategoryEnum:
+    value = str(value or "").lower()
+    if value == "dream":
+        return models.UniversityCategoryEnum.DREAM
+    if value == "safe":
+        return models.UniversityCategoryEnum.SAFE
+    return models.UniversityCategoryEnum.TARGET
+
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def _normalize(value) -> str:
+    return _WHITESPACE.sub(" ", str(value or "")).strip().casefold()
+
+
+def action_key(user_id: int, action_type: str, payload: dict) -> str:
+    """
+    Deterministic idempotency key for an action: the same user, type and
+    identifying payload fields always give the same key. Free text that the
+    LLM rephrases between replies (descriptions, reasons) is left out.
+    """
+    if action_type == "create_todo":
+        identity = {
+            "title": _normalize(payload.get("title")),
+            "university_id": _as_id(payload.get("university_id")),
+        }
+    else:
+        identity = {
+            "university_id": _as_id(payload.get("university_id")),
+            "user_university_id": _as_id(payload.get("user_university_id")),
+        }
+    encoded = json.dumps([user_id, action_type, identity], sort_keys=True)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+def _validate(index: int, action) -> tuple[Optional[dict], Optional[schemas.CounsellorActionResult]]:
+    """Normalize one raw action, or return the result rejecting it."""
+    if not isinstance(action, dict):
+        return None, schemas.CounsellorActionResult(
+            index=index, type="", status=INVALID, detail="Action is not an object"
+        )
+    action_type = action.get("type", "")
+    payload = action.get("payload") if isinstance(action.get("payload"), dict) else {}
+
+    def reject(detail: str, status: str = INVALID):
+        return None, schemas.CounsellorActionResult(
+            index=index, type=action_type, status=status, detail=detail
+        )
+
+    if action_type not in EXECUTABLE_TYPES:
+        return reject("Not an executable action", IGNORED)
+
+    university_id = _as_id(payload.get("university_id"))
+    if action_type == "create_todo":
+        if not payload.get("title"):
+            return reject("create_todo needs a title")
+    elif action_type == "shortlist_university":
+        if university_id is None:
+            return reject("shortlist_university needs a university_id")
+    elif action_type == "lock_university":
+        if university_id is None and _as_id(payload.get("user_university_id")) is None:
+            return reject("lock_university needs a university_id or user_university_id")
+
+    return {
+        "index": index,
+        "type": action_type,
+        "payload": payload,
+        "university_id": university_id,
+        "user_university_id": _as_id(payload.get("user_university_id")),
+    }, None
+
+
+def execute_actions(
+    db: Session,
+    user_id: int,
+    actions_raw: list,
+) -> list[schemas.CounsellorActionResult]:
+    """
+    Execute the actions parsed from an LLM reply in one transaction.
+
+    Returns one result per action, in order. Results' `messages` are the
+    human-readable lines shown under the reply.
+    """
+    results: list[Optional[schemas.CounsellorActionResult]] = []
+    planned: list[dict] = []
+    for index, action in enumerate(actions_raw or []):
+        normalized, rejected = _validate(index, action)
+        results.append(rejected)
+        if normalized is not None:
+            planned.append(normalized)
+
+    if planned:
+        try:
+            similarity_changes = _apply(db, user_id, planned, results)
+        except SQLAlchemyError as e:
+            # Nothing in the batch was saved: every action that did or would have run failed
+            db.rollback()
+            detail = f"Could not save changes ({e.__class__.__name__})"
+            for action in planned:
+                result = results[action["index"]]
+                if result is None:
+                    results[action["index"]] = schemas.CounsellorActionResult(
+                        index=action["index"],
+                        type=action["type"],
+                        status=FAILED,
+                        detail=detail,
+                        key=action_key(user_id, action["type"], action["payload"]),
+                    )
+                elif result.status == EXECUTED:
+                    result.status, result.detail, result.messages = FAILED, detail, []
+        else:
+            university_similarity.schedule(similarity_changes)
+    return results
+
+
+def _apply(
+    db: Session,
+    user_id: int,
+    planned: list[dict],
+    results: list,
+) -> set[int]:
+    """
+    Run the planned actions and commit, filling in `results`. Database
+    errors propagate (execute_actions rolls back). Returns the universities
+    whose co-occurrence neighbours changed.
+    """
+    # Prefetch: one query for the universities, one for the user's links
+    university_ids = {a["university_id"] for a in planned if a["university_id"]}
+    link_ids = {a["user_university_id"] for a in planned if a["user_university_id"]}
+
+    universities = {}
+    if university_ids:
+        universities = {
+            u.id: u
+            for u in db.query(models.University)
+            .filter(models.University.id.in_(university_ids))
+            .all()
+        }
+
+    links_by_university: dict[int, models.UserUniversity] = {}
+    links_by_id: dict[int, models.UserUniversity] = {}
+    if university_ids or link_ids:
+        conditions = []
+        if university_ids:
+            conditions.append(models.UserUniversity.university_id.in_(university_ids))
+        if link_ids:
+            conditions.append(models.UserUniversity.id.in_(link_ids))
+        for link in (
+            db.query(models.UserUniversity)
+            .options(joinedload(models.UserUniversity.university))
+            .filter(models.UserUniversity.user_id == user_id)
+            .filter(or_(*conditions))
+            .all()
+        ):
+            links_by_university[link.university_id] = link
+            links_by_id[link.id] = link
+
+    # Universities whose co-occurrence neighbours change
+    similarity_changes: set[int] = set()
+
+    def insert_link(university: models.University, category, reason: str) -> bool:
+        """Shortlist `university`; False if the user already has it (resolved by the unique index)."""
+        inserted = db.execute(
+            pg_insert(models.UserUniversity)
+            .values(
+                user_id=user_id,
+                university_id=university.id,
+                category=category,
+                status=models.UniversityStatusEnum.SHORTLISTED,
+                fit_reason=reason,
+                acceptance_chance=CATEGORY_ACCEPTANCE[category],
+            )
+            .on_conflict_do_nothing()
+            .returning(models.UserUniversity.id)
+        ).scalar_one_or_none()
+        if inserted is None:
+            return False
+        similarity_changes.update(
+            university_similarity.record_change(
+                db,
+                user_id,
+                university.id,
+                0,
+                university_similarity.link_weight(models.UniversityStatusEnum.SHORTLISTED),
+            )
+        )
+        return True
+
+    shortlisted_any = False
+    locked_any = False
+    seen_keys: set[str] = set()
+
+    for action in planned:
+        payload = action["payload"]
+        university = universities.get(action["university_id"])
+        key = action_key(user_id, action["type"], payload)
+        result = schemas.CounsellorActionResult(
+            index=action["index"], type=action["type"], status=EXECUTED, key=key
+        )
+        results[action["index"]] = result
+        if key in seen_keys:
+            result.status, result.detail = SKIPPED, "Duplicate of an earlier action"
+            continue
+        seen_keys.add(key)
+
+        if action["type"] == "create_todo":
+            inserted = db.execute(
+                pg_insert(models.Todo)
+                .values(
+                    user_id=user_id,
+                    title=payload.get("title", "AI Suggested Task"),
+                    description=payload.get("description", ""),
+                    status=models.TodoStatusEnum.PENDING,
+                    # An unknown ID would violate the foreign key and sink the batch
+                    related_university_id=university.id if university else None,
+                    created_by_ai=True,
+                    idempotency_key=key,
+                )
+                .on_conflict_do_nothing()
+                .returning(models.Todo.id)
+            ).scalar_one_or_none()
+            if inserted is None:
+                result.status, result.detail = SKIPPED, "Task already open"
+            else:
+                uni_name = f" for {university.name}" if university else ""
+                result.messages.append(f"✅ Created task{uni_name}: {payload.get('title')}")
+
+        elif action["type"] == "shortlist_university":
+            category = _category(payload.get("category", "target"))
+            if university is None:
+                result.status, result.detail = SKIPPED, "Unknown university"
+            elif not insert_link(university, category, payload.get("reason", "AI recommended")):
+                result.status, result.detail = SKIPPED, "Already shortlisted"
+            else:
+                shortlisted_any = True
+                result.messages.append(
+                    f"📋 Shortlisted: {university.name} as {category.value.upper()}"
+                )
+
+        elif action["type"] == "lock_university":
+            target = None
+            if action["user_university_id"]:
+                link = links_by_id.get(action["user_university_id"])
+                if link is not None:
+                    university = link.university
+                    target = models.UserUniversity.id == link.id
+            elif university is not None:
+                # If not in shortlist yet, auto-add it first
+                if university.id not in links_by_university and insert_link(
+                    university,
+                    models.UniversityCategoryEnum.TARGET,
+                    payload.get("reason", "AI recommended"),
+                ):
+                    result.messages.append(f"📋 Auto-shortlisted: {university.name}")
+                target = models.UserUniversity.university_id == university.id
+
+            if target is None:
+                result.status, result.detail = SKIPPED, "Unknown university"
+                continue
+            # Conditional update: locking twice is a no-op, not a second write
+            locked = db.execute(
+                update(models.UserUniversity)
+                .where(
+                    models.UserUniversity.user_id == user_id,
+                    target,
+                    models.UserUniversity.status != models.UniversityStatusEnum.LOCKED,
+                )
+                .values(status=models.UniversityStatusEnum.LOCKED)
+                .returning(models.UserUniversity.id, models.UserUniversity.university_id)
+            ).first()
+            if locked is None:
+                if not result.messages:
+                    result.status, result.detail = SKIPPED, "Already locked"
+            else:
+                # Only unlocked links match the update, so this one was shortlisted
+                similarity_changes.update(
+                    university_similarity.record_change(
+                        db,
+                        user_id,
+                        locked.university_id,
+                        university_similarity.link_weight(models.UniversityStatusEnum.SHORTLISTED),
+                        university_similarity.link_weight(models.UniversityStatusEnum.LOCKED),
+                    )
+                )
+                locked_any = True
+                result.messages.append(f"🔒 Locked: {university.name}")
+
+    # One stage update for the whole batch
+    stage_update = None
+    if locked_any:
+        stage_update = update(models.Profile).values(
+            current_stage=models.StageEnum.PREPARING_APPLICATIONS
+        )
+    elif shortlisted_any:
+        stage_update = (
+            update(models.Profile)
+            .where(models.Profile.current_stage == models.StageEnum.BUILDING_PROFILE)
+            .values(current_stage=models.StageEnum.DISCOVERING_UNIVERSITIES)
+        )
+    if stage_update is not None:
+        db.execute(
+            stage_update.where(models.Profile.user_id == user_id).execution_options(
+                synchronize_session="fetch"
+            )
+        )
+    if any(result is not None and result.status == EXECUTED for result in results):
+        counsellor_context.invalidate(db, user_id)
+
+    db.commit()
+    return similarity_changes
+
+
+def executed_messages(results: list[schemas.CounsellorActionResult]) -> list[str]:
+    return [line for result in results for line in result.messages]
@@ -0,0 +1,202 @@
+"""
+Materialized per-user counsellor context.
+
+Building the counsellor prompt needs the profile, every university link and
+a ranking over the whole catalog. Instead of redoing that on every turn, the
+serialized result is kept in `counsellor_contexts` (one row per user) and a
+turn reads it by primary key. Writes that change the context (profile,
+shortlist, lock, todos) mark the row stale and bump its version in the same
+transaction, and the next read rebuilds it. The rebuilt row is only written
+(and marked fresh) if the version is still the one read before the build, so
+an invalidation that commits during a build isn't lost. Catalog changes are
+picked up through the catalog version (see university_catalog).
+"""
+
+import json
+from datetime import datetime
+from typing import Any, Optional
+
+from sqlalchemy import select, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session, joinedload
+
+import llm
+import models
+import semantic_index
+import university_catalog
+import university_ranking
+import university_similarity
+from config import get_settings
+
+
+def profile_to_dict(profile: models.Profile) -> dict[str, Any]:
+    """The profile fields the counsellor prompt uses."""
+    return {
+        "current_education_level": profile.current_education_level,
+        "degree_major": profile.degree_major,
+        "graduation_year": profile.graduation_year,
+        "gpa": profile.gpa,
+        "intended_degree": profile.intended_degree,
+        "field_of_study": profile.field_of_study,
+        "target_intake_year": profile.target_intake_year,
+        "preferred_countries": (
+            profile.preferred_countries.split(",") if profile.preferred_countries else []
+        ),
+        "budget_per_year": profile.budget_per_year,
+        "funding_plan": profile.funding_plan,
+        "ielts_toefl_status": profile.ielts_toefl_status.value,
+        "gre_gmat_status": profile.gre_gmat_status.value,
+        "sop_status": profile.sop_status.value,
+    }
+
+
+RANKING_FIELDS = {"id", "name", "country", "city", "field_of_study", "degree_level", "tuition_per_year"}
+
+
+def _build(db: Session, user_id: int, catalog: university_catalog.CatalogIndex) -> Optional[dict[str, Any]]:
+    """Load everything the prompt needs from the source tables."""
+    profile = db.query(models.Profile).filter(models.Profile.user_id == user_id).first()
+    if profile is None:
+        return None
+    if not profile.is_complete:
+        return {"is_complete": False}
+
+    links = (
+        db.query(models.UserUniversity)
+        .options(joinedload(models.UserUniversity.university))
+        .filter(models.UserUniversity.user_id == user_id)
+        .all()
+    )
+    universities = [
+        {
+            "id": uu.id,
+            "university_id": uu.university_id,
+            "status": uu.status.value,
+            "category": uu.category.value,
+            "university": {
+                "name": uu.university.name,
+                "country": uu.university.country,
+                "tuition_per_year": uu.university.tuition_per_year,
+            },
+        }
+        for uu in links
+    ]
+
+    # Rank the (in-memory) catalog against the profile; only the best matches go into the prompt
+    catalog_context = [u.model_dump(include=RANKING_FIELDS) for u in catalog.all()]
+
+    profile_dict = profile_to_dict(profile)
+    # Semantic matching so e.g. "machine learning" goals find AI programs
+    goal = profile.field_of_study or profile.degree_major
+    recommended = university_ranking.rank_universities(
+        profile_dict,
+        catalog_context,
+        top_k=get_settings().counsellor_context_top_k,
+        exclude_ids={uu.university_id for uu in links},
+        field_similarity=semantic_index.get_index(catalog).scores_by_id(goal) if goal else None,
+    )
+    also_shortlisted = []
+    similar_count = get_settings().counsellor_similar_universities
+    if similar_count and links:
+        for university_id, _ in university_similarity.for_user(
+            db, {uu.university_id for uu in links}, similar_count
+        ):
+            uni = catalog.get(university_id)
+            if uni is not None:
+                also_shortlisted.append(uni.model_dump(include=RANKING_FIELDS))
+
+    return {
+        "is_complete": True,
+        "profile_id": profile.id,
+        "profile": profile_dict,
+        "stage": profile.current_stage.value,
+        "universities": universities,
+        "recommended": recommended,
+        "catalog_size": len(catalog_context),
+        "catalog_version": catalog.version,
+        "also_shortlisted": also_shortlisted,
+    }
+
+
+def get_snapshot(db: Session, user_id: int) -> Optional[dict[str, Any]]:
+    """
+    The user's counsellor context, rebuilt first if missing or stale.
+    None if the user has no profile; {"is_complete": False, ...} until
+    onboarding is done.
+    """
+    catalog = university_catalog.get_catalog(db)
+    row = db.get(models.CounsellorContext, user_id)
+    if row is not None and not row.stale:
+        snapshot = json.loads(row.data)
+        if not snapshot["is_complete"] or snapshot.get("catalog_version") == catalog.version:
+            snapshot["version"] = row.version
+            return snapshot
+
+    if row is None:
+        # Create the row first, so an invalidation during the build has a version to bump
+        db.execute(
+            pg_insert(models.CounsellorContext)
+            .values(user_id=user_id, version=0, stale=True, data="null", updated_at=datetime.utcnow())
+            .on_conflict_do_nothing()
+        )
+        db.commit()
+    read_version = _current_version(db, user_id)
+
+    snapshot = _build(db, user_id, catalog)
+    if snapshot is None:
+        return None
+    version = db.execute(
+        update(models.CounsellorContext)
+        .where(
+            models.CounsellorContext.user_id == user_id,
+            models.CounsellorContext.version == read_version,
+        )
+        .values(
+            version=models.CounsellorContext.version + 1,
+            stale=False,
+            data=json.dumps(snapshot, ensure_ascii=False),
+            updated_at=datetime.utcnow(),
+        )
+        .returning(models.CounsellorContext.version)
+        .execution_options(synchronize_session=False)
+    ).scalar_one_or_none()
+    if version is None:
+        # Invalidated while building: serve this build, but leave the row stale
+        version = _current_version(db, user_id)
+    db.commit()
+    snapshot["version"] = version
+    return snapshot
+
+
+def _current_version(db: Session, user_id: int) -> int:
+    return db.execute(
+        select(models.CounsellorContext.version).where(models.CounsellorContext.user_id == user_id)
+    ).scalar_one()
+
+
+def invalidate(db: Session, user_id: int) -> None:
+    """Mark the user's context stale; commits with the caller's transaction."""
+    db.execute(
+        update(models.CounsellorContext)
+        .where(models.CounsellorContext.user_id == user_id)
+        .values(stale=True, version=models.CounsellorContext.version + 1)
+        .execution_options(synchronize_session=False)
+    )
+
+
+def build_prompt(snapshot: dict[str, Any]) -> str:
+    """The counsellor system prompt for a complete snapshot."""
+    prompt = llm.build_system_prompt(
+        profile=snapshot["profile"],
+        stage=snapshot["stage"],
+        universities=snapshot["universities"],
+        all_universities=snapshot["recommended"],
+        catalog_size=snapshot["catalog_size"],
+        universities_token_budget=get_settings().counsellor_context_token_budget,
+    )
+    also_shortlisted = snapshot.get("also_shortlisted")
+    if also_shortlisted:
+        prompt += "\n## Students With Similar Lists Also Shortlisted\n"
+        for uni in also_shortlisted:
+            prompt += f"- ID {uni['id']}: **{uni['name']}** ({uni['country']}) — ${uni['tuition_per_year']:,}/yr\n"
+    return prompt
@@ -1,4 +1,8 @@
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
 from sqlalchemy import create_engine
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker, declarative_base
 
 from config import get_settings
@@ -13,6 +17,22 @@ SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine, futu
 Base = declarative_base()
 
 
+def _async_database_url(url: str) -> str:
+    """The same database through asyncpg (which spells sslmode as ssl)."""
+    parts = urlsplit(url)
+    scheme = "postgresql+asyncpg" if parts.scheme.startswith("postgresql") else parts.scheme
+    query = [("ssl" if k == "sslmode" else k, v) for k, v in parse_qsl(parts.query)]
+    return urlunsplit(parts._replace(scheme=scheme, query=urlencode(query)))
+
+
+# Async endpoints use this engine so database I/O never blocks the event loop
+async_engine = create_async_engine(_async_database_url(settings.database_url), echo=False)
+
+# expire_on_commit=False: attributes stay loaded after commit, since lazy
+# refreshes aren't possible outside the session's async context
+AsyncSessionLocal = async_sessionmaker(async_engine, class_=AsyncSession, expire_on_commit=False)
+
+
 def get_db():
     db = SessionLocal()
     try:
@@ -20,3 +40,17 @@ def get_db():
     finally:
         db.close()
 
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+def apply_schema_upgrades(statements: list[str]) -> None:
+    """Run idempotent DDL, each statement in its own transaction."""
+    for statement in statements:
+        try:
+            with engine.begin() as conn:
+                conn.exec_driver_sql(statement)
+        except SQLAlchemyError as e:
+            print(f"Schema upgrade skipped ({statement[:60]}...): {e.__class__.__name__}")
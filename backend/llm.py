@@ -5,18 +5,199 @@ This module provides integration with OpenRouter API, which gives access
 to various LLM models including Claude, GPT-4, etc.
 """
 
+import asyncio
+import importlib.util
 import json
 import os
-from typing import Any
+import re
+import time
+from typing import Any, AsyncIterator, Optional
 
 import httpx
 
 from config import get_settings
+from llm_cache import get_cache, make_cache_key
+from llm_concurrency import ConcurrencyLimiter, LLMOverloadedError, SingleFlight
+from llm_resilience import (
+    CircuitBreaker,
+    CircuitOpenError,
+    all_model_stats,
+    backoff_delay,
+    get_model_stats,
+    is_retryable,
+)
 
 
 OPENROUTER_API_URL = "https://openrouter.ai/api/v1/chat/completions"
 
 
+# -------------------------
+# Shared HTTP client
+# -------------------------
+
+_http_client: Optional[httpx.AsyncClient] = None
+
+# Counters for sizing the pool. A request "reuses" a connection when httpcore
+# doesn't have to open a new TCP connection for it.
+_pool_counters = {
+    "requests": 0,
+    "new_connections": 0,
+    "in_flight": 0,
+}
+
+
+def _http2_available() -> bool:
+    return importlib.util.find_spec("h2") is not None
+
+
+def _create_http_client() -> httpx.AsyncClient:
+    settings = get_settings()
+    timeout = httpx.Timeout(
+        connect=settings.llm_connect_timeout,
+        read=settings.llm_read_timeout,
+        write=settings.llm_write_timeout,
+        pool=settings.llm_pool_timeout,
+    )
+    limits = httpx.Limits(
+        max_connections=settings.llm_max_connections,
+        max_keepalive_connections=settings.llm_max_keepalive_connections,
+        keepalive_expiry=settings.llm_keepalive_expiry,
+    )
+    return httpx.AsyncClient(
+        timeout=timeout,
+        limits=limits,
+        # HTTP/2 needs the optional `h2` package (httpx[http2])
+        http2=settings.llm_http2 and _http2_available(),
+    )
+
+
+async def start_http_client() -> None:
+    """Create the application-wide client. Called from FastAPI startup."""
+    global _http_client
+    if _http_client is None or _http_client.is_closed:
+        _http_client = _create_http_client()
+
+
+async def close_http_client() -> None:
+    """Close the application-wide client. Called from FastAPI shutdown."""
+    global _http_client
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """
+    Return the shared client, creating it lazily when used outside the app
+    lifespan (scripts, one-off calls).
+    """
+    global _http_client
+    if _http_client is None or _http_client.is_closed:
+        _http_client = _create_http_client()
+    return _http_client
+
+
+async def _trace_connections(event_name: str, info: dict) -> None:
+    if event_name == "connection.connect_tcp.complete":
+        _pool_counters["new_connections"] += 1
+
+
+def get_pool_stats() -> dict[str, Any]:
+    """Connection pool statistics for the shared OpenRouter client."""
+    settings = get_settings()
+    open_connections = 0
+    idle_connections = 0
+    waiters = 0
+    http_version = "HTTP/2" if settings.llm_http2 and _http2_available() else "HTTP/1.1"
+
+    if _http_client is not None and not _http_client.is_closed:
+        # httpx doesn't expose the pool publicly; read it defensively.
+        pool = getattr(_http_client._transport, "_pool", None)
+        if pool is not None:
+            connections = list(getattr(pool, "connections", []))
+            open_connections = len(connections)
+            idle_connections = sum(1 for c in connections if c.is_idle())
+            waiters = sum(
+                1
+                for r in getattr(pool, "_requests", [])
+                if getattr(r, "connection", None) is None
+            )
+
+    requests = _pool_counters["requests"]
+    new_connections = _pool_counters["new_connections"]
+    reuse_ratio = (
+        round(max(requests - new_connections, 0) / requests, 3) if requests else 0.0
+    )
+
+    return {
+        "http_version": http_version,
+        "max_connections": settings.llm_max_connections,
+        "max_keepalive_connections": settings.llm_max_keepalive_connections,
+        "open_connections": open_connections,
+        "idle_connections": idle_connections,
+        "waiters": waiters,
+        "in_flight": _pool_counters["in_flight"],
+        "requests": requests,
+        "new_connections": new_connections,
+        "reuse_ratio": reuse_ratio,
+    }
+
+
+# -------------------------
+# Concurrency: coalescing + limiter
+# -------------------------
+
+_single_flight = SingleFlight()
+_limiter = ConcurrencyLimiter(
+    max_concurrency=get_settings().llm_max_concurrency,
+    max_queue=get_settings().llm_max_queue,
+    queue_timeout=get_settings().llm_queue_timeout,
+)
+
+
+def get_concurrency_stats() -> dict[str, Any]:
+    """Single-flight and limiter statistics for monitoring."""
+    return {"single_flight": _single_flight.get_stats(), "limiter": _limiter.get_stats()}
+
+
+_breaker = CircuitBreaker(
+    window_seconds=get_settings().llm_breaker_window_seconds,
+    min_calls=get_settings().llm_breaker_min_calls,
+    error_rate_threshold=get_settings().llm_breaker_error_rate,
+    slow_call_seconds=get_settings().llm_breaker_slow_call_seconds,
+    slow_rate_threshold=get_settings().llm_breaker_slow_rate,
+    open_seconds=get_settings().llm_breaker_open_seconds,
+    half_open_max_calls=get_settings().llm_breaker_half_open_calls,
+)
+
+
+def _breaker_allows() -> bool:
+    return not get_settings().llm_breaker_enabled or _breaker.allow_request()
+
+
+def _record_outcome(stats, error: Optional[BaseException] = None, latency: float = 0.0) -> None:
+    """Feed one upstream attempt into the model stats and the circuit breaker."""
+    if error is None:
+        stats.record_success(latency)
+        _breaker.record_success(latency)
+        return
+    stats.record_error(error)
+    if is_retryable(error):
+        _breaker.record_failure()
+    else:
+        # Client errors (400, 401, 404...) mean OpenRouter answered; that's healthy
+        _breaker.record_success(latency)
+
+
+def get_breaker_stats() -> dict[str, Any]:
+    return {"enabled": get_settings().llm_breaker_enabled, **_breaker.get_stats()}
+
+
+def get_models_stats() -> dict[str, Any]:
+    """Configured model chain and per-model latency/error statistics."""
+    return {"chain": get_model_chain(), "stats": all_model_stats()}
+
+
 def get_openrouter_api_key() -> str:
     """Get OpenRouter API key from environment."""
     key = os.getenv("OPENROUTER_API_KEY", "")
@@ -26,19 +207,29 @@ def get_openrouter_api_key() -> str:
     return key
 
 
-def build_system_prompt(profile: dict, stage: str, universities: list[dict], all_universities: list[dict] = None) -> str:
+_TOKEN_PIECES = re.compile(r"[A-Za-z]+|[0-9]+|[^\sA-Za-z0-9]")
+
+
+def estimate_tokens(text: str) -> int:
     """
-    Build a comprehensive system prompt that gives the AI full context
-    about the user's profile, current stage, and university choices.
+    Approximate BPE token count without a tokenizer: words cost about one
+    token per 4 letters, numbers one per 3 digits, each punctuation mark one,
+    and non-ASCII symbols (emoji, accents) two.
     """
-    countries = profile.get("preferred_countries", [])
-    if isinstance(countries, str):
-        countries = countries.split(",")
-    
-    shortlisted = [u for u in universities if u.get("status") == "shortlisted"]
-    locked = [u for u in universities if u.get("status") == "locked"]
-    
-    # Calculate profile gaps
+    total = 0
+    for piece in _TOKEN_PIECES.findall(text):
+        if piece.isalpha() and piece.isascii():
+            total += (len(piece) + 3) // 4
+        elif piece.isdigit():
+            total += (len(piece) + 2) // 3
+        elif piece.isascii():
+            total += 1
+        else:
+            total += 2 * len(piece)
+    return total
+
+
+def _profile_gaps(profile: dict) -> list[str]:
     gaps = []
     if profile.get("ielts_toefl_status") != "completed":
         gaps.append("English proficiency test (IELTS/TOEFL)")
@@ -48,8 +239,10 @@ def build_system_prompt(profile: dict, stage: str, universities: list[dict], all
         gaps.append("Statement of Purpose")
     if not profile.get("gpa"):
         gaps.append("GPA/grades not specified")
-    
-    # Calculate profile strength
+    return gaps
+
+
+def _profile_strength(profile: dict, shortlisted: list, locked: list) -> int:
     strength_score = 0
     if profile.get("ielts_toefl_status") == "completed": strength_score += 25
     elif profile.get("ielts_toefl_status") == "in_progress": strength_score += 10
@@ -60,8 +253,10 @@ def build_system_prompt(profile: dict, stage: str, universities: list[dict], all
     if profile.get("gpa"): strength_score += 15
     if len(shortlisted) >= 3: strength_score += 5
     if len(locked) >= 1: strength_score += 5
-    
-    prompt = f"""You are an elite AI Study Abroad Counsellor. You don't just give advice—you TAKE ACTIONS.
+    return strength_score
+
+
+STATIC_PROMPT_PREFIX = """You are an elite AI Study Abroad Counsellor. You don't just give advice—you TAKE ACTIONS.
 
 ## Your Core Responsibility
 Help this student succeed in their study abroad journey by:
@@ -70,6 +265,99 @@ Help this student succeed in their study abroad journey by:
 3. EXECUTING actions directly (shortlist, lock, create tasks)
 4. Guiding them step-by-step through each stage
 
+## YOUR SUPERPOWERS (Use Them!)
+
+You can EXECUTE these actions directly. The system will perform them automatically:
+
+| Action | What It Does | When To Use |
+|--------|--------------|-------------|
+| `shortlist_university` | Adds a university to student's shortlist | When recommending Dream/Target/Safe schools |
+| `lock_university` | Commits student to a university | When student is ready to focus on applications |
+| `create_todo` | Creates a task in student's to-do list | For actionable next steps |
+| `recommend_university` | Shows a university card with full details | When explaining why a school fits |
+
+
+## Action Format (CRITICAL!)
+Include actions at the END of your response in this EXACT format:
+```actions
+[
+  {"type": "shortlist_university", "payload": {"university_id": 1, "category": "dream", "reason": "Top CS program within budget"}},
+  {"type": "lock_university", "payload": {"university_id": 1, "reason": "Best fit for your goals"}},
+  {"type": "create_todo", "payload": {"title": "Schedule IELTS exam", "description": "Book at least 8 weeks before application deadline", "university_id": 1}},
+  {"type": "recommend_university", "payload": {"university_id": 2, "category": "target", "fit_reason": "Matches your budget and field", "risk": "Competitive admissions"}}
+]
+```
+
+**IMPORTANT for create_todo**: When creating tasks for a LOCKED university, ALWAYS include "university_id" with the university's ID. This links the task to that specific university. Only omit university_id for general tasks not specific to any university.
+
+
+
+## Response Style
+1. **Be proactive** — Don't just answer, take action
+2. **Be specific** — Reference exact universities by name and ID
+3. **Explain reasoning** — Why is this school Dream/Target/Safe for THIS student?
+4. **Create urgency** — What should they do RIGHT NOW?
+5. **Celebrate progress** — Acknowledge what they've accomplished
+
+## Stage-Specific Guidance
+- **Building Profile**: Focus on exam prep, SOP drafting, completing profile
+- **Discovering Universities**: Actively shortlist 3-5 schools (mix of Dream/Target/Safe)
+- **Finalizing Universities**: Push for locking decisions, compare options
+- **Preparing Applications**: Create document checklists, deadline tasks, SOP review
+
+The student's profile, shortlist and candidate universities follow.
+"""
+
+
+def build_system_prompt(
+    profile: dict,
+    stage: str,
+    universities: list[dict],
+    all_universities: list[dict] = None,
+    catalog_size: int = None,
+    universities_token_budget: int = None,
+    compact: Optional[bool] = None,
+    token_budget: Optional[int] = None,
+) -> str:
+    """
+    Build a comprehensive system prompt that gives the AI full context
+    about the user's profile, current stage, and university choices.
+
+    `all_universities` should already be ranked best-first (see
+    university_ranking); entries are added until `universities_token_budget`
+    is spent. `catalog_size` is the total number of universities available.
+
+    With `compact` (default: LLM_PROMPT_MODE=compact) the terse encoding from
+    build_compact_system_prompt is used instead, capped at `token_budget`.
+    """
+    if compact is None:
+        compact = get_settings().llm_prompt_mode == "compact"
+    if compact:
+        return build_compact_system_prompt(
+            profile,
+            stage,
+            universities,
+            all_universities,
+            catalog_size=catalog_size,
+            token_budget=token_budget or get_settings().llm_prompt_token_budget,
+        )
+
+    countries = profile.get("preferred_countries", [])
+    if isinstance(countries, str):
+        countries = countries.split(",")
+    
+    shortlisted = [u for u in universities if u.get("status") == "shortlisted"]
+    locked = [u for u in universities if u.get("status") == "locked"]
+    
+    # Calculate profile gaps and strength
+    gaps = _profile_gaps(profile)
+    strength_score = _profile_strength(profile, shortlisted, locked)
+    
+    # Everything above is STATIC_PROMPT_PREFIX (identical for every student,
+    # so provider prefix caches can reuse it); per-student context follows.
+    prompt = STATIC_PROMPT_PREFIX + f"""
+# THIS STUDENT
+
 ## Student Profile (Profile Strength: {strength_score}%)
 - **Education**: {profile.get('current_education_level', 'Unknown')} in {profile.get('degree_major', 'Unknown')}
 - **Graduation Year**: {profile.get('graduation_year', 'Unknown')}
@@ -107,131 +395,638 @@ Help this student succeed in their study abroad journey by:
             uni = u.get("university", {})
             prompt += f"- **{uni.get('name', 'Unknown')}** ({uni.get('country', '')}) — ID: {u.get('university_id')}, COMMITTED\n"
 
-    # Add available universities context
+    # Add available universities context (best matches first, within budget)
     if all_universities:
-        prompt += f"\n## Available Universities for Recommendation ({len(all_universities)} in database)\n"
-        for uni in all_universities[:10]:
-            prompt += f"- ID {uni.get('id')}: **{uni.get('name')}** ({uni.get('country')}) — ${uni.get('tuition_per_year', 0):,}/yr, {uni.get('field_of_study')}\n"
-        if len(all_universities) > 10:
-            prompt += f"... and {len(all_universities) - 10} more.\n"
+        total = catalog_size if catalog_size is not None else len(all_universities)
+        lines = []
+        used = 0
+        for uni in all_universities:
+            line = f"- ID {uni.get('id')}: **{uni.get('name')}** ({uni.get('country')}) — ${uni.get('tuition_per_year', 0):,}/yr, {uni.get('field_of_study')}, {uni.get('degree_level', '')}\n"
+            cost = estimate_tokens(line)
+            if universities_token_budget is not None and lines and used + cost > universities_token_budget:
+                break
+            lines.append(line)
+            used += cost
+        prompt += f"\n## Best-Matching Universities for This Student ({len(lines)} of {total} in database)\n"
+        prompt += "".join(lines)
+        if total > len(lines):
+            prompt += f"... and {total - len(lines)} more.\n"
+    return prompt
 
-    prompt += """
 
-## YOUR SUPERPOWERS (Use Them!)
+COMPACT_INSTRUCTIONS = """You are an AI study-abroad counsellor. Advise AND act: shortlist, lock and create tasks yourself.
+End replies that take actions with an actions block (JSON list), e.g.:
+```actions
+[{"type":"shortlist_university","payload":{"university_id":1,"category":"dream|target|safe","reason":"..."}},
+{"type":"lock_university","payload":{"university_id":1,"reason":"..."}},
+{"type":"create_todo","payload":{"title":"...","description":"...","university_id":1}},
+{"type":"recommend_university","payload":{"university_id":2,"category":"target","fit_reason":"...","risk":"..."}}]
+```
+create_todo for a locked university must include its university_id; omit it for general tasks.
+Only use university IDs listed below."""
 
-You can EXECUTE these actions directly. The system will perform them automatically:
+COMPACT_STYLE = "STYLE: proactive; name universities with their ID; explain why each is dream/target/safe for this student; give concrete next steps; acknowledge progress."
 
-| Action | What It Does | When To Use |
-|--------|--------------|-------------|
-| `shortlist_university` | Adds a university to student's shortlist | When recommending Dream/Target/Safe schools |
-| `lock_university` | Commits student to a university | When student is ready to focus on applications |
-| `create_todo` | Creates a task in student's to-do list | For actionable next steps |
-| `recommend_university` | Shows a university card with full details | When explaining why a school fits |
+# Invariant head of every compact prompt; kept first so it is a cacheable prefix
+COMPACT_STATIC_PREFIX = COMPACT_INSTRUCTIONS + "\n" + COMPACT_STYLE
 
+COMPACT_STAGE_GUIDANCE = {
+    "building_profile": "exam prep, SOP drafting, completing the profile",
+    "discovering_universities": "shortlist 3-5 schools mixing dream/target/safe",
+    "finalizing_universities": "push for locking decisions, compare options",
+    "preparing_applications": "document checklists, deadline tasks, SOP review",
+}
 
-## Action Format (CRITICAL!)
-Include actions at the END of your response in this EXACT format:
-```actions
-[
-  {"type": "shortlist_university", "payload": {"university_id": 1, "category": "dream", "reason": "Top CS program within budget"}},
-  {"type": "lock_university", "payload": {"university_id": 1, "reason": "Best fit for your goals"}},
-  {"type": "create_todo", "payload": {"title": "Schedule IELTS exam", "description": "Book at least 8 weeks before application deadline", "university_id": 1}},
-  {"type": "recommend_university", "payload": {"university_id": 2, "category": "target", "fit_reason": "Matches your budget and field", "risk": "Competitive admissions"}}
-]
-```
 
-**IMPORTANT for create_todo**: When creating tasks for a LOCKED university, ALWAYS include "university_id" with the university's ID. This links the task to that specific university. Only omit university_id for general tasks not specific to any university.
+def _fit_sections(sections: list[dict], token_budget: int) -> str:
+    """
+    Join prompt sections, trimming until the estimate fits `token_budget`.
 
+    Each section is {"priority": int, "lines": [...], "trim_rows": bool}.
+    Priority 0 is never dropped. Otherwise the highest-numbered (least
+    important) section goes first: row-trimmable sections lose their last
+    row, others are dropped whole.
+    """
+    sections = [dict(sec, lines=list(sec["lines"])) for sec in sections]
 
+    def render() -> str:
+        return "\n".join(line for sec in sections for line in sec["lines"])
 
-## Response Style
-1. **Be proactive** — Don't just answer, take action
-2. **Be specific** — Reference exact universities by name and ID
-3. **Explain reasoning** — Why is this school Dream/Target/Safe for THIS student?
-4. **Create urgency** — What should they do RIGHT NOW?
-5. **Celebrate progress** — Acknowledge what they've accomplished
+    text = render()
+    while estimate_tokens(text) > token_budget:
+        candidates = [sec for sec in sections if sec["priority"] > 0 and sec["lines"]]
+        if not candidates:
+            break
+        victim = max(candidates, key=lambda sec: sec["priority"])
+        # Keep a trimmable section's header line while it still has rows
+        if victim.get("trim_rows") and len(victim["lines"]) > 2:
+            victim["lines"].pop()
+        else:
+            victim["lines"] = []
+        text = render()
+    return text
 
-## Stage-Specific Guidance
-- **Building Profile**: Focus on exam prep, SOP drafting, completing profile
-- **Discovering Universities**: Actively shortlist 3-5 schools (mix of Dream/Target/Safe)
-- **Finalizing Universities**: Push for locking decisions, compare options
-- **Preparing Applications**: Create document checklists, deadline tasks, SOP review
-"""
-    return prompt
 
+def build_compact_system_prompt(
+    profile: dict,
+    stage: str,
+    universities: list[dict],
+    all_universities: list[dict] = None,
+    catalog_size: int = None,
+    token_budget: int = 1200,
+) -> str:
+    """
+    Terse system prompt: key=value profile rows and pipe-separated university
+    tables, no markdown tables or emoji, and guidance for the current stage
+    only. Lowest-priority sections are trimmed to stay within `token_budget`.
+    """
+    countries = profile.get("preferred_countries", [])
+    if isinstance(countries, str):
+        countries = countries.split(",")
+    shortlisted = [u for u in universities if u.get("status") == "shortlisted"]
+    locked = [u for u in universities if u.get("status") == "locked"]
+    gaps = _profile_gaps(profile)
 
-async def chat_with_llm(
-    messages: list[dict],
-    system_prompt: str,
-    model: str = "arcee-ai/trinity-large-preview:free:nitro",
-) -> dict[str, Any]:
+    profile_lines = [
+        "PROFILE "
+        + ";".join(
+            [
+                f"edu={profile.get('current_education_level', '?')} {profile.get('degree_major', '?')}",
+                f"grad={profile.get('graduation_year', '?')}",
+                f"gpa={profile.get('gpa') or 'missing'}",
+                f"goal={str(profile.get('intended_degree', '?')).lower()} {profile.get('field_of_study', '?')}",
+                f"intake={profile.get('target_intake_year', '?')}",
+                f"countries={','.join(c.strip() for c in countries) or 'any'}",
+                f"budget={profile.get('budget_per_year', 0)}/yr",
+                f"funding={profile.get('funding_plan', '?')}",
+                f"strength={_profile_strength(profile, shortlisted, locked)}%",
+            ]
+        ),
+        f"EXAMS ielts_toefl={profile.get('ielts_toefl_status', '?')};gre_gmat={profile.get('gre_gmat_status', '?')};sop={profile.get('sop_status', '?')}",
+        f"STAGE {stage}",
+        "GAPS " + (",".join(gaps) if gaps else "none"),
+    ]
+
+    def uni_row(u: dict) -> str:
+        uni = u.get("university", {})
+        return f"{u.get('university_id')}|{uni.get('name', '?')}|{uni.get('country', '')}"
+
+    locked_lines = []
+    if locked:
+        locked_lines = ["LOCKED id|name|country (committed; link tasks to these IDs)"]
+        locked_lines += [uni_row(u) for u in locked]
+
+    shortlist_lines = ["SHORTLIST none yet"]
+    if shortlisted:
+        shortlist_lines = ["SHORTLIST id|name|country|category"]
+        shortlist_lines += [f"{uni_row(u)}|{u.get('category', 'target')}" for u in shortlisted]
+
+    sections = [
+        {"priority": 0, "lines": [COMPACT_STATIC_PREFIX]},
+        {"priority": 0, "lines": profile_lines},
+        {"priority": 1, "lines": locked_lines},
+        {"priority": 2, "lines": shortlist_lines},
+    ]
+
+    if all_universities:
+        total = catalog_size if catalog_size is not None else len(all_universities)
+        sections.append(
+            {
+                "priority": 3,
+                "trim_rows": True,
+                "lines": [f"CANDIDATES id|name|country|tuition|field|degree (best match first; {total} in catalog)"]
+                + [
+                    f"{u.get('id')}|{u.get('name')}|{u.get('country')}|{u.get('tuition_per_year', 0)}|{u.get('field_of_study')}|{u.get('degree_level', '')}"
+                    for u in all_universities
+                ],
+            }
+        )
+
+    guidance = COMPACT_STAGE_GUIDANCE.get(stage)
+    if guidance:
+        sections.append({"priority": 4, "lines": [f"FOCUS NOW: {guidance}"]})
+
+    return _fit_sections(sections, token_budget)
+
+
+DEFAULT_MODEL = "arcee-ai/trinity-large-preview:free:nitro"
+ACTIONS_MARKER = "```actions"
+
+BUSY_REPLY = "I'm helping a lot of students right now. Please try again in a moment."
+DEGRADED_REPLY = "The AI service is temporarily unavailable, so I can only offer basic guidance right now. Keep working through your profile, exams and shortlist, and ask me again in a few minutes."
+NO_API_KEY_REPLY = "I'm your AI counsellor. To enable full AI capabilities, please configure the OPENROUTER_API_KEY environment variable. For now, I can provide basic guidance based on your profile."
+
+
+# Providers that only cache a prefix when it is marked with cache_control;
+# the rest (OpenAI, DeepSeek, ...) cache matching prefixes automatically.
+CACHE_CONTROL_MODEL_PREFIXES = ("anthropic/", "google/gemini")
+
+_STATIC_PREFIXES = (STATIC_PROMPT_PREFIX, COMPACT_STATIC_PREFIX)
+
+
+def _system_content(system_prompt: str, model: str):
     """
-    Send a chat request to OpenRouter and get the AI response.
-    
-    Returns:
-        dict with "content" (str) and "actions" (list of action dicts)
+    The system message content for `model`. When the prompt starts with one
+    of the static prefixes and the provider wants explicit hints, the prefix
+    goes in its own part marked cache_control so it can be served from cache.
     """
-    api_key = get_openrouter_api_key()
-    
-    if not api_key:
-        # Fallback to rule-based response if no API key
-        return {
-            "content": "I'm your AI counsellor. To enable full AI capabilities, please configure the OPENROUTER_API_KEY environment variable. For now, I can provide basic guidance based on your profile.",
-            "actions": []
-        }
-    
-    # Build the request
-    full_messages = [{"role": "system", "content": system_prompt}]
+    if not get_settings().llm_prompt_cache_hints or not model.startswith(
+        CACHE_CONTROL_MODEL_PREFIXES
+    ):
+        return system_prompt
+    for prefix in _STATIC_PREFIXES:
+        if system_prompt.startswith(prefix) and len(system_prompt) > len(prefix):
+            return [
+                {"type": "text", "text": prefix, "cache_control": {"type": "ephemeral"}},
+                {"type": "text", "text": system_prompt[len(prefix):]},
+            ]
+    return system_prompt
+
+
+def _build_request(
+    api_key: str, messages: list[dict], system_prompt: str, model: str
+) -> tuple[dict, dict]:
+    """Build the OpenRouter headers and JSON payload for a chat completion."""
+    full_messages = [{"role": "system", "content": _system_content(system_prompt, model)}]
     full_messages.extend(messages)
-    
+
     headers = {
         "Authorization": f"Bearer {api_key}",
         "Content-Type": "application/json",
         "HTTP-Referer": "http://localhost:3000",
         "X-Title": "AI Counsellor",
     }
-    
+
     payload = {
         "model": model,
         "messages": full_messages,
         "temperature": 0.7,
         "max_tokens": 1500,
+        # Ask OpenRouter to report token usage, including cached prompt tokens
+        "usage": {"include": True},
     }
+    return headers, payload
+
+
+def parse_actions(content: str) -> tuple[str, list[dict]]:
+    """
+    Split a completion into the text shown to the user and the trailing
+    ```actions block (parsed as JSON). Returns (content, actions).
+    """
+    actions = []
+    if ACTIONS_MARKER in content:
+        try:
+            actions_start = content.index(ACTIONS_MARKER) + len(ACTIONS_MARKER)
+            actions_end = content.index("```", actions_start)
+            actions_json = content[actions_start:actions_end].strip()
+            actions = json.loads(actions_json)
+            # Remove the actions block from displayed content
+            content = content[:content.index(ACTIONS_MARKER)].strip()
+        except (ValueError, json.JSONDecodeError):
+            pass
+    return content, actions
+
+
+def _partial_marker_length(text: str) -> int:
+    """Length of the longest suffix of `text` that could start ACTIONS_MARKER."""
+    for size in range(min(len(ACTIONS_MARKER) - 1, len(text)), 0, -1):
+        if ACTIONS_MARKER.startswith(text[-size:]):
+            return size
+    return 0
+
+
+def get_model_chain(model: Optional[str] = None) -> list[str]:
+    """Models to try in order: an explicit model, else the configured chain."""
+    if model:
+        return [model]
+    return get_settings().llm_models or [DEFAULT_MODEL]
+
+
+async def _request_completion(
+    api_key: str, messages: list[dict], system_prompt: str, model: str
+) -> dict[str, Any]:
+    """One upstream (non-streaming) attempt against one model. Raises on failure."""
+    settings = get_settings()
+    stats = get_model_stats(model)
+    headers, payload = _build_request(api_key, messages, system_prompt, model)
+
+    async with _limiter.slot():
+        client = get_http_client()
+        _pool_counters["requests"] += 1
+        _pool_counters["in_flight"] += 1
+        started = time.perf_counter()
+        try:
+            # The deadline starts once we hold a slot, so queueing isn't billed to the model
+            response = await asyncio.wait_for(
+                client.post(
+                    OPENROUTER_API_URL,
+                    headers=headers,
+                    json=payload,
+                    extensions={"trace": _trace_connections},
+                ),
+                settings.llm_attempt_timeout,
+            )
+            response.raise_for_status()
+        except Exception as e:
+            _record_outcome(stats, error=e, latency=time.perf_counter() - started)
+            raise
+        finally:
+            _pool_counters["in_flight"] -= 1
+    _record_outcome(stats, latency=time.perf_counter() - started)
+    data = response.json()
+    stats.record_usage(data.get("usage"))
+
+    content = data.get("choices", [{}])[0].get("message", {}).get("content", "")
+    content, actions = parse_actions(content)
+    return {"content": content, "actions": actions}
+
+
+def _hedge_delay(model: str) -> Optional[float]:
+    """Seconds to wait on `model` before hedging, or None to not hedge."""
+    settings = get_settings()
+    if not settings.llm_hedge_enabled:
+        return None
+    if settings.llm_hedge_after_ms > 0:
+        return settings.llm_hedge_after_ms / 1000
+    stats = get_model_stats(model)
+    if len(stats.latencies) < settings.llm_hedge_min_samples:
+        return None
+    return stats.percentile(0.95)
+
+
+async def _hedged_completion(
+    api_key: str,
+    messages: list[dict],
+    system_prompt: str,
+    model: str,
+    hedge_model: Optional[str],
+) -> dict[str, Any]:
+    """
+    Attempt `model`; if it hasn't answered by its p95 latency, also fire
+    `hedge_model` and return whichever succeeds first.
+    """
+    delay = _hedge_delay(model) if hedge_model else None
+    if delay is None:
+        return await _request_completion(api_key, messages, system_prompt, model)
+
+    primary = asyncio.ensure_future(
+        _request_completion(api_key, messages, system_prompt, model)
+    )
+    pending = {primary}
+    try:
+        done, _ = await asyncio.wait(pending, timeout=delay)
+        if done:
+            return primary.result()
+
+        hedge = asyncio.ensure_future(
+            _request_completion(api_key, messages, system_prompt, hedge_model)
+        )
+        pending.add(hedge)
+        error: Optional[BaseException] = None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    if task is hedge:
+                        get_model_stats(hedge_model).hedges_won += 1
+                    return task.result()
+                error = task.exception()
+        raise error
+    finally:
+        for task in pending:
+            task.cancel()
+
+
+async def _complete_with_fallback(
+    api_key: str, messages: list[dict], system_prompt: str, models: list[str]
+) -> dict[str, Any]:
+    """
+    Walk the model chain. Retryable failures (429, 5xx, timeouts, connection
+    errors) are retried with jittered exponential backoff before moving on to
+    the next model; other failures move on immediately.
+    """
+    settings = get_settings()
+    last_error: Optional[BaseException] = None
+
+    for index, model in enumerate(models):
+        hedge_model = models[index + 1] if index + 1 < len(models) else None
+        for attempt in range(settings.llm_max_retries + 1):
+            try:
+                if attempt == 0:
+                    return await _hedged_completion(
+                        api_key, messages, system_prompt, model, hedge_model
+                    )
+                return await _request_completion(api_key, messages, system_prompt, model)
+            except LLMOverloadedError:
+                raise
+            except Exception as e:
+                last_error = e
+                if not is_retryable(e):
+                    break
+                if _breaker.is_open():
+                    raise CircuitOpenError("OpenRouter circuit opened") from e
+                if attempt < settings.llm_max_retries:
+                    await asyncio.sleep(
+                        backoff_delay(
+                            attempt, settings.llm_backoff_base, settings.llm_backoff_max, e
+                        )
+                    )
+
+    raise last_error
+
+
+def _error_reply(error: BaseException) -> str:
+    if isinstance(error, LLMOverloadedError):
+        return BUSY_REPLY
+    if isinstance(error, CircuitOpenError):
+        return DEGRADED_REPLY
+    if isinstance(error, httpx.HTTPStatusError):
+        return f"I encountered an error connecting to the AI service. Please try again. (Error: {error.response.status_code})"
+    return f"Something went wrong. Please try again. (Error: {str(error)})"
+
+
+async def chat_with_llm(
+    messages: list[dict],
+    system_prompt: str,
+    model: Optional[str] = None,
+    cache: bool = True,
+) -> dict[str, Any]:
+    """
+    Send a chat request to OpenRouter and get the AI response.
+
+    Without an explicit `model` the configured fallback chain (LLM_MODELS) is
+    used, with retries and optional hedging.
+
+    Successful responses are cached on (model, system prompt, messages);
+    pass cache=False for calls that must not reuse an earlier answer.
+    Identical calls already in flight share one upstream request.
+    
+    Returns:
+        dict with "content" (str) and "actions" (list of action dicts).
+        Replies that did not come from the model (no API key, circuit open,
+        errors) also carry "degraded": True.
+    """
+    api_key = get_openrouter_api_key()
+    
+    if not api_key:
+        # Fallback to rule-based response if no API key
+        return {"content": NO_API_KEY_REPLY, "actions": [], "degraded": True}
+    
+    models = get_model_chain(model)
+    key = make_cache_key("|".join(models), system_prompt, messages)
+    response_cache = get_cache() if cache else None
+    if response_cache is not None:
+        cached = await response_cache.get(key)
+        if cached is not None:
+            return {"content": cached["content"], "actions": list(cached["actions"])}
+    
+    # Fail fast while OpenRouter is known to be unhealthy
+    if not _breaker_allows():
+        return {"content": DEGRADED_REPLY, "actions": [], "degraded": True}
     
     try:
-        async with httpx.AsyncClient(timeout=60.0) as client:
-            response = await client.post(
+        result = await _single_flight.run(
+            key, lambda: _complete_with_fallback(api_key, messages, system_prompt, models)
+        )
+    except Exception as e:
+        return {"content": _error_reply(e), "actions": [], "degraded": True}
+
+    if response_cache is not None and result["content"]:
+        await response_cache.set(key, models[0], result)
+    # Coalesced callers share `result`; hand each one its own copy
+    return {"content": result["content"], "actions": list(result["actions"])}
+
+
+async def _stream_deltas(
+    api_key: str, messages: list[dict], system_prompt: str, model: str
+) -> AsyncIterator[str]:
+    """Raw text deltas from one streaming attempt against one model."""
+    stats = get_model_stats(model)
+    headers, payload = _build_request(api_key, messages, system_prompt, model)
+    payload["stream"] = True
+
+    # A stream holds its slot for the whole generation
+    async with _limiter.slot():
+        client = get_http_client()
+        _pool_counters["requests"] += 1
+        _pool_counters["in_flight"] += 1
+        started = time.perf_counter()
+        # Time to the first delta is the stream's latency: the generation time
+        # depends on the reply's length, and would read as slow calls to the
+        # breaker and skew the p95 used for hedging
+        latency: Optional[float] = None
+        try:
+            async with client.stream(
+                "POST",
                 OPENROUTER_API_URL,
                 headers=headers,
                 json=payload,
-            )
-            response.raise_for_status()
-            data = response.json()
-        
-        content = data.get("choices", [{}])[0].get("message", {}).get("content", "")
-        
-        # Parse actions from the response
-        actions = []
-        if "```actions" in content:
+                extensions={"trace": _trace_connections},
+            ) as response:
+                response.raise_for_status()
+                async for line in response.aiter_lines():
+                    # SSE comments (": OPENROUTER PROCESSING") and blank lines
+                    if not line.startswith("data:"):
+                        continue
+                    data = line[len("data:"):].strip()
+                    if data == "[DONE]":
+                        break
+                    try:
+                        chunk = json.loads(data)
+                    except json.JSONDecodeError:
+                        continue
+
+                    # The final chunk carries usage (and may have no choices)
+                    stats.record_usage(chunk.get("usage"))
+                    choices = chunk.get("choices") or [{}]
+                    delta = choices[0].get("delta", {}).get("content")
+                    if delta:
+                        if latency is None:
+                            latency = time.perf_counter() - started
+                        yield delta
+        except Exception as e:
+            if latency is None:
+                latency = time.perf_counter() - started
+            _record_outcome(stats, error=e, latency=latency)
+            raise
+        finally:
+            _pool_counters["in_flight"] -= 1
+    if latency is None:
+        latency = time.perf_counter() - started
+    _record_outcome(stats, latency=latency)
+
+
+async def _open_stream(
+    api_key: str, messages: list[dict], system_prompt: str, models: list[str]
+) -> tuple[AsyncIterator[str], str]:
+    """
+    Start a stream, walking the model chain with retries until one produces
+    its first delta within the attempt deadline. Returns (stream, first delta).
+    Once text has reached the client there is no retrying.
+    """
+    settings = get_settings()
+    last_error: Optional[BaseException] = None
+
+    for model in models:
+        for attempt in range(settings.llm_max_retries + 1):
+            deltas = _stream_deltas(api_key, messages, system_prompt, model)
             try:
-                actions_start = content.index("```actions") + len("```actions")
-                actions_end = content.index("```", actions_start)
-                actions_json = content[actions_start:actions_end].strip()
-                actions = json.loads(actions_json)
-                # Remove the actions block from displayed content
-                content = content[:content.index("```actions")].strip()
-            except (ValueError, json.JSONDecodeError):
-                pass
-        
-        return {"content": content, "actions": actions}
-        
-    except httpx.HTTPStatusError as e:
-        return {
-            "content": f"I encountered an error connecting to the AI service. Please try again. (Error: {e.response.status_code})",
-            "actions": []
-        }
+                first = await asyncio.wait_for(
+                    deltas.__anext__(), settings.llm_attempt_timeout
+                )
+                return deltas, first
+            except StopAsyncIteration:
+                return deltas, ""
+            except LLMOverloadedError:
+                raise
+            except Exception as e:
+                if isinstance(e, asyncio.TimeoutError):
+                    _record_outcome(get_model_stats(model), error=e)
+                await deltas.aclose()
+                last_error = e
+                if not is_retryable(e):
+                    break
+                if _breaker.is_open():
+                    raise CircuitOpenError("OpenRouter circuit opened") from e
+                if attempt < settings.llm_max_retries:
+                    await asyncio.sleep(
+                        backoff_delay(
+                            attempt, settings.llm_backoff_base, settings.llm_backoff_max, e
+                        )
+                    )
+
+    raise last_error
+
+
+async def stream_chat_with_llm(
+    messages: list[dict],
+    system_prompt: str,
+    model: Optional[str] = None,
+    cache: bool = True,
+) -> AsyncIterator[dict[str, Any]]:
+    """
+    Stream a chat completion from OpenRouter.
+
+    Yields {"type": "delta", "content": str} for each chunk of visible text.
+    The trailing ```actions block is held back from the deltas; once the
+    stream ends a single {"type": "done", "content": str, "actions": list}
+    event is yielded with the full visible text and the parsed actions.
+
+    If the upstream fails before any text was sent, the fallback reply is
+    streamed as usual (flagged "degraded"). If it fails after some text was
+    sent, the stream ends with {"type": "error", "detail": str} instead of
+    "done": the partial reply is incomplete and shouldn't be stored.
+
+    Shares the response cache with chat_with_llm; a hit is replayed as one
+    delta followed by the done event. Retries and model fallback apply until
+    the first token arrives; streams are not hedged.
+    """
+    api_key = get_openrouter_api_key()
+
+    if not api_key:
+        yield {"type": "delta", "content": NO_API_KEY_REPLY}
+        yield {"type": "done", "content": NO_API_KEY_REPLY, "actions": [], "degraded": True}
+        return
+
+    models = get_model_chain(model)
+    response_cache = get_cache() if cache else None
+    cache_key = None
+    if response_cache is not None:
+        cache_key = make_cache_key("|".join(models), system_prompt, messages)
+        cached = await response_cache.get(cache_key)
+        if cached is not None:
+            yield {"type": "delta", "content": cached["content"]}
+            yield {"type": "done", "content": cached["content"], "actions": list(cached["actions"])}
+            return
+
+    if not _breaker_allows():
+        yield {"type": "delta", "content": DEGRADED_REPLY}
+        yield {"type": "done", "content": DEGRADED_REPLY, "actions": [], "degraded": True}
+        return
+
+    buffer = ""
+    emitted = 0  # how much of `buffer` has been sent as deltas
+    in_actions = False
+
+    try:
+        deltas, first = await _open_stream(api_key, messages, system_prompt, models)
+        pending = [first] if first else []
+        async for delta in _chain_first(pending, deltas):
+            buffer += delta
+            if in_actions:
+                continue
+
+            marker_at = buffer.find(ACTIONS_MARKER, emitted)
+            if marker_at >= 0:
+                in_actions = True
+                safe_end = marker_at
+            else:
+                safe_end = len(buffer) - _partial_marker_length(buffer)
+            if safe_end > emitted:
+                yield {"type": "delta", "content": buffer[emitted:safe_end]}
+                emitted = safe_end
     except Exception as e:
-        return {
-            "content": f"Something went wrong. Please try again. (Error: {str(e)})",
-            "actions": []
-        }
+        error = _error_reply(e)
+        if emitted:
+            # Part of the reply is already out: don't splice the fallback onto it
+            yield {"type": "error", "detail": error}
+            return
+        yield {"type": "delta", "content": error}
+        yield {"type": "done", "content": error, "actions": [], "degraded": True}
+        return
+
+    # Flush text that was held back as a possible marker prefix
+    if not in_actions and len(buffer) > emitted:
+        yield {"type": "delta", "content": buffer[emitted:]}
+
+    content, actions = parse_actions(buffer)
+    if response_cache is not None and content:
+        await response_cache.set(cache_key, models[0], {"content": content, "actions": actions})
+    yield {"type": "done", "content": content, "actions": actions}
+
+
+async def _chain_first(first: list[str], rest: AsyncIterator[str]) -> AsyncIterator[str]:
+    for item in first:
+        yield item
+    async for item in rest:
+        yield item
@@ -0,0 +1,201 @@
+"""
+Response cache for LLM completions.
+
+Completions are keyed on a hash of the model, the system prompt and the
+messages (whitespace-normalized). Lookups go through an in-process LRU first
+and, when enabled, a shared database tier (the `llm_cache` table) second.
+"""
+
+import asyncio
+import hashlib
+import json
+import re
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Any, Optional
+
+from config import get_settings
+from database import SessionLocal
+from models import LLMCacheEntry
+
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def _normalize(text: str) -> str:
+    return _WHITESPACE.sub(" ", text or "").strip()
+
+
+def make_cache_key(model: str, system_prompt: str, messages: list[dict]) -> str:
+    """Stable hash of everything that determines a completion."""
+    normalized = {
+        "model": model,
+        "system": _normalize(system_prompt),
+        "messages": [
+            {
+                "role": m.get("role", ""),
+                # Casing and spacing of the student's text don't change the answer
+                "content": _normalize(m.get("content", "")).casefold(),
+            }
+            for m in messages
+        ],
+    }
+    encoded = json.dumps(normalized, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+class LLMResponseCache:
+    """
+    Two-tier cache: an LRU dict bounded by entry count and total bytes, plus
+    an optional database tier shared between workers.
+    """
+
+    def __init__(
+        self,
+        max_entries: int,
+        max_bytes: int,
+        ttl_seconds: int,
+        db_tier: bool = False,
+    ):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.db_tier = db_tier
+
+        # key -> (expires_at monotonic, size in bytes, response dict)
+        self._entries: "OrderedDict[str, tuple[float, int, dict]]" = OrderedDict()
+        self._bytes = 0
+        self.stats = {
+            "memory_hits": 0,
+            "db_hits": 0,
+            "misses": 0,
+            "evictions": 0,
+            "expirations": 0,
+        }
+
+    # ---- memory tier ----
+
+    def _get_memory(self, key: str) -> Optional[dict]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, size, response = entry
+        if expires_at <= time.monotonic():
+            self._remove(key)
+            self.stats["expirations"] += 1
+            return None
+        self._entries.move_to_end(key)
+        return response
+
+    def _put_memory(self, key: str, response: dict, ttl: float) -> None:
+        size = len(json.dumps(response, ensure_ascii=False).encode("utf-8"))
+        if size > self.max_bytes:
+            return
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = (time.monotonic() + ttl, size, response)
+        self._bytes += size
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self.stats["evictions"] += 1
+
+    def _remove(self, key: str) -> None:
+        _, size, _ = self._entries.pop(key)
+        self._bytes -= size
+
+    # ---- database tier ----
+
+    def _get_db(self, key: str) -> Optional[tuple[dict, float]]:
+        with SessionLocal() as db:
+            row = db.get(LLMCacheEntry, key)
+            if row is None:
+                return None
+            remaining = (row.expires_at - datetime.utcnow()).total_seconds()
+            if remaining <= 0:
+                db.delete(row)
+                db.commit()
+                return None
+            return json.loads(row.response), remaining
+
+    def _put_db(self, key: str, model: str, response: dict) -> None:
+        with SessionLocal() as db:
+            db.merge(
+                LLMCacheEntry(
+                    key=key,
+                    model=model,
+                    response=json.dumps(response, ensure_ascii=False),
+                    created_at=datetime.utcnow(),
+                    expires_at=datetime.utcnow() + timedelta(seconds=self.ttl_seconds),
+                )
+            )
+            db.commit()
+
+    # ---- public API ----
+
+    async def get(self, key: str) -> Optional[dict]:
+        response = self._get_memory(key)
+        if response is not None:
+            self.stats["memory_hits"] += 1
+            return response
+
+        if self.db_tier:
+            try:
+                found = await asyncio.to_thread(self._get_db, key)
+            except Exception:
+                found = None
+            if found is not None:
+                response, remaining = found
+                self._put_memory(key, response, remaining)
+                self.stats["db_hits"] += 1
+                return response
+
+        self.stats["misses"] += 1
+        return None
+
+    async def set(self, key: str, model: str, response: dict) -> None:
+        self._put_memory(key, response, self.ttl_seconds)
+        if self.db_tier:
+            try:
+                await asyncio.to_thread(self._put_db, key, model, response)
+            except Exception:
+                # The DB tier is best-effort; the memory tier already has it.
+                pass
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._bytes = 0
+
+    def get_stats(self) -> dict[str, Any]:
+        hits = self.stats["memory_hits"] + self.stats["db_hits"]
+        lookups = hits + self.stats["misses"]
+        return {
+            **self.stats,
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "max_entries": self.max_entries,
+            "max_bytes": self.max_bytes,
+            "ttl_seconds": self.ttl_seconds,
+            "db_tier": self.db_tier,
+            "hit_ratio": round(hits / lookups, 3) if lookups else 0.0,
+        }
+
+
+_cache: Optional[LLMResponseCache] = None
+
+
+def get_cache() -> Optional[LLMResponseCache]:
+    """Return the process-wide cache, or None when caching is disabled."""
+    global _cache
+    settings = get_settings()
+    if not settings.llm_cache_enabled:
+        return None
+    if _cache is None:
+        _cache = LLMResponseCache(
+            max_entries=settings.llm_cache_max_entries,
+            max_bytes=settings.llm_cache_max_bytes,
+            ttl_seconds=settings.llm_cache_ttl_seconds,
+            db_tier=settings.llm_cache_db_tier,
+        )
+    return _cache
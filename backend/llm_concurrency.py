@@ -0,0 +1,111 @@
+"""
+Concurrency controls for outbound LLM calls.
+
+- SingleFlight: identical in-flight calls share one upstream request.
+- ConcurrencyLimiter: caps in-flight calls per worker, with a bounded wait
+  queue and queue-time metrics.
+"""
+
+import asyncio
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, Awaitable, Callable, Optional
+
+
+class LLMOverloadedError(Exception):
+    """Raised when the wait queue is full or a queued call waited too long."""
+
+
+class SingleFlight:
+    """Coalesce concurrent calls with the same key onto one task."""
+
+    def __init__(self):
+        self._inflight: dict[str, asyncio.Task] = {}
+        self.stats = {"leaders": 0, "coalesced": 0}
+
+    async def run(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+            self.stats["leaders"] += 1
+        else:
+            self.stats["coalesced"] += 1
+        # shield: one caller disconnecting must not cancel the shared call
+        return await asyncio.shield(task)
+
+    def get_stats(self) -> dict[str, Any]:
+        return {**self.stats, "in_flight_keys": len(self._inflight)}
+
+
+class ConcurrencyLimiter:
+    """Semaphore with a bounded wait queue and queue-time tracking."""
+
+    def __init__(self, max_concurrency: int, max_queue: int, queue_timeout: float):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+
+        self.in_flight = 0
+        self.waiting = 0
+        self.stats = {
+            "acquired": 0,
+            "rejected": 0,
+            "timed_out": 0,
+            "peak_waiting": 0,
+        }
+        # Recent queue times in seconds, for percentiles
+        self._queue_times: deque = deque(maxlen=1000)
+
+    @asynccontextmanager
+    async def slot(self):
+        started = time.perf_counter()
+        if not self._semaphore.locked():
+            # Free slot: acquire() returns without suspending
+            await self._semaphore.acquire()
+        else:
+            if self.waiting >= self.max_queue:
+                self.stats["rejected"] += 1
+                raise LLMOverloadedError("LLM wait queue is full")
+
+            self.waiting += 1
+            self.stats["peak_waiting"] = max(self.stats["peak_waiting"], self.waiting)
+            try:
+                await asyncio.wait_for(self._semaphore.acquire(), self.queue_timeout)
+            except asyncio.TimeoutError:
+                self.stats["timed_out"] += 1
+                raise LLMOverloadedError("Timed out waiting for an LLM slot")
+            finally:
+                self.waiting -= 1
+        self._queue_times.append(time.perf_counter() - started)
+
+        self.stats["acquired"] += 1
+        self.in_flight += 1
+        try:
+            yield
+        finally:
+            self.in_flight -= 1
+            self._semaphore.release()
+
+    def get_stats(self) -> dict[str, Any]:
+        times = sorted(self._queue_times)
+
+        def percentile(p: float) -> Optional[float]:
+            if not times:
+                return None
+            return round(times[min(int(len(times) * p), len(times) - 1)] * 1000, 2)
+
+        return {
+            **self.stats,
+            "max_concurrency": self.max_concurrency,
+            "max_queue": self.max_queue,
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "saturated": self.in_flight >= self.max_concurrency,
+            "queue_ms_p50": percentile(0.50),
+            "queue_ms_p95": percentile(0.95),
+            "queue_ms_max": round(times[-1] * 1000, 2) if times else None,
+        }
@@ -0,0 +1,263 @@
+"""
+Resilience helpers for outbound LLM calls: retry classification, jittered
+backoff, per-model latency/error statistics and a circuit breaker.
+"""
+
+import asyncio
+import random
+import time
+from collections import deque
+from typing import Any, Optional
+
+import httpx
+
+
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+def is_retryable(error: BaseException) -> bool:
+    """Rate limits, upstream 5xx, timeouts and connection failures are retried."""
+    if isinstance(error, httpx.HTTPStatusError):
+        return error.response.status_code in RETRYABLE_STATUS_CODES
+    return isinstance(error, (httpx.TransportError, asyncio.TimeoutError, TimeoutError))
+
+
+def backoff_delay(
+    attempt: int, base: float, cap: float, error: Optional[BaseException] = None
+) -> float:
+    """
+    Full-jitter exponential backoff: a random delay in [0, min(cap, base * 2**attempt)].
+    A Retry-After header on a 429 takes precedence (still capped).
+    """
+    if isinstance(error, httpx.HTTPStatusError):
+        retry_after = error.response.headers.get("retry-after")
+        if retry_after:
+            try:
+                return min(cap, max(0.0, float(retry_after)))
+            except ValueError:
+                pass
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+class ModelStats:
+    """Rolling latency samples and error counters for one model."""
+
+    def __init__(self, window: int = 200):
+        self.latencies: deque = deque(maxlen=window)
+        self.successes = 0
+        self.errors = 0
+        self.timeouts = 0
+        self.hedges_won = 0
+        # Token usage as reported by the provider; cached = prompt tokens
+        # served from the provider's prefix cache
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.cached_tokens = 0
+        self.last_error: Optional[str] = None
+        self.last_error_at: Optional[float] = None
+
+    def record_success(self, latency: float) -> None:
+        self.successes += 1
+        self.latencies.append(latency)
+
+    def record_usage(self, usage: Optional[dict]) -> None:
+        if not usage:
+            return
+        self.prompt_tokens += usage.get("prompt_tokens") or 0
+        self.completion_tokens += usage.get("completion_tokens") or 0
+        details = usage.get("prompt_tokens_details") or {}
+        self.cached_tokens += details.get("cached_tokens") or 0
+
+    def record_error(self, error: BaseException) -> None:
+        self.errors += 1
+        if isinstance(error, (asyncio.TimeoutError, TimeoutError, httpx.TimeoutException)):
+            self.timeouts += 1
+        if isinstance(error, httpx.HTTPStatusError):
+            self.last_error = f"HTTP {error.response.status_code}"
+        else:
+            self.last_error = type(error).__name__
+        self.last_error_at = time.time()
+
+    def percentile(self, p: float) -> Optional[float]:
+        """Latency percentile in seconds, or None without samples."""
+        if not self.latencies:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[min(int(len(ordered) * p), len(ordered) - 1)]
+
+    def as_dict(self) -> dict[str, Any]:
+        p50 = self.percentile(0.50)
+        p95 = self.percentile(0.95)
+        total = self.successes + self.errors
+        return {
+            "successes": self.successes,
+            "errors": self.errors,
+            "timeouts": self.timeouts,
+            "error_rate": round(self.errors / total, 3) if total else 0.0,
+            "hedges_won": self.hedges_won,
+            "latency_ms_p50": round(p50 * 1000) if p50 is not None else None,
+            "latency_ms_p95": round(p95 * 1000) if p95 is not None else None,
+            "samples": len(self.latencies),
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "cached_tokens": self.cached_tokens,
+            "cached_ratio": (
+                round(self.cached_tokens / self.prompt_tokens, 3)
+                if self.prompt_tokens
+                else 0.0
+            ),
+            "last_error": self.last_error,
+            "last_error_at": self.last_error_at,
+        }
+
+
+_model_stats: dict[str, ModelStats] = {}
+
+
+def get_model_stats(model: str) -> ModelStats:
+    stats = _model_stats.get(model)
+    if stats is None:
+        stats = _model_stats[model] = ModelStats()
+    return stats
+
+
+def all_model_stats() -> dict[str, dict[str, Any]]:
+    return {model: stats.as_dict() for model, stats in _model_stats.items()}
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling upstream while the circuit breaker is open."""
+
+
+class CircuitBreaker:
+    """
+    Closed / open / half-open breaker over a rolling time window of calls.
+
+    Trips when, over at least `min_calls` calls in the window, the error rate
+    or the slow-call rate reaches its threshold. After `open_seconds` it lets
+    up to `half_open_max_calls` probe calls through: a success closes it, a
+    failure opens it again.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(
+        self,
+        window_seconds: float,
+        min_calls: int,
+        error_rate_threshold: float,
+        slow_call_seconds: float,
+        slow_rate_threshold: float,
+        open_seconds: float,
+        half_open_max_calls: int,
+    ):
+        self.window_seconds = window_seconds
+        self.min_calls = min_calls
+        self.error_rate_threshold = error_rate_threshold
+        self.slow_call_seconds = slow_call_seconds
+        self.slow_rate_threshold = slow_rate_threshold
+        self.open_seconds = open_seconds
+        self.half_open_max_calls = half_open_max_calls
+
+        self.state = self.CLOSED
+        self.opened_at: Optional[float] = None
+        self._half_open_calls = 0
+        # (timestamp, failed, slow)
+        self._calls: deque = deque()
+        self.stats = {"opened": 0, "short_circuited": 0}
+
+    def _prune(self, now: float) -> None:
+        while self._calls and self._calls[0][0] < now - self.window_seconds:
+            self._calls.popleft()
+
+    def _rates(self) -> tuple[float, float]:
+        total = len(self._calls)
+        if not total:
+            return 0.0, 0.0
+        failed = sum(1 for _, f, _ in self._calls if f)
+        slow = sum(1 for _, _, s in self._calls if s)
+        return failed / total, slow / total
+
+    def _open(self, now: float) -> None:
+        self.state = self.OPEN
+        self.opened_at = now
+        self._half_open_calls = 0
+        self.stats["opened"] += 1
+
+    def _close(self) -> None:
+        self.state = self.CLOSED
+        self.opened_at = None
+        self._half_open_calls = 0
+        self._calls.clear()
+
+    def allow_request(self) -> bool:
+        """Whether a call may go upstream now. Counts half-open probes."""
+        now = time.monotonic()
+        if self.state == self.OPEN and now - self.opened_at >= self.open_seconds:
+            self.state = self.HALF_OPEN
+            self.opened_at = now
+            self._half_open_calls = 0
+        elif self.state == self.HALF_OPEN and now - self.opened_at >= self.open_seconds:
+            # Probes that never reported back (cancelled calls) don't block forever
+            self.opened_at = now
+            self._half_open_calls = 0
+
+        if self.state == self.CLOSED:
+            return True
+        if self.state == self.HALF_OPEN and self._half_open_calls < self.half_open_max_calls:
+            self._half_open_calls += 1
+            return True
+
+        self.stats["short_circuited"] += 1
+        return False
+
+    def is_open(self) -> bool:
+        return self.state == self.OPEN
+
+    def record_success(self, latency: float) -> None:
+        slow = latency >= self.slow_call_seconds
+        if self.state == self.HALF_OPEN:
+            if slow:
+                self._open(time.monotonic())
+            else:
+                self._close()
+            return
+        self._record(failed=False, slow=slow)
+
+    def record_failure(self) -> None:
+        if self.state == self.HALF_OPEN:
+            self._open(time.monotonic())
+            return
+        self._record(failed=True, slow=False)
+
+    def _record(self, failed: bool, slow: bool) -> None:
+        now = time.monotonic()
+        self._calls.append((now, failed, slow))
+        self._prune(now)
+        if self.state != self.CLOSED or len(self._calls) < self.min_calls:
+            return
+        error_rate, slow_rate = self._rates()
+        if error_rate >= self.error_rate_threshold or slow_rate >= self.slow_rate_threshold:
+            self._open(now)
+
+    def get_stats(self) -> dict[str, Any]:
+        self._prune(time.monotonic())
+        error_rate, slow_rate = self._rates()
+        return {
+            **self.stats,
+            "state": self.state,
+            "calls_in_window": len(self._calls),
+            "error_rate": round(error_rate, 3),
+            "slow_rate": round(slow_rate, 3),
+            "open_for_seconds": (
+                round(time.monotonic() - self.opened_at, 1)
+                if self.state == self.OPEN
+                else None
+            ),
+            "window_seconds": self.window_seconds,
+            "error_rate_threshold": self.error_rate_threshold,
+            "slow_call_seconds": self.slow_call_seconds,
+            "slow_rate_threshold": self.slow_rate_threshold,
+        }
@@ -1,16 +1,21 @@
-from typing import List
+from typing import List, Optional
+import asyncio
 import uuid
 import base64
+import json
 import os
+from contextlib import asynccontextmanager
 from datetime import datetime
 
-from fastapi import Depends, FastAPI, HTTPException, status, UploadFile, File
+from fastapi import Depends, FastAPI, HTTPException, Query, Response, status, UploadFile, File, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from fastapi.security import OAuth2PasswordRequestForm
 from fastapi.staticfiles import StaticFiles
 from pydantic import BaseModel
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from sqlalchemy import func
+from sqlalchemy import func, select
 
 import sys
 import os
@@ -18,8 +23,17 @@ import os
 # Add the directory containing this file to the Python path
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
-import auth, models, schemas
-from database import Base, engine, get_db
+import auth, conversation_memory, counsellor_actions, counsellor_context, llm, llm_cache, models, recommendation_engine, schemas, semantic_index, shortlist_categories, university_autocomplete, university_catalog, university_facets, university_ranking, university_search, university_similarity, user_recommendations
+from database import (
+    AsyncSessionLocal,
+    Base,
+    SessionLocal,
+    apply_schema_upgrades,
+    async_engine,
+    engine,
+    get_async_db,
+    get_db,
+)
 from dotenv import load_dotenv
 load_dotenv()
 
@@ -27,8 +41,35 @@ load_dotenv()
 
 # Create tables (for prototype). In production, use migrations.
 Base.metadata.create_all(bind=engine)
+apply_schema_upgrades(models.SCHEMA_UPGRADES)
+
+
+def _load_catalog() -> None:
+    with SessionLocal() as db:
+        semantic_index.get_index(university_catalog.get_catalog(db))
 
-app = FastAPI(title="AI Counsellor Backend", version="0.1.0")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # One pooled, keep-alive HTTP client for all OpenRouter calls
+    await llm.start_http_client()
+    # Warm the catalog and semantic indexes; on failure they load on first use instead
+    try:
+        await asyncio.to_thread(_load_catalog)
+    except Exception:
+        pass
+    user_recommendations.start_worker()
+    university_similarity.start_worker()
+    try:
+        yield
+    finally:
+        university_similarity.stop_worker()
+        user_recommendations.stop_worker()
+        await llm.close_http_client()
+        await async_engine.dispose()
+
+
+app = FastAPI(title="AI Counsellor Backend", version="0.1.0", lifespan=lifespan)
 
 # CORS must be added first, before any routes or mounts
 app.add_middleware(
@@ -158,6 +199,8 @@ def create_or_update_profile(
         db.query(models.Profile).filter(models.Profile.user_id == current_user.id).first()
     )
     preferred_countries_str = ",".join(profile_in.preferred_countries)
+    # What the dream/target/safe categories depended on before this save
+    category_inputs = shortlist_categories.profile_inputs(profile) if profile else None
 
     if profile:
         for field, value in profile_in.dict().items():
@@ -182,8 +225,20 @@ def create_or_update_profile(
     # Simple stage logic: once profile saved, move to discovering universities.
     profile.current_stage = models.StageEnum.DISCOVERING_UNIVERSITIES
 
+    # Budget changes move shortlisted universities between dream/target/safe;
+    # otherwise keep the categories (the counsellor may have set them)
+    if category_inputs is not None and shortlist_categories.profile_inputs(profile) != category_inputs:
+        db.flush()
+        shortlist_categories.recategorize_user(db, current_user.id)
+
+    counsellor_context.invalidate(db, current_user.id)
+    refresh_recommendations = user_recommendations.profile_changed(
+        db, current_user.id, counsellor_context.profile_to_dict(profile)
+    )
     db.commit()
     db.refresh(profile)
+    if refresh_recommendations:
+        user_recommendations.schedule(current_user.id)
     return schemas.ProfileOut(
         **profile_in.dict(),
         id=profile.id,
@@ -298,20 +353,48 @@ def health_check():
     return {"status": "ok"}
 
 
+@app.get("/health/llm")
+def llm_health():
+    """Outbound LLM client statistics, for sizing and monitoring."""
+    response_cache = llm_cache.get_cache()
+    return {
+        "pool": llm.get_pool_stats(),
+        "concurrency": llm.get_concurrency_stats(),
+        "models": llm.get_models_stats(),
+        "breaker": llm.get_breaker_stats(),
+        "cache": response_cache.get_stats() if response_cache else {"enabled": False},
+        "memory": conversation_memory.get_stats(),
+    }
+
+
 # -------------------------
 # University discovery & shortlisting
 # -------------------------
 
 
+UNIVERSITY_FIELDS = set(schemas.UniversityListItem.model_fields)
+
+
 @app.get(
     "/universities",
-    response_model=List[schemas.UniversityBase],
+    response_model=List[schemas.UniversityListItem],
+    response_model_exclude_unset=True,
 )
 def list_universities(
+    response: Response,
     filters: schemas.UniversityFilter = Depends(),
+    limit: Optional[int] = Query(None, ge=1, le=500),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
     db: Session = Depends(get_db),
     current_user: models.User = Depends(auth.get_current_user),
 ):
+    """
+    Without `limit`, every match in id order. With `limit`, one page ordered
+    by (tuition, id); the X-Next-Cursor header carries the `cursor` for the
+    next page and is absent on the last one. `fields` (comma-separated)
+    returns only those columns, plus id.
+    """
     # Require completed profile to discover universities
     profile = (
         db.query(models.Profile).filter(models.Profile.user_id == current_user.id).first()
@@ -322,24 +405,111 @@ def list_universities(
             detail="Complete onboarding before discovering universities.",
         )
 
-    query = db.query(models.University)
+    projection = None
+    if fields:
+        projection = {f.strip() for f in fields.split(",") if f.strip()} | {"id"}
+        unknown = projection - UNIVERSITY_FIELDS
+        if unknown:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Unknown fields: {', '.join(sorted(unknown))}",
+            )
 
-    if filters.max_budget_per_year:
-        query = query.filter(models.University.tuition_per_year <= filters.max_budget_per_year)
-    if filters.countries:
-        query = query.filter(models.University.country.in_(filters.countries))
-    if filters.field_of_study:
-        query = query.filter(models.University.field_of_study.ilike(f"%{filters.field_of_study}%"))
-    if filters.degree_level:
-        query = query.filter(models.University.degree_level == filters.degree_level)
+    # Filters are answered from the in-memory catalog index
+    catalog = university_catalog.get_catalog(db)
 
     # If no universities yet (fresh DB), seed a small realistic set
-    if query.count() == 0:
+    if len(catalog) == 0:
         seed_universities(db)
-        query = db.query(models.University)
+        catalog = university_catalog.get_catalog(db)
+
+    filter_args = dict(
+        max_budget_per_year=filters.max_budget_per_year,
+        countries=filters.countries,
+        field_of_study=filters.field_of_study,
+        degree_level=filters.degree_level,
+    )
+    if limit is None:
+        if cursor:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST, detail="cursor requires limit"
+            )
+        rows = catalog.filter(**filter_args)
+    else:
+        try:
+            after = university_catalog.decode_cursor(cursor) if cursor else None
+        except ValueError:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+        rows, next_key = catalog.page(limit, after, **filter_args)
+        if next_key is not None:
+            response.headers["X-Next-Cursor"] = university_catalog.encode_cursor(next_key)
 
-    universities = query.all()
-    return [schemas.UniversityBase.model_validate(u) for u in universities]
+    if projection is None:
+        return rows
+    return [u.model_dump(include=projection) for u in rows]
+
+
+@app.get(
+    "/universities/search",
+    response_model=schemas.UniversitySearchResponse,
+)
+def search_universities(
+    q: str = Query(..., min_length=1, max_length=200),
+    limit: int = Query(20, ge=1, le=100),
+    semantic: bool = False,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(auth.get_current_user),
+):
+    """
+    Ranked search over name, field, city, country and description, tolerant
+    of typos and partial words. With `semantic`, matches by meaning instead
+    ("machine learning" finds AI programs).
+    """
+    backend, hits = university_search.search(db, q, limit, semantic=semantic)
+    return {
+        "query": q,
+        "backend": backend,
+        "results": [{"score": round(score, 4), "university": uni} for uni, score in hits],
+    }
+
+
+@app.get(
+    "/universities/autocomplete",
+    response_model=List[schemas.AutocompleteSuggestion],
+)
+def autocomplete_universities(
+    q: str = Query(..., min_length=1, max_length=100),
+    limit: int = Query(8, ge=1, le=20),
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(auth.get_current_user),
+):
+    """Type-ahead suggestions for university, city and country names."""
+    catalog = university_catalog.get_catalog(db)
+    return university_autocomplete.get_index(catalog).suggest(q, limit)
+
+
+@app.get(
+    "/universities/facets",
+    response_model=schemas.UniversityFacets,
+)
+def university_facets_counts(
+    filters: schemas.UniversityFilter = Depends(),
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(auth.get_current_user),
+):
+    """
+    Counts per country, degree level, cost level, competition level and
+    tuition bucket for the filtered catalog. Each facet ignores its own
+    filter, so unselected options keep their counts.
+    """
+    catalog = university_catalog.get_catalog(db)
+    return university_facets.get_facets(
+        catalog,
+        max_budget_per_year=filters.max_budget_per_year,
+        countries=filters.countries,
+        field_of_study=filters.field_of_study,
+        degree_level=filters.degree_level,
+    )
 
 
 def seed_universities(db: Session) -> None:
@@ -394,6 +564,8 @@ def seed_universities(db: Session) -> None:
         ),
     ]
     db.add_all(sample)
+    db.flush()
+    university_catalog.invalidate(db, [uni.id for uni in sample])
     db.commit()
 
 
@@ -407,10 +579,73 @@ def get_university(
     current_user: models.User = Depends(auth.get_current_user),
 ):
     """Get a single university by ID with all its details."""
-    university = db.query(models.University).filter(models.University.id == university_id).first()
+    university = university_catalog.get_catalog(db).get(university_id)
     if not university:
         raise HTTPException(status_code=404, detail="University not found")
-    return schemas.UniversityBase.model_validate(university)
+    return university
+
+
+@app.get(
+    "/recommendations",
+    response_model=schemas.RecommendationsOut,
+)
+def get_recommendations(
+    limit: int = Query(5, ge=1, le=user_recommendations.STORED_PER_CATEGORY),
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(auth.get_current_user),
+):
+    """The best-fitting programs not yet shortlisted, `limit` per dream/target/safe."""
+    profile = (
+        db.query(models.Profile).filter(models.Profile.user_id == current_user.id).first()
+    )
+    if not profile or not profile.is_complete:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Complete onboarding before getting recommendations.",
+        )
+    linked = {
+        university_id
+        for (university_id,) in db.query(models.UserUniversity.university_id).filter(
+            models.UserUniversity.user_id == current_user.id
+        )
+    }
+    # Precomputed lists; while a refresh is pending the previous ones come back with stale=True
+    stored = user_recommendations.read(db, current_user.id, limit, exclude_ids=linked)
+    if stored is None:
+        raise HTTPException(status_code=404, detail="No recommendations yet.")
+    return {
+        "stale": stored["stale"],
+        "updated_at": stored["updated_at"],
+        **{
+            category: [
+                {"score": score, "category": category, "university": uni}
+                for uni, score in stored.get(category, [])
+            ]
+            for category in recommendation_engine.CATEGORIES
+        },
+    }
+
+
+@app.get(
+    "/universities/{university_id}/similar",
+    response_model=List[schemas.SimilarUniversity],
+)
+def similar_universities(
+    university_id: int,
+    limit: int = Query(10, ge=1, le=50),
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(auth.get_current_user),
+):
+    """Programs most often shortlisted or locked by students who also chose this one."""
+    catalog = university_catalog.get_catalog(db)
+    if catalog.get(university_id) is None:
+        raise HTTPException(status_code=404, detail="University not found")
+    results = []
+    for other_id, weight in university_similarity.neighbours(db, university_id, limit):
+        other = catalog.get(other_id)
+        if other is not None:
+            results.append({"weight": weight, "university": other})
+    return results
 
 
 @app.post(
@@ -445,12 +680,11 @@ def shortlist_university(
         raise HTTPException(status_code=400, detail="Profile required to shortlist.")
 
     # Determine category
-    if uni.tuition_per_year > profile.budget_per_year * 1.2 or uni.competition_level == models.RiskLevelEnum.HIGH:
-        category = models.UniversityCategoryEnum.DREAM
-    elif uni.tuition_per_year < profile.budget_per_year * 0.8 and uni.competition_level == models.RiskLevelEnum.LOW:
-        category = models.UniversityCategoryEnum.SAFE
-    else:
-        category = models.UniversityCategoryEnum.TARGET
+    category = models.UniversityCategoryEnum(
+        university_ranking.categorize(
+            uni.tuition_per_year, uni.competition_level.value, profile.budget_per_year
+        )
+    )
 
     acceptance = uni.base_acceptance_chance
     fit_reason = f"Matches your field {profile.field_of_study} and degree goal {profile.intended_degree}."
@@ -470,12 +704,17 @@ def shortlist_university(
         risk_explanation=risk_explanation,
     )
     db.add(link)
+    changed = university_similarity.record_change(
+        db, current_user.id, university_id, 0, university_similarity.link_weight(link.status)
+    )
 
     # Once user starts shortlisting, move stage to finalizing universities
     if profile.current_stage == models.StageEnum.DISCOVERING_UNIVERSITIES:
         profile.current_stage = models.StageEnum.FINALIZING_UNIVERSITIES
 
+    counsellor_context.invalidate(db, current_user.id)
     db.commit()
+    university_similarity.schedule(changed)
     db.refresh(link)
     db.refresh(profile)
     return link
@@ -501,6 +740,13 @@ def lock_university(
     if not uu:
         raise HTTPException(status_code=404, detail="Shortlisted university not found")
 
+    changed = university_similarity.record_change(
+        db,
+        current_user.id,
+        uu.university_id,
+        university_similarity.link_weight(uu.status),
+        university_similarity.link_weight(models.UniversityStatusEnum.LOCKED),
+    )
     uu.status = models.UniversityStatusEnum.LOCKED
 
     # Update stage to preparing applications
@@ -510,7 +756,9 @@ def lock_university(
     if profile:
         profile.current_stage = models.StageEnum.PREPARING_APPLICATIONS
 
+    counsellor_context.invalidate(db, current_user.id)
     db.commit()
+    university_similarity.schedule(changed)
     db.refresh(uu)
     return uu
 
@@ -535,9 +783,18 @@ def unlock_university(
     if not uu:
         raise HTTPException(status_code=404, detail="Locked university not found")
 
+    changed = university_similarity.record_change(
+        db,
+        current_user.id,
+        uu.university_id,
+        university_similarity.link_weight(uu.status),
+        university_similarity.link_weight(models.UniversityStatusEnum.SHORTLISTED),
+    )
     uu.status = models.UniversityStatusEnum.SHORTLISTED
 
+    counsellor_context.invalidate(db, current_user.id)
     db.commit()
+    university_similarity.schedule(changed)
     db.refresh(uu)
     return uu
 
@@ -576,8 +833,13 @@ def remove_from_shortlist(
     if not uu:
         raise HTTPException(status_code=404, detail="Shortlisted university not found")
 
+    changed = university_similarity.record_change(
+        db, current_user.id, uu.university_id, university_similarity.link_weight(uu.status), 0
+    )
     db.delete(uu)
+    counsellor_context.invalidate(db, current_user.id)
     db.commit()
+    university_similarity.schedule(changed)
     return {"message": "University removed from shortlist"}
 
 
@@ -618,6 +880,7 @@ def create_todo(
         created_by_ai=True,
     )
     db.add(todo)
+    counsellor_context.invalidate(db, current_user.id)
     db.commit()
     db.refresh(todo)
     return todo
@@ -640,7 +903,11 @@ def update_todo(
 
     for field, value in todo_in.dict(exclude_unset=True).items():
         setattr(todo, field, value)
+    if todo.status == models.TodoStatusEnum.COMPLETED:
+        # A done task no longer blocks the counsellor from creating it again
+        todo.idempotency_key = None
 
+    counsellor_context.invalidate(db, current_user.id)
     db.commit()
     db.refresh(todo)
     return todo
@@ -709,237 +976,167 @@ def get_application_guidance(
 # AI counsellor (LLM-powered via OpenRouter)
 # -------------------------
 
-import llm
-import asyncio
+
+ONBOARDING_REPLY = "👋 Let's first complete your onboarding so I can understand your profile. Head over to the onboarding page to tell me about your academic background, study goals, and budget."
+
+
+def execute_counsellor_actions(
+    db: Session,
+    current_user: models.User,
+    actions_raw: list,
+) -> tuple[List[schemas.CounsellorAction], List[str], List[schemas.CounsellorActionResult]]:
+    """
+    Execute the actions parsed from an LLM reply (one transaction, see
+    counsellor_actions).
+
+    Returns the actions in schema form, a human-readable line per executed
+    change and a structured result per action.
+    """
+    results = counsellor_actions.execute_actions(db, current_user.id, actions_raw)
+    actions = [
+        schemas.CounsellorAction(type=action.get("type", ""), payload=action.get("payload", {}))
+        for action in actions_raw
+        if isinstance(action, dict)
+    ]
+    return actions, counsellor_actions.executed_messages(results), results
+
+
+def with_actions_summary(content: str, executed_messages: List[str]) -> str:
+    """Append the list of executed actions to a counsellor reply."""
+    if not executed_messages:
+        return content
+    return content + "\n\n---\n**Actions I've taken:**\n" + "\n".join(executed_messages)
+
+
+async def run_in_new_session(fn, *args):
+    """
+    Run `fn(db, *args)` in a short-lived async session. Used after an LLM
+    call, so no database connection is held while the model generates.
+    """
+    async with AsyncSessionLocal() as db:
+        return await db.run_sync(fn, *args)
 
 
 @app.post("/counsellor", response_model=schemas.CounsellorResponse)
 async def counsellor_chat(
     message: schemas.CounsellorMessage,
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(auth.get_current_user),
+    session_id: str = None,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: models.User = Depends(auth.get_current_user_async),
 ):
     """
     AI-powered counsellor that:
     - Uses OpenRouter LLM with full profile/stage/university context
     - EXECUTES actions automatically (shortlist, lock, todos)
     - Provides personalized recommendations
+
+    With `session_id` the recent turns of that chat session (and a summary of
+    older ones) are sent along with the message.
     """
-    profile = (
-        db.query(models.Profile).filter(models.Profile.user_id == current_user.id).first()
-    )
-    if not profile or not profile.is_complete:
-        reply = "👋 Let's first complete your onboarding so I can understand your profile. Head over to the onboarding page to tell me about your academic background, study goals, and budget."
+    snapshot = await db.run_sync(counsellor_context.get_snapshot, current_user.id)
+    if not snapshot or not snapshot["is_complete"]:
         return schemas.CounsellorResponse(
-            messages=[schemas.CounsellorMessage(role="assistant", content=reply)],
+            messages=[schemas.CounsellorMessage(role="assistant", content=ONBOARDING_REPLY)],
             actions=[],
         )
 
-    # Gather user's universities
-    user_universities = (
-        db.query(models.UserUniversity)
-        .filter(models.UserUniversity.user_id == current_user.id)
-        .all()
+    summary, llm_messages = await db.run_sync(
+        conversation_memory.build_messages, current_user.id, session_id, message.content
     )
-    
-    # Convert to dicts for the LLM context
-    universities_context = []
-    for uu in user_universities:
-        universities_context.append({
-            "id": uu.id,
-            "university_id": uu.university_id,
-            "status": uu.status.value,
-            "category": uu.category.value,
-            "university": {
-                "name": uu.university.name,
-                "country": uu.university.country,
-                "tuition_per_year": uu.university.tuition_per_year,
-            }
-        })
-    
-    # Get ALL available universities for recommendations
-    all_universities = db.query(models.University).all()
-    all_universities_context = [
-        {
-            "id": u.id,
-            "name": u.name,
-            "country": u.country,
-            "city": u.city,
-            "field_of_study": u.field_of_study,
-            "degree_level": u.degree_level,
-            "tuition_per_year": u.tuition_per_year,
-            "cost_level": u.cost_level.value,
-            "competition_level": u.competition_level.value,
-        }
-        for u in all_universities
-    ]
-    
-    # Build profile dict
-    preferred_countries = (
-        profile.preferred_countries.split(",") if profile.preferred_countries else []
-    )
-    profile_dict = {
-        "current_education_level": profile.current_education_level,
-        "degree_major": profile.degree_major,
-        "graduation_year": profile.graduation_year,
-        "gpa": profile.gpa,
-        "intended_degree": profile.intended_degree,
-        "field_of_study": profile.field_of_study,
-        "target_intake_year": profile.target_intake_year,
-        "preferred_countries": preferred_countries,
-        "budget_per_year": profile.budget_per_year,
-        "funding_plan": profile.funding_plan,
-        "ielts_toefl_status": profile.ielts_toefl_status.value,
-        "gre_gmat_status": profile.gre_gmat_status.value,
-        "sop_status": profile.sop_status.value,
-    }
-    
-    # Build system prompt with ALL context
-    system_prompt = llm.build_system_prompt(
-        profile=profile_dict,
-        stage=profile.current_stage.value,
-        universities=universities_context,
-        all_universities=all_universities_context,
+    system_prompt = conversation_memory.with_summary(
+        counsellor_context.build_prompt(snapshot), summary
     )
+    # Hand the connection back to the pool before the (slow) LLM call
+    await db.close()
     
     # Call LLM
-    llm_messages = [{"role": "user", "content": message.content}]
     result = await llm.chat_with_llm(llm_messages, system_prompt)
     
     content = result.get("content", "I'm here to help with your study abroad journey.")
     actions_raw = result.get("actions", [])
     
-    # Convert actions to schema format AND execute them
-    actions: List[schemas.CounsellorAction] = []
-    executed_messages = []
-    
-    for action in actions_raw:
-        action_type = action.get("type", "")
-        payload = action.get("payload", {})
-        
-        # AUTO-EXECUTE: Create Todo
-        if action_type == "create_todo" and payload.get("title"):
-            # Get university_id if provided
-            university_id = payload.get("university_id")
-            
-            todo = models.Todo(
-                user_id=current_user.id,
-                title=payload.get("title", "AI Suggested Task"),
-                description=payload.get("description", ""),
-                status=models.TodoStatusEnum.PENDING,
-                related_university_id=university_id,
-                created_by_ai=True,
-            )
-            db.add(todo)
-            db.commit()
-            uni_name = ""
-            if university_id:
-                uni = db.query(models.University).filter(models.University.id == university_id).first()
-                uni_name = f" for {uni.name}" if uni else ""
-            executed_messages.append(f"✅ Created task{uni_name}: {payload.get('title')}")
-        
-        # AUTO-EXECUTE: Shortlist University
-        elif action_type == "shortlist_university" and payload.get("university_id"):
-            uni_id = payload.get("university_id")
-            category = payload.get("category", "target")
-            
-            # Check if already shortlisted
-            existing = db.query(models.UserUniversity).filter(
-                models.UserUniversity.user_id == current_user.id,
-                models.UserUniversity.university_id == uni_id,
-            ).first()
-            
-            if not existing:
-                university = db.query(models.University).filter(models.University.id == uni_id).first()
-                if university:
-                    # Determine category enum
-                    cat_enum = models.UniversityCategoryEnum.TARGET
-                    if category.lower() == "dream":
-                        cat_enum = models.UniversityCategoryEnum.DREAM
-                    elif category.lower() == "safe":
-                        cat_enum = models.UniversityCategoryEnum.SAFE
-                    
-                    # Determine acceptance chance based on category
-                    if cat_enum == models.UniversityCategoryEnum.DREAM:
-                        acceptance = models.AcceptanceChanceEnum.LOW
-                    elif cat_enum == models.UniversityCategoryEnum.SAFE:
-                        acceptance = models.AcceptanceChanceEnum.HIGH
-                    else:
-                        acceptance = models.AcceptanceChanceEnum.MEDIUM
-                    
-                    user_uni = models.UserUniversity(
-                        user_id=current_user.id,
-                        university_id=uni_id,
-                        category=cat_enum,
-                        status=models.UniversityStatusEnum.SHORTLISTED,
-                        fit_reason=payload.get("reason", "AI recommended"),
-                        acceptance_chance=acceptance,
-                    )
-                    db.add(user_uni)
-                    db.commit()
-                    executed_messages.append(f"📋 Shortlisted: {university.name} as {category.upper()}")
-                    
-                    # Update stage if needed
-                    if profile.current_stage == models.StageEnum.BUILDING_PROFILE:
-                        profile.current_stage = models.StageEnum.DISCOVERING_UNIVERSITIES
-                        db.commit()
-        
-        # AUTO-EXECUTE: Lock University
-        elif action_type == "lock_university":
-            user_uni = None
-            
-            # Support both user_university_id and university_id
-            if payload.get("user_university_id"):
-                uu_id = payload.get("user_university_id")
-                user_uni = db.query(models.UserUniversity).filter(
-                    models.UserUniversity.id == uu_id,
-                    models.UserUniversity.user_id == current_user.id,
-                ).first()
-            elif payload.get("university_id"):
-                # Find by university_id in user's shortlist
-                uni_id = payload.get("university_id")
-                user_uni = db.query(models.UserUniversity).filter(
-                    models.UserUniversity.university_id == uni_id,
-                    models.UserUniversity.user_id == current_user.id,
-                ).first()
-                
-                # If not in shortlist yet, auto-add it first
-                if not user_uni:
-                    university = db.query(models.University).filter(models.University.id == uni_id).first()
-                    if university:
-                        user_uni = models.UserUniversity(
-                            user_id=current_user.id,
-                            university_id=uni_id,
-                            category=models.UniversityCategoryEnum.TARGET,
-                            status=models.UniversityStatusEnum.SHORTLISTED,
-                            fit_reason=payload.get("reason", "AI recommended"),
-                            acceptance_chance=models.AcceptanceChanceEnum.MEDIUM,
-                        )
-                        db.add(user_uni)
-                        db.commit()
-                        db.refresh(user_uni)
-                        executed_messages.append(f"📋 Auto-shortlisted: {university.name}")
-            
-            if user_uni and user_uni.status != models.UniversityStatusEnum.LOCKED:
-                user_uni.status = models.UniversityStatusEnum.LOCKED
-                db.commit()
-                executed_messages.append(f"🔒 Locked: {user_uni.university.name}")
-                
-                # Update stage
-                profile.current_stage = models.StageEnum.PREPARING_APPLICATIONS
-                db.commit()
-        
-        actions.append(
-            schemas.CounsellorAction(type=action_type, payload=payload)
-        )
+    actions, executed_messages, results = await run_in_new_session(
+        execute_counsellor_actions, current_user, actions_raw
+    )
     
     # Add execution summary to response if actions were executed
-    if executed_messages:
-        content += "\n\n---\n**Actions I've taken:**\n" + "\n".join(executed_messages)
+    content = with_actions_summary(content, executed_messages)
     
     return schemas.CounsellorResponse(
         messages=[schemas.CounsellorMessage(role="assistant", content=content)],
         actions=actions,
+        results=results,
+    )
+
+
+def _sse(event: str, data: dict) -> str:
+    """Format one Server-Sent Event."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@app.post("/counsellor/stream")
+async def counsellor_chat_stream(
+    message: schemas.CounsellorMessage,
+    session_id: str = None,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: models.User = Depends(auth.get_current_user_async),
+):
+    """
+    Streaming variant of POST /counsellor (Server-Sent Events).
+
+    Events:
+    - `delta`: {"content": str} — a chunk of the reply text as it is generated
+    - `done`: {"content": str, "actions": [...], "executed": [...], "results": [...]}
+      — the full reply (actions block removed) plus the executed actions and
+      a result per action, sent once the stream ends
+    - `error`: {"detail": str} — the LLM failed mid-reply; sent instead of
+      `done`, and the partial text should be discarded
+    """
+    snapshot = await db.run_sync(counsellor_context.get_snapshot, current_user.id)
+    complete = bool(snapshot and snapshot["is_complete"])
+    if complete:
+        summary, llm_messages = await db.run_sync(
+            conversation_memory.build_messages, current_user.id, session_id, message.content
+        )
+        system_prompt = conversation_memory.with_summary(
+            counsellor_context.build_prompt(snapshot), summary
+        )
+    # The request's session would otherwise hold a connection for the whole stream
+    await db.close()
+
+    async def event_stream():
+        if not complete:
+            yield _sse("delta", {"content": ONBOARDING_REPLY})
+            yield _sse(
+                "done", {"content": ONBOARDING_REPLY, "actions": [], "executed": [], "results": []}
+            )
+            return
+
+        async for event in llm.stream_chat_with_llm(llm_messages, system_prompt):
+            if event["type"] == "delta":
+                yield _sse("delta", {"content": event["content"]})
+                continue
+            if event["type"] == "error":
+                yield _sse("error", {"detail": event["detail"]})
+                return
+
+            actions, executed_messages, results = await run_in_new_session(
+                execute_counsellor_actions, current_user, event["actions"]
+            )
+            yield _sse(
+                "done",
+                {
+                    "content": event["content"],
+                    "actions": [a.model_dump() for a in actions],
+                    "executed": executed_messages,
+                    "results": [r.model_dump() for r in results],
+                },
+            )
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
     )
 
 
@@ -1010,6 +1207,25 @@ def get_chat_sessions(
     return {"sessions": result, "total_sessions": len(result)}
 
 
+def store_chat_message(
+    db: Session,
+    user_id: int,
+    role: models.ChatRoleEnum,
+    content: str,
+    session_id: str,
+) -> models.ChatMessage:
+    chat_msg = models.ChatMessage(
+        user_id=user_id,
+        role=role,
+        content=content,
+        session_id=session_id,
+    )
+    db.add(chat_msg)
+    db.commit()
+    db.refresh(chat_msg)
+    return chat_msg
+
+
 @app.post("/chat/message")
 def save_chat_message(
     message: schemas.CounsellorMessage,
@@ -1023,16 +1239,7 @@ def save_chat_message(
         session_id = str(uuid.uuid4())[:8]
     
     role_enum = models.ChatRoleEnum.USER if message.role == "user" else models.ChatRoleEnum.ASSISTANT
-    
-    chat_msg = models.ChatMessage(
-        user_id=current_user.id,
-        role=role_enum,
-        content=message.content,
-        session_id=session_id,
-    )
-    db.add(chat_msg)
-    db.commit()
-    db.refresh(chat_msg)
+    chat_msg = store_chat_message(db, current_user.id, role_enum, message.content, session_id)
     
     return {"id": chat_msg.id, "session_id": session_id}
 
@@ -1052,10 +1259,138 @@ def delete_chat_session(
         )
         .delete()
     )
+    conversation_memory.delete_summary(db, current_user.id, session_id)
     db.commit()
     return {"deleted": deleted}
 
 
+# -------------------------
+# Counsellor WebSocket
+# -------------------------
+
+
+@app.websocket("/ws/counsellor")
+async def counsellor_websocket(
+    websocket: WebSocket,
+    token: str = "",
+    session_id: str = None,
+):
+    """
+    WebSocket transport for the AI counsellor: one round trip per turn.
+
+    Connect with `?token=<JWT>` (and optionally `&session_id=<id>`). The token
+    is checked once. Each turn reads the user's context snapshot and the
+    prompt is only rebuilt when its version changes.
+
+    Each turn the client sends {"content": "..."}. The server stores the user
+    message, streams {"type": "delta", "content": ...} events, executes the
+    reply's actions, stores the reply and finishes with
+    {"type": "done", "content": ..., "actions": [...], "executed": [...], "results": [...], "message_id": ...}.
+    If the LLM fails mid-reply the turn ends with {"type": "error", "detail": ...}
+    instead, and the partial reply is not stored. Malformed frames and turns
+    that fail (e.g. on a database error) are also answered with an error
+    event; the connection stays open.
+    The LLM sees the session's recent turns and a summary of older ones.
+    """
+    async with AsyncSessionLocal() as db:
+        user = await auth.get_user_from_token_async(db, token)
+
+    if user is None:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+
+    await websocket.accept()
+    if not session_id:
+        session_id = str(uuid.uuid4())[:8]
+    await websocket.send_json({"type": "ready", "session_id": session_id})
+
+    system_prompt = None
+    prompt_version = None
+    try:
+        while True:
+            try:
+                incoming = json.loads(await websocket.receive_text())
+                content = (incoming.get("content") or "").strip()
+            except (ValueError, AttributeError, KeyError):
+                # Not JSON, not an object, or a binary frame
+                content = ""
+            if not content:
+                await websocket.send_json({"type": "error", "detail": "Send {\"content\": \"...\"}"})
+                continue
+
+            try:
+                reply = ONBOARDING_REPLY
+                failed: Optional[str] = None
+                actions: List[schemas.CounsellorAction] = []
+                executed_messages: List[str] = []
+                results: List[schemas.CounsellorActionResult] = []
+
+                # Read everything the turn needs, then release the connection
+                # before streaming: a session held across the LLM call would
+                # keep a pooled connection for the whole reply
+                async with AsyncSessionLocal() as db:
+                    await db.run_sync(
+                        store_chat_message, user.id, models.ChatRoleEnum.USER, content, session_id
+                    )
+                    snapshot = await db.run_sync(counsellor_context.get_snapshot, user.id)
+                    complete = bool(snapshot and snapshot["is_complete"])
+                    if complete:
+                        summary, llm_messages = await db.run_sync(
+                            conversation_memory.build_messages, user.id, session_id, content
+                        )
+
+                if not complete:
+                    await websocket.send_json({"type": "delta", "content": reply})
+                else:
+                    if snapshot["version"] != prompt_version:
+                        system_prompt = counsellor_context.build_prompt(snapshot)
+                        prompt_version = snapshot["version"]
+                    async for event in llm.stream_chat_with_llm(
+                        llm_messages, conversation_memory.with_summary(system_prompt, summary)
+                    ):
+                        if event["type"] == "delta":
+                            await websocket.send_json(event)
+                            continue
+                        if event["type"] == "error":
+                            failed = event["detail"]
+                            break
+                        reply = event["content"]
+                        if event["actions"]:
+                            actions, executed_messages, results = await run_in_new_session(
+                                execute_counsellor_actions, user, event["actions"]
+                            )
+
+                if failed is None:
+                    reply = with_actions_summary(reply, executed_messages)
+                    chat_msg = await run_in_new_session(
+                        store_chat_message, user.id, models.ChatRoleEnum.ASSISTANT, reply, session_id
+                    )
+
+                if failed is not None:
+                    # The LLM failed mid-reply: nothing is stored, the client drops the partial text
+                    await websocket.send_json({"type": "error", "detail": failed})
+                    continue
+                await websocket.send_json(
+                    {
+                        "type": "done",
+                        "content": reply,
+                        "actions": [a.model_dump() for a in actions],
+                        "executed": executed_messages,
+                        "results": [r.model_dump() for r in results],
+                        "message_id": chat_msg.id,
+                    }
+                )
+            except WebSocketDisconnect:
+                raise
+            except Exception as e:
+                # A failed turn (e.g. a database error) is reported; the connection stays open
+                await websocket.send_json(
+                    {"type": "error", "detail": f"Could not process the message ({e.__class__.__name__})"}
+                )
+    except WebSocketDisconnect:
+        pass
+
+
 # -------------------------
 # Avatar / Profile Picture Endpoints
 # -------------------------
@@ -1068,8 +1403,8 @@ os.makedirs(UPLOAD_DIR, exist_ok=True)
 @app.post("/user/avatar", response_model=schemas.AvatarUploadResponse)
 async def upload_avatar(
     file: UploadFile = File(...),
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(auth.get_current_user),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: models.User = Depends(auth.get_current_user_async),
 ):
     """Upload a profile picture."""
     # Validate file type
@@ -1093,7 +1428,7 @@ async def upload_avatar(
     # Update user avatar URL
     avatar_url = f"/uploads/avatars/{filename}"
     current_user.avatar_url = avatar_url
-    db.commit()
+    await db.commit()
     
     return schemas.AvatarUploadResponse(
         avatar_url=avatar_url,
@@ -1197,7 +1532,7 @@ class InterviewScoreRequest(BaseModel):
 @app.post("/interview/feedback")
 async def get_interview_feedback(
     request: InterviewFeedbackRequest,
-    current_user: models.User = Depends(auth.get_current_user),
+    current_user: models.User = Depends(auth.get_current_user_async),
 ):
     """
     Get AI feedback on an interview answer.
@@ -1228,8 +1563,9 @@ For admission interviews, focus on: passion for the field, relevant experience,
 
     try:
         response = await llm.chat_with_llm(messages, system_prompt)
-        feedback = response.get("reply", "Good answer! Consider adding more specific examples to strengthen your response.")
-        return {"feedback": feedback}
+        # Degraded replies (e.g. circuit open) fall back to the canned feedback
+        feedback = None if response.get("degraded") else response.get("content")
+        return {"feedback": feedback or "Good answer! Consider adding more specific examples to strengthen your response."}
     except Exception as e:
         return {"feedback": "Good attempt! Try to be more specific and confident in your delivery."}
 
@@ -1237,7 +1573,7 @@ For admission interviews, focus on: passion for the field, relevant experience,
 @app.post("/interview/score")
 async def get_interview_score(
     request: InterviewScoreRequest,
-    current_user: models.User = Depends(auth.get_current_user),
+    current_user: models.User = Depends(auth.get_current_user_async),
 ):
     """
     Get final score and summary for completed interview.
@@ -1275,7 +1611,9 @@ SUMMARY: [your evaluation]"""
 
     try:
         response = await llm.chat_with_llm(messages, system_prompt)
-        reply = response.get("reply", "SCORE: 75\nSUMMARY: Good effort overall. You showed genuine interest and gave thoughtful responses.")
+        # Degraded replies (e.g. circuit open) fall back to the canned score
+        reply = None if response.get("degraded") else response.get("content")
+        reply = reply or "SCORE: 75\nSUMMARY: Good effort overall. You showed genuine interest and gave thoughtful responses."
         
         # Parse score and summary
         lines = reply.split("\n")
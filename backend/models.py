@@ -8,9 +8,11 @@ from sqlalchemy import (
     Enum as SqlEnum,
     Float,
     ForeignKey,
+    Index,
     Integer,
     String,
     Text,
+    UniqueConstraint,
 )
 from sqlalchemy.orm import relationship
 
@@ -88,6 +90,15 @@ class User(Base):
     chat_messages = relationship(
         "ChatMessage", back_populates="user", cascade="all, delete-orphan"
     )
+    chat_summaries = relationship(
+        "ChatSessionSummary", back_populates="user", cascade="all, delete-orphan"
+    )
+    counsellor_context = relationship(
+        "CounsellorContext", uselist=False, cascade="all, delete-orphan"
+    )
+    recommendations = relationship(
+        "UserRecommendations", uselist=False, cascade="all, delete-orphan"
+    )
 
 
 class ChatMessage(Base):
@@ -104,6 +115,22 @@ class ChatMessage(Base):
     user = relationship("User", back_populates="chat_messages")
 
 
+class ChatSessionSummary(Base):
+    """Running summary of the older turns of one chat session."""
+    __tablename__ = "chat_session_summaries"
+    __table_args__ = (UniqueConstraint("user_id", "session_id"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    session_id = Column(String(100), nullable=False)
+    summary = Column(Text, nullable=False, default="")
+    # Last ChatMessage.id folded into the summary
+    summarized_through_id = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    user = relationship("User", back_populates="chat_summaries")
+
+
 class Profile(Base):
     __tablename__ = "profiles"
 
@@ -163,6 +190,9 @@ class University(Base):
 
 class UserUniversity(Base):
     __tablename__ = "user_universities"
+    __table_args__ = (
+        Index("uq_user_universities_user_university", "user_id", "university_id", unique=True),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
@@ -183,6 +213,10 @@ class UserUniversity(Base):
 
 class Todo(Base):
     __tablename__ = "todos"
+    __table_args__ = (
+        Index("ix_todos_idempotency_key", "idempotency_key", unique=True),
+        Index("ix_todos_user_id", "user_id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
@@ -193,9 +227,112 @@ class Todo(Base):
     due_date = Column(DateTime, nullable=True)
     related_university_id = Column(Integer, ForeignKey("universities.id"), nullable=True)
     created_by_ai = Column(Boolean, default=True)
+    # sha256 of user, action type and payload for open AI-created todos;
+    # cleared on completion so the counsellor can suggest the task again
+    idempotency_key = Column(String(64), nullable=True)
 
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
     user = relationship("User", back_populates="todos")
 
+
+
+class CounsellorContext(Base):
+    """Materialized counsellor prompt context for one user (see counsellor_context)."""
+    __tablename__ = "counsellor_contexts"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    version = Column(Integer, nullable=False, default=1)  # bumped on every rebuild and invalidation
+    stale = Column(Boolean, nullable=False, default=False)
+    data = Column(Text, nullable=False)  # JSON: profile, links, ranked universities
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
+
+class UserRecommendations(Base):
+    """Precomputed dream/target/safe recommendations for one user (see user_recommendations)."""
+    __tablename__ = "user_recommendations"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    stale = Column(Boolean, nullable=False, default=False)  # a refresh is pending
+    inputs_key = Column(String(64), nullable=False)  # hash of the profile inputs used
+    catalog_version = Column(Integer, nullable=False, default=0)
+    data = Column(Text, nullable=False)  # JSON: {"dream": [[university_id, score], ...], ...}
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
+
+class UniversityCooccurrence(Base):
+    """
+    Sparse item-to-item matrix: how strongly students who have one university
+    on their list also have the other (see university_similarity).
+    """
+    __tablename__ = "university_cooccurrences"
+
+    university_id = Column(Integer, ForeignKey("universities.id"), primary_key=True)
+    other_id = Column(Integer, ForeignKey("universities.id"), primary_key=True)
+    weight = Column(Integer, nullable=False, default=0)
+
+
+class UniversityNeighbours(Base):
+    """Top-K co-occurring universities per university, best first."""
+    __tablename__ = "university_neighbours"
+
+    university_id = Column(Integer, ForeignKey("universities.id"), primary_key=True)
+    data = Column(Text, nullable=False)  # JSON: [[other_id, weight], ...]
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
+
+class CatalogVersion(Base):
+    """Single row (id=1) bumped on every catalog write (see university_catalog)."""
+    __tablename__ = "catalog_versions"
+
+    id = Column(Integer, primary_key=True)
+    version = Column(Integer, nullable=False, default=1)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
+
+class CatalogChange(Base):
+    """
+    The universities a catalog version changed, so in-memory aggregates can
+    update just those rows. A NULL university_id means the whole catalog.
+    """
+    __tablename__ = "catalog_changes"
+
+    id = Column(Integer, primary_key=True)
+    version = Column(Integer, nullable=False, index=True)
+    university_id = Column(Integer, nullable=True)
+
+
+class LLMCacheEntry(Base):
+    """Second-tier (shared, persistent) cache of LLM completions."""
+    __tablename__ = "llm_cache"
+
+    key = Column(String(64), primary_key=True)  # sha256 of model + prompt + messages
+    model = Column(String(255), nullable=False)
+    response = Column(Text, nullable=False)  # JSON: {"content": ..., "actions": [...]}
+    created_at = Column(DateTime, default=datetime.utcnow)
+    expires_at = Column(DateTime, nullable=False, index=True)
+
+
+# create_all() only creates missing tables; these bring existing databases up
+# to date. Each must be safe to run on every startup.
+SCHEMA_UPGRADES = [
+    "ALTER TABLE todos ADD COLUMN IF NOT EXISTS idempotency_key VARCHAR(64)",
+    "CREATE UNIQUE INDEX IF NOT EXISTS ix_todos_idempotency_key ON todos (idempotency_key)",
+    "UPDATE todos SET idempotency_key = NULL WHERE status = 'COMPLETED' AND idempotency_key IS NOT NULL",
+    "CREATE INDEX IF NOT EXISTS ix_todos_user_id ON todos (user_id)",
+    # Fails (and is skipped) while a user still has duplicate links
+    "CREATE UNIQUE INDEX IF NOT EXISTS uq_user_universities_user_university "
+    "ON user_universities (user_id, university_id)",
+    # Full-text search (university_search.SEARCH_VECTOR_SQL); the expression must match the query
+    "CREATE INDEX IF NOT EXISTS ix_universities_search ON universities USING GIN (("
+    "setweight(to_tsvector('english', name), 'A') || "
+    "setweight(to_tsvector('english', field_of_study), 'B') || "
+    "setweight(to_tsvector('english', coalesce(city, '') || ' ' || country), 'C') || "
+    "setweight(to_tsvector('english', coalesce(description, '')), 'D')))",
+    # Typo fallback; skipped where the pg_trgm extension can't be created
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE INDEX IF NOT EXISTS ix_universities_name_trgm ON universities USING GIN (lower(name) gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS ix_universities_field_trgm "
+    "ON universities USING GIN (lower(field_of_study) gin_trgm_ops)",
+]
@@ -0,0 +1,150 @@
+"""
+Vectorized profile-to-catalog scoring for /recommendations.
+
+The catalog is held as NumPy column arrays (tuition, cost, competition and
+acceptance codes, country, degree and field ids) and a profile is scored
+against every program in one pass with the same weights as
+university_ranking. Programs are split into dream/target/safe with the
+shortlist rule (university_ranking.categorize) and the best N of each are
+returned.
+"""
+
+from typing import Optional
+
+import numpy as np
+
+import university_catalog
+import university_ranking as ranking
+
+
+LEVEL_CODES = {"low": 0, "medium": 1, "high": 2}
+CATEGORIES = ("dream", "target", "safe")
+
+
+def _level(value) -> int:
+    return LEVEL_CODES.get(getattr(value, "value", value), 1)
+
+
+class CatalogMatrix:
+    """The catalog as column arrays; row i is self.universities[i]."""
+
+    def __init__(self, universities):
+        self.universities = list(universities)
+        self.country_ids: dict[str, int] = {}
+        self.degree_ids: dict[str, int] = {}
+        field_ids: dict[str, int] = {}
+
+        def intern(table: dict[str, int], key: str) -> int:
+            return table.setdefault(key, len(table))
+
+        n = len(self.universities)
+        self.ids = np.empty(n, dtype=np.int64)
+        self.tuition = np.empty(n, dtype=np.float64)
+        self.cost = np.empty(n, dtype=np.int8)
+        self.competition = np.empty(n, dtype=np.int8)
+        self.acceptance = np.empty(n, dtype=np.int8)
+        self.country = np.empty(n, dtype=np.int32)
+        self.degree = np.empty(n, dtype=np.int32)
+        self.field = np.empty(n, dtype=np.int32)
+        for i, uni in enumerate(self.universities):
+            self.ids[i] = uni.id
+            self.tuition[i] = uni.tuition_per_year or 0
+            self.cost[i] = _level(uni.cost_level)
+            self.competition[i] = _level(uni.competition_level)
+            self.acceptance[i] = _level(uni.base_acceptance_chance)
+            self.country[i] = intern(self.country_ids, ranking.normalize_country(uni.country))
+            self.degree[i] = intern(self.degree_ids, ranking.normalize_degree(uni.degree_level))
+            self.field[i] = intern(field_ids, (uni.field_of_study or "").strip().lower())
+
+        # Token sets per distinct field: the field overlap is computed per
+        # field, then gathered into a per-program column
+        self.field_tokens = [ranking.field_tokens(field) for field in field_ids]
+
+    def __len__(self) -> int:
+        return len(self.universities)
+
+    def score(self, profile: dict) -> np.ndarray:
+        """Relevance of every program to `profile`; same formula as university_ranking.score_university."""
+        countries = profile.get("preferred_countries") or []
+        if isinstance(countries, str):
+            countries = countries.split(",")
+        country_set = {ranking.normalize_country(c) for c in countries if c.strip()}
+        target_fields = ranking.field_tokens(profile.get("field_of_study", "")) or ranking.field_tokens(
+            profile.get("degree_major", "")
+        )
+        degree = ranking.normalize_degree(profile.get("intended_degree", ""))
+        budget = profile.get("budget_per_year") or 0
+
+        scores = np.zeros(len(self), dtype=np.float64)
+
+        if country_set:
+            wanted = [self.country_ids[c] for c in country_set if c in self.country_ids]
+            scores += ranking.COUNTRY_WEIGHT * np.isin(self.country, wanted)
+        else:
+            scores += ranking.COUNTRY_WEIGHT
+
+        if budget:
+            budget_score = np.clip(1.0 - (self.tuition - budget) / budget, 0.0, 1.0)
+        else:
+            budget_score = np.full(len(self), 0.5)
+        scores += ranking.BUDGET_WEIGHT * budget_score
+
+        if target_fields:
+            overlap = np.array(
+                [len(target_fields & tokens) / len(tokens) if tokens else 0.0 for tokens in self.field_tokens]
+            )
+            if len(overlap):
+                scores += ranking.FIELD_WEIGHT * overlap[self.field]
+
+        if degree:
+            degree_id = self.degree_ids.get(degree, -1)
+            scores += ranking.DEGREE_WEIGHT * (self.degree == degree_id)
+        else:
+            scores += ranking.DEGREE_WEIGHT
+        return scores
+
+    def categories(self, budget: int) -> np.ndarray:
+        """0 = dream, 1 = target, 2 = safe for every program (university_ranking.categorize)."""
+        high, low = LEVEL_CODES["high"], LEVEL_CODES["low"]
+        dream = (self.tuition > budget * ranking.DREAM_TUITION_RATIO) | (self.competition == high)
+        safe = ~dream & (self.tuition < budget * ranking.SAFE_TUITION_RATIO) & (self.competition == low)
+        return np.where(dream, 0, np.where(safe, 2, 1)).astype(np.int8)
+
+    def recommend(
+        self,
+        profile: dict,
+        per_category: int,
+        exclude_ids: Optional[set[int]] = None,
+    ) -> dict[str, list[tuple[object, float]]]:
+        """Best `per_category` programs of each category as (university, score), best first."""
+        scores = self.score(profile)
+        categories = self.categories(profile.get("budget_per_year") or 0)
+        eligible = np.ones(len(self), dtype=bool)
+        if exclude_ids:
+            eligible &= ~np.isin(self.ids, np.fromiter(exclude_ids, dtype=np.int64))
+
+        result: dict[str, list[tuple[object, float]]] = {}
+        for code, name in enumerate(CATEGORIES):
+            rows = np.flatnonzero(eligible & (categories == code))
+            if len(rows) > per_category:
+                # Partial selection first, then sort only the survivors. Rows
+                # tied with the cut-off score are all kept so tie-breaks stay exact.
+                cutoff = np.partition(scores[rows], len(rows) - per_category)[len(rows) - per_category]
+                rows = rows[scores[rows] >= cutoff]
+            # Best score, then cheaper, then lower id (as in rank_universities)
+            order = np.lexsort((self.ids[rows], self.tuition[rows], -scores[rows]))[:per_category]
+            result[name] = [(self.universities[i], float(scores[i])) for i in rows[order]]
+        return result
+
+
+_matrix: Optional[CatalogMatrix] = None
+_matrix_catalog: Optional[university_catalog.CatalogIndex] = None
+
+
+def get_matrix(catalog: university_catalog.CatalogIndex) -> CatalogMatrix:
+    """The column arrays for `catalog`, rebuilt when the catalog is reloaded."""
+    global _matrix, _matrix_catalog
+    if _matrix_catalog is not catalog:
+        _matrix = CatalogMatrix(catalog.all())
+        _matrix_catalog = catalog
+    return _matrix
@@ -1,5 +1,5 @@
 from datetime import datetime
-from typing import List, Optional
+from typing import Dict, List, Optional
 
 from pydantic import BaseModel, EmailStr
 
@@ -109,6 +109,73 @@ class UniversityBase(BaseModel):
         from_attributes = True
 
 
+class UniversitySearchHit(BaseModel):
+    score: float
+    university: UniversityBase
+
+
+class UniversitySearchResponse(BaseModel):
+    query: str
+    backend: str
+    results: List[UniversitySearchHit]
+
+
+class UniversityListItem(BaseModel):
+    """A /universities row; with `fields=` only the requested columns are set."""
+
+    id: int
+    name: Optional[str] = None
+    country: Optional[str] = None
+    city: Optional[str] = None
+    field_of_study: Optional[str] = None
+    degree_level: Optional[str] = None
+    tuition_per_year: Optional[int] = None
+    cost_level: Optional[str] = None
+    competition_level: Optional[str] = None
+    base_acceptance_chance: Optional[AcceptanceChanceEnum] = None
+    description: Optional[str] = None
+
+    class Config:
+        from_attributes = True
+
+
+class UniversityFacets(BaseModel):
+    total: int
+    country: Dict[str, int]
+    degree_level: Dict[str, int]
+    cost_level: Dict[str, int]
+    competition_level: Dict[str, int]
+    tuition: Dict[str, int]  # keyed by university_facets.TUITION_BUCKETS labels
+
+
+class RecommendationItem(BaseModel):
+    score: float
+    category: UniversityCategoryEnum
+    university: UniversityBase
+
+
+class RecommendationsOut(BaseModel):
+    stale: bool = False  # a refresh is pending; these are the previous lists
+    updated_at: Optional[datetime] = None
+    dream: List[RecommendationItem]
+    target: List[RecommendationItem]
+    safe: List[RecommendationItem]
+
+
+class SimilarUniversity(BaseModel):
+    weight: int  # co-occurrence strength (see university_similarity)
+    university: UniversityBase
+
+
+class AutocompleteSuggestion(BaseModel):
+    type: str  # "university", "city" or "country"
+    label: str
+    university_id: Optional[int] = None
+    country: Optional[str] = None
+    city: Optional[str] = None
+    count: Optional[int] = None  # universities in a city or country
+
+
 class UniversityFilter(BaseModel):
     max_budget_per_year: Optional[int] = None
     countries: Optional[List[str]] = None
@@ -169,9 +236,19 @@ class CounsellorAction(BaseModel):
     payload: dict
 
 
+class CounsellorActionResult(BaseModel):
+    index: int  # position in the reply's action list
+    type: str
+    status: str  # "executed", "skipped", "invalid", "ignored" or "failed"
+    key: Optional[str] = None  # idempotency key of an executable action
+    detail: Optional[str] = None
+    messages: List[str] = []
+
+
 class CounsellorResponse(BaseModel):
     messages: List[CounsellorMessage]
     actions: List[CounsellorAction] = []
+    results: List[CounsellorActionResult] = []
 
 
 # Chat History Schemas
@@ -4,9 +4,7 @@ Run with: python -m backend.seed_universities
 """
 from database import SessionLocal, engine, Base
 import models
-
-# Create tables if they don't exist
-Base.metadata.create_all(bind=engine)
+import university_catalog
 
 UNIVERSITIES = [
     # USA - Top Universities
@@ -70,6 +68,9 @@ UNIVERSITIES = [
 
 def seed_universities():
     """Seed the database with universities."""
+    # Create tables if they don't exist
+    Base.metadata.create_all(bind=engine)
+
     db = SessionLocal()
     try:
         # Check if already seeded
@@ -97,6 +98,7 @@ def seed_universities():
             )
             db.add(uni)
         
+        university_catalog.invalidate(db)
         db.commit()
         print(f"✅ Successfully seeded {len(UNIVERSITIES)} universities!")
         
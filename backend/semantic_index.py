@@ -0,0 +1,263 @@
+"""
+CPU-only semantic matching of free text (student goals, search queries)
+against the catalog.
+
+Each program is a TF-IDF vector over hashed features of its field of study,
+description and name: words, word bigrams, character 4-grams (so
+"engineer" meets "engineering") and related-subject concepts (so "machine
+learning" meets "Artificial Intelligence"). Vectors are L2-normalized and
+stored column-wise in NumPy arrays (a sparse matrix, one posting slice per
+feature), so a query's cosine against every program is a handful of slices
+and one bincount, then a partial sort for the top K.
+
+The arrays are rebuilt whenever the catalog reloads. With
+SEMANTIC_INDEX_PATH set they are also published there, one directory per
+catalog version, and memory-mapped by later processes that see the same
+version. A build is written to a temporary directory and renamed into place,
+so readers never see a partial index and files other processes have mapped
+are never rewritten.
+"""
+
+import json
+import os
+import re
+import shutil
+import tempfile
+import zlib
+from collections import Counter
+from typing import Optional
+
+import numpy as np
+
+import university_catalog
+from config import get_settings
+
+
+# Subjects students describe in different words; each group is one concept
+RELATED_SUBJECTS = [
+    {"artificial intelligence", "ai", "machine learning", "ml", "deep learning", "robotics",
+     "computer vision", "natural language processing", "nlp", "neural networks"},
+    {"data science", "data analytics", "analytics", "statistics", "big data", "business analytics",
+     "data engineering"},
+    {"computer science", "cs", "computing", "software engineering", "software", "informatics",
+     "programming", "information technology"},
+    {"business administration", "mba", "management", "business", "entrepreneurship", "strategy"},
+    {"finance", "accounting", "banking", "fintech", "investment", "economics"},
+    {"electrical engineering", "electronics", "embedded systems", "telecommunications"},
+    {"mechanical engineering", "automotive", "aerospace", "manufacturing"},
+    {"public health", "epidemiology", "global health", "healthcare", "health policy"},
+    {"biotechnology", "bioinformatics", "life sciences", "biology", "genetics"},
+    {"environmental science", "sustainability", "climate", "ecology", "renewable energy"},
+]
+_CONCEPTS = {phrase: group for group, phrases in enumerate(RELATED_SUBJECTS) for phrase in phrases}
+_MAX_PHRASE_WORDS = max(len(phrase.split()) for phrase in _CONCEPTS)
+
+# Words that say nothing about a program
+_STOPWORDS = {
+    "a", "an", "and", "at", "by", "for", "from", "in", "is", "of", "on", "or", "the", "to", "with",
+    "university", "program", "programs", "programme", "strong", "top", "excellent",
+}
+_TOKEN = re.compile(r"[a-z0-9]+")
+
+FEATURE_BITS = 20
+FEATURE_WEIGHTS = {"word": 1.0, "bigram": 1.0, "char": 0.3, "concept": 1.5}
+# Document fields and how much each counts
+FIELD_WEIGHTS = {"field_of_study": 2.0, "description": 1.0, "name": 0.5}
+
+
+def _hash(feature: str) -> int:
+    return zlib.crc32(feature.encode("utf-8")) & ((1 << FEATURE_BITS) - 1)
+
+
+def features(text: str) -> Counter:
+    """Weighted hashed features of `text`."""
+    words = _TOKEN.findall((text or "").lower())
+    counts: Counter = Counter()
+    content = [w for w in words if w not in _STOPWORDS]
+    for word in content:
+        counts[_hash("w:" + word)] += FEATURE_WEIGHTS["word"]
+        padded = f"#{word}#"
+        for i in range(len(padded) - 3):
+            counts[_hash("c:" + padded[i:i + 4])] += FEATURE_WEIGHTS["char"]
+    for first, second in zip(content, content[1:]):
+        counts[_hash(f"b:{first} {second}")] += FEATURE_WEIGHTS["bigram"]
+    # Concepts match on the raw words, so "ai" and "data science" count
+    for size in range(1, _MAX_PHRASE_WORDS + 1):
+        for i in range(len(words) - size + 1):
+            group = _CONCEPTS.get(" ".join(words[i:i + size]))
+            if group is not None:
+                counts[_hash(f"k:{group}")] += FEATURE_WEIGHTS["concept"]
+    return counts
+
+
+def _document(uni) -> Counter:
+    counts: Counter = Counter()
+    for field, weight in FIELD_WEIGHTS.items():
+        for feature, value in features(getattr(uni, field, "") or "").items():
+            counts[feature] += weight * value
+    return counts
+
+
+class SemanticIndex:
+    """Column-major sparse TF-IDF matrix over the catalog."""
+
+    ARRAYS = ("ids", "feature_ids", "idf", "offsets", "rows", "values")
+
+    def __init__(self, arrays: dict[str, np.ndarray], version: int):
+        self.version = version
+        for name in self.ARRAYS:
+            setattr(self, name, arrays[name])
+
+    @classmethod
+    def build(cls, universities, version: int) -> "SemanticIndex":
+        universities = list(universities)
+        doc_features, doc_rows, doc_tf = [], [], []
+        for row, uni in enumerate(universities):
+            doc = _document(uni)
+            doc_features.extend(doc.keys())
+            doc_tf.extend(doc.values())
+            doc_rows.extend([row] * len(doc))
+        feature_hashes = np.array(doc_features, dtype=np.int64)
+        rows = np.array(doc_rows, dtype=np.int32)
+        tf = np.array(doc_tf, dtype=np.float64)
+
+        # Features are unique within a document, so counts are document frequencies
+        feature_ids, inverse, df = np.unique(feature_hashes, return_inverse=True, return_counts=True)
+        n = len(universities)
+        idf = np.log((1 + n) / (1 + df)) + 1.0
+        weights = np.log1p(tf) * idf[inverse]
+        norms = np.sqrt(np.bincount(rows, weights=weights * weights, minlength=n))
+        values = weights / np.where(norms > 0, norms, 1.0)[rows]
+
+        # Column-major: postings grouped by feature
+        order = np.argsort(inverse, kind="stable")
+        offsets = np.zeros(len(feature_ids) + 1, dtype=np.int64)
+        np.cumsum(df, out=offsets[1:])
+        arrays = {
+            "ids": np.array([uni.id for uni in universities], dtype=np.int64),
+            "feature_ids": feature_ids,
+            "idf": idf.astype(np.float32),
+            "offsets": offsets,
+            "rows": rows[order],
+            "values": values[order].astype(np.float32),
+        }
+        return cls(arrays, version)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def _lookup(self, sorted_keys: np.ndarray, key: int) -> int:
+        """Position of `key` in `sorted_keys`, or -1."""
+        position = int(np.searchsorted(sorted_keys, key))
+        if position < len(sorted_keys) and sorted_keys[position] == key:
+            return position
+        return -1
+
+    def similarities(self, text: str) -> np.ndarray:
+        """Cosine similarity of `text` to every program (row order of self.ids)."""
+        scores = np.zeros(len(self), dtype=np.float32)
+        query = {}
+        for feature, tf in features(text).items():
+            position = self._lookup(self.feature_ids, feature)
+            if position >= 0:
+                query[position] = np.log1p(tf) * float(self.idf[position])
+        norm = float(np.sqrt(sum(w * w for w in query.values())))
+        if not norm:
+            return scores
+        rows, values = [], []
+        for position, weight in query.items():
+            start, end = self.offsets[position], self.offsets[position + 1]
+            rows.append(self.rows[start:end])
+            values.append(self.values[start:end] * (weight / norm))
+        if rows:
+            # One pass over all the postings the query touches
+            scores += np.bincount(
+                np.concatenate(rows), weights=np.concatenate(values), minlength=len(self)
+            ).astype(np.float32)
+        return scores
+
+    def scores_by_id(self, text: str, min_score: float = 0.0) -> dict[int, float]:
+        """{university id: cosine} for programs scoring above `min_score`."""
+        scores = self.similarities(text)
+        rows = np.flatnonzero(scores > min_score)
+        return {int(self.ids[row]): float(scores[row]) for row in rows}
+
+    def top_k(self, text: str, k: int, min_score: float = 0.05) -> list[tuple[int, float]]:
+        """The `k` programs closest to `text` as (university id, cosine), best first."""
+        scores = self.similarities(text)
+        candidates = np.flatnonzero(scores > min_score)
+        if len(candidates) > k:
+            candidates = candidates[np.argpartition(-scores[candidates], k - 1)[:k]]
+        order = np.lexsort((self.ids[candidates], -scores[candidates]))
+        return [(int(self.ids[row]), float(scores[row])) for row in candidates[order]]
+
+    def save(self, path: str) -> None:
+        """Write the arrays and meta file into the (new, empty) directory `path`."""
+        for name in self.ARRAYS:
+            np.save(os.path.join(path, f"{name}.npy"), getattr(self, name))
+        with open(os.path.join(path, "meta.json"), "w") as f:
+            json.dump({"version": self.version, "size": len(self)}, f)
+
+    def publish(self, base: str) -> None:
+        """
+        Save under `base` as this version's directory, atomically: the arrays
+        go to a temporary directory that is then renamed. If another process
+        published the same version first, its copy is kept. Older versions
+        are removed; processes that mapped them keep their open files.
+        """
+        os.makedirs(base, exist_ok=True)
+        tmp = tempfile.mkdtemp(prefix=".tmp-", dir=base)
+        try:
+            self.save(tmp)
+            os.rename(tmp, _version_path(base, self.version))
+        except OSError:
+            shutil.rmtree(tmp, ignore_errors=True)
+            if not os.path.isdir(_version_path(base, self.version)):
+                raise
+        for entry in os.listdir(base):
+            if entry.startswith("v") and entry[1:].isdigit() and int(entry[1:]) < self.version:
+                shutil.rmtree(os.path.join(base, entry), ignore_errors=True)
+
+    @classmethod
+    def load(cls, base: str, version: int) -> Optional["SemanticIndex"]:
+        """Memory-map the index published under `base` for catalog `version`, if any."""
+        path = _version_path(base, version)
+        try:
+            with open(os.path.join(path, "meta.json")) as f:
+                meta = json.load(f)
+            if meta.get("version") != version:
+                return None
+            arrays = {
+                name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r") for name in cls.ARRAYS
+            }
+        except (OSError, ValueError):
+            return None
+        return cls(arrays, version)
+
+
+def _version_path(base: str, version: int) -> str:
+    return os.path.join(base, f"v{version}")
+
+
+_index: Optional[SemanticIndex] = None
+_indexed_catalog: Optional[university_catalog.CatalogIndex] = None
+
+
+def get_index(catalog: university_catalog.CatalogIndex) -> SemanticIndex:
+    """The semantic index for `catalog`, rebuilt (or loaded) when the catalog is reloaded."""
+    global _index, _indexed_catalog
+    if _indexed_catalog is catalog:
+        return _index
+
+    path = get_settings().semantic_index_path
+    index = SemanticIndex.load(path, catalog.version) if path else None
+    if index is None or len(index) != len(catalog):
+        index = SemanticIndex.build(catalog.all(), catalog.version)
+        if path:
+            try:
+                index.publish(path)
+            except OSError as e:
+                print(f"Could not save semantic index to {path}: {e.__class__.__name__}")
+    _index = index
+    _indexed_catalog = catalog
+    return _index
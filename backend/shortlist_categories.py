@@ -0,0 +1,160 @@
+"""
+Set-based recomputation of the dream/target/safe category on shortlists.
+
+A link's category depends on the university's tuition and competition level
+and on the student's budget (university_ranking.categorize). When either
+side changes, the categories are recomputed in the database with one
+UPDATE ... FROM universities, profiles per user or per batch of users; no
+link is loaded into the ORM, and only rows whose category actually changes
+are written.
+
+Profile saves recategorize the user's links only when the budget changed,
+so categories the counsellor set stay put otherwise. Catalog writes
+recategorize the links to the universities they changed, through
+university_catalog.invalidate(). To recompute everything in batches (after
+a bulk load, say), run: python shortlist_categories.py
+"""
+
+from typing import Optional
+
+from sqlalchemy import and_, case, cast, func, literal, or_, select, update
+from sqlalchemy.orm import Session
+
+import models
+import university_ranking
+
+
+def category_expression():
+    """SQL CASE equivalent of university_ranking.categorize over a link's university and profile."""
+    category_type = models.UserUniversity.category.type
+    tuition = models.University.tuition_per_year
+    budget = models.Profile.budget_per_year
+    competition = models.University.competition_level
+
+    def value(category: models.UniversityCategoryEnum):
+        return literal(category, category_type)
+
+    category = case(
+        (
+            or_(
+                tuition > budget * university_ranking.DREAM_TUITION_RATIO,
+                competition == models.RiskLevelEnum.HIGH,
+            ),
+            value(models.UniversityCategoryEnum.DREAM),
+        ),
+        (
+            and_(
+                tuition < budget * university_ranking.SAFE_TUITION_RATIO,
+                competition == models.RiskLevelEnum.LOW,
+            ),
+            value(models.UniversityCategoryEnum.SAFE),
+        ),
+        else_=value(models.UniversityCategoryEnum.TARGET),
+    )
+    # Postgres types a CASE over bound values as text; compare and assign it as the enum
+    return cast(category, category_type)
+
+
+def recategorize_statement():
+    """UPDATE ... FROM universities, profiles for links whose category is out of date."""
+    category = category_expression()
+    return (
+        update(models.UserUniversity)
+        .where(
+            models.UserUniversity.university_id == models.University.id,
+            models.Profile.user_id == models.UserUniversity.user_id,
+            models.UserUniversity.category != category,
+        )
+        .values(category=category)
+        .execution_options(synchronize_session=False)
+    )
+
+
+# Profile fields the categories depend on
+PROFILE_INPUTS = ("budget_per_year",)
+
+
+def profile_inputs(profile: models.Profile) -> tuple:
+    return tuple(getattr(profile, field) for field in PROFILE_INPUTS)
+
+
+def recategorize_user(db: Session, user_id: int) -> int:
+    """
+    Recompute one user's link categories; call from profile writes that
+    change PROFILE_INPUTS, before the commit. Returns the number of links
+    that changed category.
+    """
+    result = db.execute(recategorize_statement().where(models.UserUniversity.user_id == user_id))
+    return result.rowcount
+
+
+def _mark_contexts_stale(db: Session, user_ids) -> None:
+    # Counsellor prompts show the categories
+    db.execute(
+        update(models.CounsellorContext)
+        .where(models.CounsellorContext.user_id.in_(set(user_ids)))
+        .values(stale=True, version=models.CounsellorContext.version + 1)
+        .execution_options(synchronize_session=False)
+    )
+
+
+def recategorize_universities(db: Session, university_ids: Optional[list[int]] = None) -> int:
+    """
+    Recompute the categories of links to `university_ids` (None: every
+    link) in the caller's transaction; called by catalog writes. Returns
+    the number of links that changed category.
+    """
+    stmt = recategorize_statement()
+    if university_ids is not None:
+        if not university_ids:
+            return 0
+        stmt = stmt.where(models.UserUniversity.university_id.in_(university_ids))
+    user_ids = list(db.execute(stmt.returning(models.UserUniversity.user_id)).scalars())
+    if user_ids:
+        _mark_contexts_stale(db, user_ids)
+    return len(user_ids)
+
+
+def recategorize_all(
+    db: Session, batch_size: int = 5000, university_ids: Optional[list[int]] = None
+) -> int:
+    """
+    Recompute every user's link categories (optionally only links to
+    `university_ids`), committing per batch of `batch_size` user ids so no
+    single transaction holds locks on the whole table.
+    """
+    changed = 0
+    after = 0
+    while True:
+        # Upper user id of the next batch (keyset over user ids with links)
+        bounds = (
+            select(models.UserUniversity.user_id)
+            .where(models.UserUniversity.user_id > after)
+            .distinct()
+            .order_by(models.UserUniversity.user_id)
+            .limit(batch_size)
+            .subquery()
+        )
+        upper = db.execute(select(func.max(bounds.c.user_id))).scalar()
+        if upper is None:
+            return changed
+
+        stmt = recategorize_statement().where(
+            models.UserUniversity.user_id > after,
+            models.UserUniversity.user_id <= upper,
+        )
+        if university_ids is not None:
+            stmt = stmt.where(models.UserUniversity.university_id.in_(university_ids))
+        user_ids = list(db.execute(stmt.returning(models.UserUniversity.user_id)).scalars())
+        changed += len(user_ids)
+        if user_ids:
+            _mark_contexts_stale(db, user_ids)
+        db.commit()
+        after = upper
+
+
+if __name__ == "__main__":
+    from database import SessionLocal
+
+    with SessionLocal() as session:
+        print(f"Recategorized {recategorize_all(session)} shortlisted universities.")
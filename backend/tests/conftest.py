@@ -0,0 +1,40 @@
+"""
+Shared fixtures. The modules under test import each other as top-level
+modules (as when the app runs from backend/), and config needs a
+DATABASE_URL; none of these tests connect to it.
+"""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+if not os.environ.get("DATABASE_URL"):
+    os.environ["DATABASE_URL"] = "postgresql://localhost/ai_counsellor_test"
+
+import schemas  # noqa: E402
+from seed_universities import UNIVERSITIES  # noqa: E402
+
+
+def make_university(university_id: int, **fields) -> schemas.UniversityBase:
+    values = {
+        "id": university_id,
+        "name": f"University {university_id}",
+        "country": "Germany",
+        "city": "Berlin",
+        "field_of_study": "Computer Science",
+        "degree_level": "masters",
+        "tuition_per_year": 10000,
+        "cost_level": "medium",
+        "competition_level": "medium",
+        "base_acceptance_chance": "medium",
+        "description": None,
+    }
+    values.update(fields)
+    return schemas.UniversityBase(**values)
+
+
+@pytest.fixture
+def seed_catalog() -> list[schemas.UniversityBase]:
+    """The seed universities, with ids in list order."""
+    return [make_university(i, **uni) for i, uni in enumerate(UNIVERSITIES, start=1)]
@@ -0,0 +1,94 @@
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+import conversation_memory
+import models
+
+
+@pytest.fixture
+def db():
+    """The chat tables in an in-memory SQLite database."""
+    engine = create_engine("sqlite://")
+    models.Base.metadata.create_all(
+        engine, tables=[models.ChatMessage.__table__, models.ChatSessionSummary.__table__]
+    )
+    with Session(engine) as session:
+        yield session
+
+
+@pytest.fixture(autouse=True)
+def scheduled(monkeypatch):
+    """Summary refreshes build_messages asked for."""
+    scheduled = []
+    monkeypatch.setattr(conversation_memory, "schedule_refresh", lambda *key: scheduled.append(key))
+    return scheduled
+
+
+def _message(role, content, session_id="s1", user_id=1):
+    return models.ChatMessage(user_id=user_id, session_id=session_id, role=role, content=content)
+
+
+def _add_turns(db, count, session_id="s1", user_id=1):
+    for i in range(count):
+        db.add(_message(models.ChatRoleEnum.USER, f"question {i}", session_id, user_id))
+        db.add(_message(models.ChatRoleEnum.ASSISTANT, f"answer {i}", session_id, user_id))
+    db.commit()
+
+
+def test_without_a_session_only_the_message_is_sent(db):
+    assert conversation_memory.build_messages(db, 1, None, "hi") == ("", [{"role": "user", "content": "hi"}])
+
+
+def test_window_keeps_the_last_turns(db, scheduled):
+    turns = conversation_memory.get_settings().counsellor_memory_turns
+    _add_turns(db, turns + 3)
+    _add_turns(db, 2, session_id="other")
+    summary, messages = conversation_memory.build_messages(db, 1, "s1", "next")
+    assert summary == ""
+    assert len(messages) == turns * 2 + 1
+    assert messages[0] == {"role": "user", "content": "question 3"}
+    assert messages[-2] == {"role": "assistant", "content": f"answer {turns + 2}"}
+    assert messages[-1] == {"role": "user", "content": "next"}
+    # Older turns fell out of the window unsummarized
+    assert scheduled == [(1, "s1")]
+
+
+def test_short_session_needs_no_summary(db, scheduled):
+    _add_turns(db, 2)
+    summary, messages = conversation_memory.build_messages(db, 1, "s1", "next")
+    assert len(messages) == 5
+    assert scheduled == []
+
+
+def test_already_stored_user_message_is_not_repeated(db):
+    _add_turns(db, 1)
+    db.add(_message(models.ChatRoleEnum.USER, "next"))
+    db.commit()
+    _, messages = conversation_memory.build_messages(db, 1, "s1", " next ")
+    assert [m["content"] for m in messages] == ["question 0", "answer 0", " next "]
+
+
+def test_summary_covers_the_older_turns(db, scheduled):
+    turns = conversation_memory.get_settings().counsellor_memory_turns
+    _add_turns(db, turns + 3)
+    window_start = conversation_memory._recent_messages(db, 1, "s1", turns * 2)[0].id
+    db.add(
+        models.ChatSessionSummary(
+            user_id=1, session_id="s1", summary="Wants Germany", summarized_through_id=window_start - 1
+        )
+    )
+    db.commit()
+    summary, _ = conversation_memory.build_messages(db, 1, "s1", "next")
+    assert summary == "Wants Germany"
+    assert scheduled == []
+    assert conversation_memory.with_summary("PROMPT", summary).startswith("PROMPT\n## Earlier in This Conversation")
+    assert conversation_memory.with_summary("PROMPT", "") == "PROMPT"
+
+
+def test_long_messages_are_clipped(db, monkeypatch):
+    monkeypatch.setattr(conversation_memory.get_settings(), "counsellor_memory_message_chars", 20)
+    db.add(_message(models.ChatRoleEnum.ASSISTANT, "word " * 50))
+    db.commit()
+    _, messages = conversation_memory.build_messages(db, 1, "s1", "next")
+    assert messages[0]["content"] == "word word word word …"
@@ -0,0 +1,60 @@
+import counsellor_actions
+from counsellor_actions import IGNORED, INVALID, action_key
+
+
+def test_action_key_is_deterministic_and_ignores_rephrasing():
+    first = action_key(1, "create_todo", {"title": "Book  IELTS", "description": "soon", "university_id": "12"})
+    second = action_key(1, "create_todo", {"title": "book ielts", "description": "next week", "university_id": 12})
+    assert first == second
+    assert len(first) == 64
+
+
+def test_action_key_separates_users_types_and_targets():
+    payload = {"university_id": 5}
+    keys = {
+        action_key(1, "shortlist_university", payload),
+        action_key(2, "shortlist_university", payload),
+        action_key(1, "lock_university", payload),
+        action_key(1, "shortlist_university", {"university_id": 6}),
+    }
+    assert len(keys) == 4
+    assert action_key(1, "shortlist_university", {"university_id": 5, "reason": "a"}) == action_key(
+        1, "shortlist_university", {"university_id": 5, "reason": "b"}
+    )
+
+
+def test_as_id():
+    assert counsellor_actions._as_id("42") == 42
+    assert counsellor_actions._as_id(7) == 7
+    for value in (None, "", "abc", 0, -3, True, 1.5j):
+        assert counsellor_actions._as_id(value) is None
+
+
+def test_validate_normalizes_executable_actions():
+    planned, rejected = counsellor_actions._validate(
+        0, {"type": "lock_university", "payload": {"user_university_id": "9"}}
+    )
+    assert rejected is None
+    assert planned["university_id"] is None
+    assert planned["user_university_id"] == 9
+
+
+def test_validate_rejections():
+    cases = [
+        ("not a dict", INVALID),
+        ({"type": "show_universities", "payload": {}}, IGNORED),
+        ({"type": "create_todo", "payload": {}}, INVALID),
+        ({"type": "shortlist_university", "payload": {"university_id": "x"}}, INVALID),
+        ({"type": "lock_university", "payload": {}}, INVALID),
+        ({"type": "create_todo", "payload": "oops"}, INVALID),
+    ]
+    for index, (action, status) in enumerate(cases):
+        planned, rejected = counsellor_actions._validate(index, action)
+        assert planned is None
+        assert rejected.status == status
+        assert rejected.index == index
+
+
+def test_execute_actions_without_executable_actions_skips_the_database():
+    results = counsellor_actions.execute_actions(None, 1, [{"type": "show_universities"}, 3])
+    assert [r.status for r in results] == [IGNORED, INVALID]
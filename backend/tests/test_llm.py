@@ -0,0 +1,273 @@
+import asyncio
+
+import httpx
+import pytest
+
+import llm
+
+
+@pytest.fixture
+def upstream(monkeypatch):
+    """Point the shared client at an in-process OpenRouter; returns the requests it received."""
+    received = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        received.append(request)
+        return httpx.Response(200, json={"choices": [{"message": {"content": "Hi there"}}]})
+
+    monkeypatch.setattr(llm, "_http_client", None)
+    monkeypatch.setattr(llm, "_create_http_client", lambda: httpx.AsyncClient(transport=httpx.MockTransport(handler)))
+    for counter in llm._pool_counters:
+        monkeypatch.setitem(llm._pool_counters, counter, 0)
+    return received
+
+
+def test_http_client_is_shared(upstream):
+    async def run():
+        client = llm.get_http_client()
+        assert llm.get_http_client() is client
+        await llm.start_http_client()
+        assert llm.get_http_client() is client
+        await llm.close_http_client()
+        assert client.is_closed
+        replacement = llm.get_http_client()
+        assert replacement is not client
+        await llm.close_http_client()
+
+    asyncio.run(run())
+
+
+def test_requests_reuse_the_shared_client(upstream):
+    async def run():
+        first = await llm._request_completion("test-key", [{"role": "user", "content": "hi"}], "system", "m")
+        client = llm.get_http_client()
+        second = await llm._request_completion("test-key", [{"role": "user", "content": "again"}], "system", "m")
+        assert llm.get_http_client() is client
+        await llm.close_http_client()
+        return first, second
+
+    first, second = asyncio.run(run())
+    assert first == second == {"content": "Hi there", "actions": []}
+    assert len(upstream) == 2
+    assert upstream[0].headers["authorization"] == "Bearer test-key"
+
+
+def test_pool_stats(upstream, monkeypatch):
+    stats = llm.get_pool_stats()
+    assert stats["requests"] == 0
+    assert stats["reuse_ratio"] == 0.0
+    assert stats["open_connections"] == 0
+
+    monkeypatch.setitem(llm._pool_counters, "requests", 10)
+    monkeypatch.setitem(llm._pool_counters, "new_connections", 2)
+    stats = llm.get_pool_stats()
+    assert stats["reuse_ratio"] == 0.8
+    assert stats["in_flight"] == 0
+    assert stats["max_connections"] == llm.get_settings().llm_max_connections
+
+
+def test_stream_latency_is_time_to_first_delta(monkeypatch):
+    async def body():
+        yield b'data: {"choices": [{"delta": {"content": "Hello"}}]}\n\n'
+        await asyncio.sleep(0.3)
+        yield b'data: {"choices": [{"delta": {"content": " there"}}]}\n\n'
+        yield b"data: [DONE]\n\n"
+
+    transport = httpx.MockTransport(lambda request: httpx.Response(200, content=body()))
+    monkeypatch.setattr(llm, "_http_client", None)
+    monkeypatch.setattr(llm, "_create_http_client", lambda: httpx.AsyncClient(transport=transport))
+    recorded = []
+    monkeypatch.setattr(llm, "_record_outcome", lambda stats, error=None, latency=0.0: recorded.append(latency))
+
+    async def run():
+        deltas = [d async for d in llm._stream_deltas("test-key", [], "system", "m")]
+        await llm.close_http_client()
+        return deltas
+
+    assert asyncio.run(run()) == ["Hello", " there"]
+    assert len(recorded) == 1
+    assert recorded[0] < 0.3
+
+
+@pytest.fixture
+def stream_reply(monkeypatch):
+    """Stream a reply made of `deltas` from a fake upstream that fails before delta `fail_at`."""
+    monkeypatch.setattr(llm, "get_openrouter_api_key", lambda: "test-key")
+
+    def run(deltas, fail_at=None):
+        async def chunks():
+            for i, delta in enumerate(deltas):
+                if i == fail_at:
+                    raise RuntimeError("upstream broke")
+                yield delta
+
+        async def open_stream(api_key, messages, system_prompt, models):
+            if fail_at == 0:
+                raise RuntimeError("upstream broke")
+            stream = chunks()
+            return stream, await stream.__anext__()
+
+        monkeypatch.setattr(llm, "_open_stream", open_stream)
+
+        async def collect():
+            messages = [{"role": "user", "content": "hi"}]
+            return [event async for event in llm.stream_chat_with_llm(messages, "system", cache=False)]
+
+        return asyncio.run(collect())
+
+    return run
+
+
+def test_stream_completes(stream_reply):
+    events = stream_reply(["Hello ", "there", '\n```actions\n[{"type": "create_todo", "payload": {"title": "x"}}]\n```'])
+    assert "".join(e["content"] for e in events if e["type"] == "delta") == "Hello there\n"
+    assert events[-1]["type"] == "done"
+    assert events[-1]["content"].strip() == "Hello there"
+    assert events[-1]["actions"] == [{"type": "create_todo", "payload": {"title": "x"}}]
+
+
+def test_stream_failing_before_any_text_streams_the_fallback(stream_reply):
+    events = stream_reply(["Hello"], fail_at=0)
+    assert [e["type"] for e in events] == ["delta", "done"]
+    assert events[-1]["degraded"] is True
+    assert events[0]["content"] == events[-1]["content"]
+
+
+def test_stream_failing_mid_reply_ends_with_error(stream_reply):
+    events = stream_reply(["Hello ", "there, ", "friend"], fail_at=2)
+    assert [e["type"] for e in events] == ["delta", "delta", "error"]
+    assert "".join(e["content"] for e in events[:-1]) == "Hello there, "
+    assert events[-1]["detail"]
+
+
+def _status_error(code: int) -> httpx.HTTPStatusError:
+    request = httpx.Request("POST", llm.OPENROUTER_API_URL)
+    return httpx.HTTPStatusError("error", request=request, response=httpx.Response(code, request=request))
+
+
+@pytest.fixture
+def chain(monkeypatch):
+    """Run _complete_with_fallback over models that fail with the given errors; returns the attempts."""
+    monkeypatch.setattr(llm, "_hedge_delay", lambda model: None)
+    monkeypatch.setattr(llm, "backoff_delay", lambda *args: 0)
+
+    def run(failures: dict[str, list]):
+        attempts = []
+
+        async def request(api_key, messages, system_prompt, model):
+            attempts.append(model)
+            errors = failures.get(model, [])
+            if errors:
+                raise errors.pop(0)
+            return {"content": model, "actions": []}
+
+        monkeypatch.setattr(llm, "_request_completion", request)
+        result = asyncio.run(llm._complete_with_fallback("test-key", [], "system", ["a", "b", "c"]))
+        return result, attempts
+
+    return run
+
+
+def test_fallback_retries_retryable_errors(chain):
+    result, attempts = chain({"a": [_status_error(503)]})
+    assert result["content"] == "a"
+    assert attempts == ["a", "a"]
+
+
+def test_fallback_moves_on_after_retries_or_client_errors(chain):
+    retries = llm.get_settings().llm_max_retries
+    result, attempts = chain({"a": [_status_error(503)] * (retries + 1), "b": [_status_error(400)]})
+    assert result["content"] == "c"
+    assert attempts == ["a"] * (retries + 1) + ["b", "c"]
+
+
+def test_fallback_raises_the_last_error(chain):
+    with pytest.raises(httpx.HTTPStatusError):
+        chain({model: [_status_error(404)] for model in "abc"})
+
+
+def _section(priority, lines, trim_rows=False):
+    return {"priority": priority, "lines": lines, "trim_rows": trim_rows}
+
+
+def test_estimate_tokens():
+    assert llm.estimate_tokens("") == 0
+    assert llm.estimate_tokens("word") == 1
+    assert llm.estimate_tokens("words") == 2
+    assert llm.estimate_tokens("1234567") == 3
+    assert llm.estimate_tokens("a, b.") == 4
+
+
+def test_fit_sections_keeps_everything_under_budget():
+    sections = [_section(0, ["HEADER"]), _section(2, ["TABLE", "row one", "row two"], trim_rows=True)]
+    assert llm._fit_sections(sections, 1000) == "HEADER\nTABLE\nrow one\nrow two"
+
+
+def test_fit_sections_trims_lowest_priority_first():
+    rows = [f"{i}|University number {i}|Germany" for i in range(40)]
+    sections = [
+        _section(0, ["PROFILE must stay"]),
+        _section(1, ["LOCKED 1|Kept University"]),
+        _section(3, ["CANDIDATES id|name|country"] + rows, trim_rows=True),
+        _section(4, ["FOCUS NOW: something optional and rather long to drop first"]),
+    ]
+    text = llm._fit_sections(sections, 120)
+    assert llm.estimate_tokens(text) <= 120
+    assert "PROFILE must stay" in text
+    assert "LOCKED" in text
+    assert "FOCUS NOW" not in text
+    # The candidate table keeps its header and its first rows
+    assert "CANDIDATES" in text and "0|University number 0" in text
+    assert "39|University number 39" not in text
+    # The input sections are left as they were
+    assert len(sections[2]["lines"]) == 41
+
+
+def test_fit_sections_never_drops_priority_zero():
+    text = llm._fit_sections([_section(0, ["x " * 200]), _section(1, ["extra"])], 5)
+    assert text.startswith("x x")
+    assert "extra" not in text
+
+
+def test_compact_prompt_respects_budget():
+    profile = {"preferred_countries": "Germany", "field_of_study": "Computer Science", "budget_per_year": 20000}
+    catalog = [
+        {"id": i, "name": f"University {i}", "country": "Germany", "tuition_per_year": 1000 * i,
+         "field_of_study": "Computer Science", "degree_level": "masters"}
+        for i in range(200)
+    ]
+    prompt = llm.build_compact_system_prompt(profile, "discovering_universities", [], catalog, token_budget=900)
+    assert llm.estimate_tokens(prompt) <= 900
+    assert prompt.startswith(llm.COMPACT_STATIC_PREFIX)
+    assert "CANDIDATES" in prompt
+
+
+def _full_prompt(**profile_fields) -> str:
+    profile = {"preferred_countries": "Germany", "field_of_study": "Computer Science", **profile_fields}
+    return llm.build_system_prompt(profile, "building_profile", [], compact=False)
+
+
+def test_prompts_share_the_static_prefix():
+    first = _full_prompt(budget_per_year=10000)
+    second = _full_prompt(budget_per_year=50000, gpa=3.9)
+    assert first.startswith(llm.STATIC_PROMPT_PREFIX)
+    assert second.startswith(llm.STATIC_PROMPT_PREFIX)
+    # Nothing student-specific before the prefix ends
+    assert "10,000" not in llm.STATIC_PROMPT_PREFIX
+
+
+def test_cache_hint_splits_off_the_static_prefix(monkeypatch):
+    monkeypatch.setattr(llm.get_settings(), "llm_prompt_cache_hints", True)
+    prompt = _full_prompt(budget_per_year=10000)
+    parts = llm._system_content(prompt, "anthropic/claude-sonnet")
+    assert parts[0] == {"type": "text", "text": llm.STATIC_PROMPT_PREFIX, "cache_control": {"type": "ephemeral"}}
+    assert parts[0]["text"] + parts[1]["text"] == prompt
+    # Providers that cache prefixes on their own get the plain string
+    assert llm._system_content(prompt, "openai/gpt-4o") == prompt
+    assert llm._system_content("custom prompt", "anthropic/claude-sonnet") == "custom prompt"
+
+
+def test_cache_hints_can_be_disabled(monkeypatch):
+    monkeypatch.setattr(llm.get_settings(), "llm_prompt_cache_hints", False)
+    prompt = _full_prompt()
+    assert llm._system_content(prompt, "anthropic/claude-sonnet") == prompt
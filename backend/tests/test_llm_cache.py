@@ -0,0 +1,68 @@
+import asyncio
+
+from llm_cache import LLMResponseCache, make_cache_key
+
+
+def _reply(text: str) -> dict:
+    return {"content": text, "actions": []}
+
+
+def test_cache_key_ignores_whitespace_and_message_casing():
+    messages = [{"role": "user", "content": "Which  universities\nin Germany?"}]
+    same = [{"role": "user", "content": "which universities in germany?"}]
+    assert make_cache_key("m", "System  prompt\n", messages) == make_cache_key("m", "System prompt", same)
+
+
+def test_cache_key_separates_model_prompt_and_roles():
+    messages = [{"role": "user", "content": "hi"}]
+    keys = {
+        make_cache_key("m", "system", messages),
+        make_cache_key("other", "system", messages),
+        make_cache_key("m", "System", messages),
+        make_cache_key("m", "system", [{"role": "assistant", "content": "hi"}]),
+        make_cache_key("m", "system", messages + messages),
+    }
+    assert len(keys) == 5
+
+
+def test_lru_evicts_least_recently_used():
+    cache = LLMResponseCache(max_entries=2, max_bytes=10_000, ttl_seconds=60)
+
+    async def run():
+        await cache.set("a", "m", _reply("a"))
+        await cache.set("b", "m", _reply("b"))
+        assert await cache.get("a") is not None  # "b" is now the oldest
+        await cache.set("c", "m", _reply("c"))
+        return [await cache.get(key) for key in ("a", "b", "c")]
+
+    assert asyncio.run(run()) == [_reply("a"), None, _reply("c")]
+    assert cache.get_stats()["evictions"] == 1
+    assert cache.get_stats()["entries"] == 2
+
+
+def test_lru_is_bounded_by_bytes():
+    cache = LLMResponseCache(max_entries=100, max_bytes=120, ttl_seconds=60)
+
+    async def run():
+        for key in "abcd":
+            await cache.set(key, "m", _reply(key * 20))
+        # Too large to cache at all
+        await cache.set("huge", "m", _reply("x" * 500))
+
+    asyncio.run(run())
+    stats = cache.get_stats()
+    assert stats["bytes"] <= 120
+    assert "huge" not in cache._entries
+    assert list(cache._entries)[-1] == "d"
+
+
+def test_expired_entries_are_misses():
+    cache = LLMResponseCache(max_entries=10, max_bytes=10_000, ttl_seconds=0)
+
+    async def run():
+        await cache.set("a", "m", _reply("a"))
+        return await cache.get("a")
+
+    assert asyncio.run(run()) is None
+    assert cache.get_stats()["expirations"] == 1
+    assert cache.get_stats()["misses"] == 1
@@ -0,0 +1,101 @@
+import asyncio
+
+import pytest
+
+from llm_concurrency import ConcurrencyLimiter, LLMOverloadedError, SingleFlight
+
+
+def test_single_flight_shares_one_call():
+    flight = SingleFlight()
+    calls = []
+
+    async def fetch():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return {"content": "shared"}
+
+    async def run():
+        results = await asyncio.gather(*(flight.run("key", fetch) for _ in range(5)))
+        # Finished calls are forgotten: the next one goes upstream again
+        await flight.run("key", fetch)
+        return results
+
+    results = asyncio.run(run())
+    assert all(r is results[0] for r in results)
+    assert len(calls) == 2
+    assert flight.get_stats() == {"leaders": 2, "coalesced": 4, "in_flight_keys": 0}
+
+
+def test_single_flight_keeps_different_keys_apart():
+    flight = SingleFlight()
+
+    async def run():
+        return await asyncio.gather(
+            flight.run("a", lambda: asyncio.sleep(0, "a")),
+            flight.run("b", lambda: asyncio.sleep(0, "b")),
+        )
+
+    assert asyncio.run(run()) == ["a", "b"]
+    assert flight.get_stats()["leaders"] == 2
+
+
+def test_single_flight_survives_a_cancelled_caller():
+    flight = SingleFlight()
+
+    async def fetch():
+        await asyncio.sleep(0.02)
+        return "done"
+
+    async def run():
+        first = asyncio.ensure_future(flight.run("key", fetch))
+        second = asyncio.ensure_future(flight.run("key", fetch))
+        await asyncio.sleep(0)
+        first.cancel()
+        return await second
+
+    assert asyncio.run(run()) == "done"
+
+
+def test_limiter_rejects_when_the_queue_is_full():
+    async def run():
+        limiter = ConcurrencyLimiter(max_concurrency=1, max_queue=1, queue_timeout=1.0)
+        release = asyncio.Event()
+
+        async def hold():
+            async with limiter.slot():
+                await release.wait()
+
+        holder = asyncio.ensure_future(hold())
+        waiter = asyncio.ensure_future(hold())
+        await asyncio.sleep(0.01)
+        assert (limiter.in_flight, limiter.waiting) == (1, 1)
+        with pytest.raises(LLMOverloadedError):
+            async with limiter.slot():
+                pass
+        release.set()
+        await asyncio.gather(holder, waiter)
+        return limiter.get_stats()
+
+    stats = asyncio.run(run())
+    assert stats["acquired"] == 2
+    assert stats["rejected"] == 1
+    assert stats["peak_waiting"] == 1
+    assert (stats["in_flight"], stats["waiting"]) == (0, 0)
+
+
+def test_limiter_times_out_queued_calls():
+    async def run():
+        limiter = ConcurrencyLimiter(max_concurrency=1, max_queue=5, queue_timeout=0.01)
+        async with limiter.slot():
+            with pytest.raises(LLMOverloadedError):
+                async with limiter.slot():
+                    pass
+        # The slot is free again
+        async with limiter.slot():
+            pass
+        return limiter.get_stats()
+
+    stats = asyncio.run(run())
+    assert stats["timed_out"] == 1
+    assert stats["acquired"] == 2
+    assert stats["waiting"] == 0
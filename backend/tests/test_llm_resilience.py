@@ -0,0 +1,170 @@
+import asyncio
+import random
+
+import httpx
+import pytest
+
+import llm_resilience
+from llm_resilience import CircuitBreaker, ModelStats, backoff_delay, is_retryable
+
+
+def _status_error(code: int, headers: dict = None) -> httpx.HTTPStatusError:
+    request = httpx.Request("POST", "https://openrouter.ai/api/v1/chat/completions")
+    response = httpx.Response(code, headers=headers, request=request)
+    return httpx.HTTPStatusError("error", request=request, response=response)
+
+
+def test_is_retryable():
+    for code in (429, 500, 502, 503, 504):
+        assert is_retryable(_status_error(code))
+    for code in (400, 401, 404):
+        assert not is_retryable(_status_error(code))
+    assert is_retryable(httpx.ConnectError("refused"))
+    assert is_retryable(httpx.ReadTimeout("slow"))
+    assert is_retryable(asyncio.TimeoutError())
+    assert not is_retryable(ValueError("bad json"))
+
+
+def test_backoff_delay_is_jittered_within_the_exponential_cap():
+    random.seed(7)
+    for attempt in range(6):
+        ceiling = min(4.0, 0.5 * 2 ** attempt)
+        delays = [backoff_delay(attempt, 0.5, 4.0) for _ in range(200)]
+        assert all(0 <= d <= ceiling for d in delays)
+        # Full jitter: spread over the whole range, not bunched at the ceiling
+        assert min(delays) < ceiling * 0.25 and max(delays) > ceiling * 0.75
+
+
+@pytest.mark.parametrize(
+    "retry_after, expected",
+    [("2", 2.0), ("0.5", 0.5), ("120", 4.0), ("-3", 0.0)],
+)
+def test_backoff_delay_honours_retry_after(retry_after, expected):
+    error = _status_error(429, {"retry-after": retry_after})
+    assert backoff_delay(0, 0.5, 4.0, error) == expected
+
+
+def test_backoff_delay_ignores_an_unparseable_retry_after():
+    error = _status_error(429, {"retry-after": "Wed, 21 Oct 2026 07:28:00 GMT"})
+    assert 0 <= backoff_delay(1, 0.5, 4.0, error) <= 1.0
+
+
+def test_model_stats():
+    stats = ModelStats(window=10)
+    assert stats.percentile(0.95) is None
+    for latency in range(1, 21):
+        stats.record_success(latency / 10)
+    # Only the last `window` samples count
+    assert stats.percentile(0.0) == 1.1
+    assert stats.percentile(0.95) == 2.0
+    stats.record_error(asyncio.TimeoutError())
+    stats.record_error(_status_error(503))
+    summary = stats.as_dict()
+    assert (summary["successes"], summary["errors"], summary["timeouts"]) == (20, 2, 1)
+    assert summary["last_error"] == "HTTP 503"
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = _Clock()
+    monkeypatch.setattr(llm_resilience.time, "monotonic", clock)
+    return clock
+
+
+@pytest.fixture
+def breaker(clock):
+    return CircuitBreaker(
+        window_seconds=60,
+        min_calls=4,
+        error_rate_threshold=0.5,
+        slow_call_seconds=10,
+        slow_rate_threshold=0.75,
+        open_seconds=30,
+        half_open_max_calls=1,
+    )
+
+
+def test_breaker_needs_min_calls_before_tripping(breaker):
+    for _ in range(3):
+        breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow_request()
+    assert breaker.get_stats()["short_circuited"] == 1
+
+
+def test_breaker_trips_on_error_rate(breaker):
+    breaker.record_success(1)
+    breaker.record_success(1)
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+
+
+def test_breaker_trips_on_slow_calls(breaker):
+    for _ in range(3):
+        breaker.record_success(12)
+    breaker.record_success(1)
+    assert breaker.state == CircuitBreaker.OPEN
+
+
+def test_breaker_forgets_calls_outside_the_window(breaker, clock):
+    for _ in range(3):
+        breaker.record_failure()
+    clock.now += 61
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.get_stats()["calls_in_window"] == 1
+
+
+def _trip(breaker):
+    for _ in range(4):
+        breaker.record_failure()
+    assert breaker.is_open()
+
+
+def test_half_open_probe_success_closes(breaker, clock):
+    _trip(breaker)
+    clock.now += 29
+    assert not breaker.allow_request()
+    clock.now += 1
+    assert breaker.allow_request()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    # Only one probe at a time
+    assert not breaker.allow_request()
+    breaker.record_success(1)
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.get_stats()["calls_in_window"] == 0
+
+
+@pytest.mark.parametrize("outcome", ["failure", "slow"])
+def test_half_open_probe_failure_reopens(breaker, clock, outcome):
+    _trip(breaker)
+    clock.now += 30
+    assert breaker.allow_request()
+    if outcome == "failure":
+        breaker.record_failure()
+    else:
+        breaker.record_success(15)
+    assert breaker.state == CircuitBreaker.OPEN
+    assert breaker.get_stats()["opened"] == 2
+    assert not breaker.allow_request()
+
+
+def test_half_open_probe_that_never_reports_is_replaced(breaker, clock):
+    _trip(breaker)
+    clock.now += 30
+    assert breaker.allow_request()
+    assert not breaker.allow_request()
+    clock.now += 30
+    assert breaker.allow_request()
@@ -0,0 +1,83 @@
+import random
+
+import pytest
+
+import recommendation_engine
+import university_ranking
+from conftest import make_university
+
+PROFILES = [
+    {"preferred_countries": "Germany,UK", "field_of_study": "Computer Science", "intended_degree": "masters",
+     "budget_per_year": 30000},
+    {"preferred_countries": ["Canada"], "field_of_study": "", "degree_major": "Data Science",
+     "intended_degree": "phd", "budget_per_year": 15000},
+    {"preferred_countries": "", "field_of_study": "Business Administration", "intended_degree": "",
+     "budget_per_year": 0},
+]
+
+
+@pytest.fixture
+def universities():
+    rng = random.Random(11)
+    return [
+        make_university(
+            i,
+            country=rng.choice(["Germany", "UK", "Canada", "USA"]),
+            field_of_study=rng.choice(["Computer Science", "Data Science", "Business Administration", "Finance"]),
+            degree_level=rng.choice(["masters", "phd", "bachelors"]),
+            competition_level=rng.choice(["low", "medium", "high"]),
+            tuition_per_year=rng.randrange(0, 60000, 2500),
+        )
+        for i in range(1, 501)
+    ]
+
+
+def test_scores_match_python_scorer(universities):
+    profile = PROFILES[0]
+    matrix = recommendation_engine.CatalogMatrix(universities)
+    expected = [
+        university_ranking.score_university(
+            u.model_dump(),
+            countries={"germany", "united kingdom"},
+            budget=30000,
+            target_fields=university_ranking.field_tokens("Computer Science"),
+            degree="masters",
+        )
+        for u in universities
+    ]
+    assert matrix.score(profile) == pytest.approx(expected)
+
+
+@pytest.mark.parametrize("profile", PROFILES)
+def test_score_order_matches_rank_universities(universities, profile):
+    matrix = recommendation_engine.CatalogMatrix(universities)
+    scores = matrix.score(profile)
+    order = sorted(range(len(universities)), key=lambda i: (-scores[i], universities[i].tuition_per_year, universities[i].id))
+    ranked = university_ranking.rank_universities(profile, [u.model_dump() for u in universities], len(universities))
+    assert [universities[i].id for i in order] == [u["id"] for u in ranked]
+
+
+@pytest.mark.parametrize("budget", [0, 12000, 30000])
+def test_categories_match_categorize(universities, budget):
+    matrix = recommendation_engine.CatalogMatrix(universities)
+    codes = matrix.categories(budget)
+    expected = [
+        university_ranking.categorize(u.tuition_per_year, u.competition_level, budget) for u in universities
+    ]
+    assert [recommendation_engine.CATEGORIES[code] for code in codes] == expected
+
+
+@pytest.mark.parametrize("profile", PROFILES)
+def test_recommend_matches_rank_universities(universities, profile):
+    matrix = recommendation_engine.CatalogMatrix(universities)
+    exclude = {3, 50, 120}
+    result = matrix.recommend(profile, per_category=10, exclude_ids=exclude)
+    budget = profile["budget_per_year"]
+    for category in recommendation_engine.CATEGORIES:
+        pool = [
+            u.model_dump()
+            for u in universities
+            if university_ranking.categorize(u.tuition_per_year, u.competition_level, budget) == category
+        ]
+        expected = university_ranking.rank_universities(profile, pool, 10, exclude_ids=exclude)
+        assert [uni.id for uni, _ in result[category]] == [u["id"] for u in expected]
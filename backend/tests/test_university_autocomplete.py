@@ -0,0 +1,40 @@
+from university_autocomplete import AutocompleteIndex, normalize
+from conftest import make_university
+
+
+def _index():
+    return AutocompleteIndex(
+        [
+            make_university(1, name="University of Toronto", country="Canada", city="Toronto"),
+            make_university(2, name="Toronto Metropolitan University", country="Canada", city="Toronto"),
+            make_university(3, name="Technische Universität München", country="Germany", city="München"),
+            make_university(4, name="University of Tokyo", country="Japan", city="Tokyo"),
+        ]
+    )
+
+
+def test_normalize_strips_accents_and_punctuation():
+    assert normalize("  Technische Universität, München!") == "technische universitat munchen"
+
+
+def test_places_come_first_most_universities_first():
+    suggestions = _index().suggest("to")
+    assert suggestions[0] == {"type": "city", "label": "Toronto", "count": 2}
+    assert [s["university_id"] for s in suggestions if s["type"] == "university"] == [2, 4, 1]
+
+
+def test_matches_from_the_start_of_any_word():
+    ids = [s["university_id"] for s in _index().suggest("munchen") if s["type"] == "university"]
+    assert ids == [3]
+    assert _index().suggest("oronto") == []
+
+
+def test_each_university_once_and_limit():
+    suggestions = _index().suggest("university", limit=3)
+    ids = [s["university_id"] for s in suggestions if s["type"] == "university"]
+    assert len(ids) == len(set(ids))
+    assert len(suggestions) == 3
+
+
+def test_empty_query():
+    assert _index().suggest(" ,. ") == []
@@ -0,0 +1,117 @@
+import random
+
+import pytest
+
+import university_catalog
+from conftest import make_university
+
+
+def test_cursor_round_trip():
+    for key in [(0, 1), (58000, 12), (123456789, 987654321)]:
+        cursor = university_catalog.encode_cursor(key)
+        assert "=" not in cursor
+        assert university_catalog.decode_cursor(cursor) == key
+
+
+@pytest.mark.parametrize("cursor", ["", "not a cursor", "MTIz", "YTpi", "!!!"])
+def test_decode_cursor_rejects_malformed(cursor):
+    with pytest.raises(ValueError):
+        university_catalog.decode_cursor(cursor)
+
+
+def test_filter_matches_naive_scan(seed_catalog):
+    catalog = university_catalog.CatalogIndex(seed_catalog, version=1)
+    cases = [
+        {},
+        {"max_budget_per_year": 30000},
+        {"countries": ["UK", "Canada"]},
+        {"field_of_study": "computer"},
+        {"degree_level": "masters", "max_budget_per_year": 20000, "countries": ["Germany"]},
+    ]
+    for filters in cases:
+        expected = [
+            u.id
+            for u in seed_catalog
+            if (not filters.get("max_budget_per_year") or u.tuition_per_year <= filters["max_budget_per_year"])
+            and (not filters.get("countries") or u.country in filters["countries"])
+            and (not filters.get("field_of_study") or filters["field_of_study"] in u.field_of_study.lower())
+            and (not filters.get("degree_level") or u.degree_level == filters["degree_level"])
+        ]
+        assert [u.id for u in catalog.filter(**filters)] == sorted(expected)
+
+
+def test_pages_walk_the_tuition_order():
+    rng = random.Random(3)
+    universities = [
+        make_university(
+            i,
+            country=rng.choice(["Germany", "UK", "Canada"]),
+            tuition_per_year=rng.randrange(0, 50000, 2500),
+        )
+        for i in range(1, 301)
+    ]
+    catalog = university_catalog.CatalogIndex(universities, version=1)
+    for filters in [{}, {"countries": ["UK"]}, {"max_budget_per_year": 20000, "countries": ["Canada"]}]:
+        expected = [u.id for u in sorted(catalog.filter(**filters), key=lambda u: (u.tuition_per_year, u.id))]
+        seen, after = [], None
+        while True:
+            rows, after = catalog.page(limit=7, after=after, **filters)
+            assert len(rows) <= 7
+            seen += [u.id for u in rows]
+            if after is None:
+                break
+            # The cursor survives the trip through its string form
+            after = university_catalog.decode_cursor(university_catalog.encode_cursor(after))
+        assert seen == expected
+
+
+def test_changes_since():
+    catalog = university_catalog.CatalogIndex(
+        [make_university(1)], version=5, previous_version=4, changed_ids={1}
+    )
+    assert catalog.changes_since(5) == set()
+    assert catalog.changes_since(4) == {1}
+    assert catalog.changes_since(3) is None
+
+
+@pytest.fixture
+def stored(monkeypatch):
+    """A fake catalog table: get_catalog reads its version and rows from here."""
+    stored = {"version": 1, "loads": 0}
+
+    def load(db, previous=None):
+        stored["loads"] += 1
+        return university_catalog.CatalogIndex([make_university(1)], stored["version"])
+
+    monkeypatch.setattr(university_catalog, "_read_version", lambda db: stored["version"])
+    monkeypatch.setattr(university_catalog, "_load", load)
+    monkeypatch.setattr(university_catalog, "_catalog", None)
+    monkeypatch.setattr(university_catalog, "_last", None)
+    monkeypatch.setattr(university_catalog.get_settings(), "catalog_refresh_seconds", 0)
+    return stored
+
+
+def test_get_catalog_reloads_only_when_the_version_moves(stored):
+    first = university_catalog.get_catalog(None)
+    assert university_catalog.get_catalog(None) is first
+    assert stored["loads"] == 1
+    stored["version"] = 2
+    second = university_catalog.get_catalog(None)
+    assert second.version == 2
+    assert stored["loads"] == 2
+
+
+def test_load_racing_an_invalidation_is_not_kept(stored, monkeypatch):
+    university_catalog.get_catalog(None)
+    stored["version"] = 2
+    load = university_catalog._load
+
+    def racing_load(db, previous=None):
+        loaded = load(db, previous)
+        # The writer commits (and drops the copy) while this load runs
+        university_catalog._drop_local_copy()
+        return loaded
+
+    monkeypatch.setattr(university_catalog, "_load", racing_load)
+    assert university_catalog.get_catalog(None).version == 2
+    assert university_catalog._catalog is None
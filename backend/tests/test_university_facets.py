@@ -0,0 +1,105 @@
+import random
+from collections import Counter
+
+import university_catalog
+import university_facets
+from conftest import make_university
+
+
+def _catalog(universities, version=1, **changes):
+    return university_catalog.CatalogIndex(universities, version, **changes)
+
+
+def _random_universities(count, seed):
+    rng = random.Random(seed)
+    return [
+        make_university(
+            i,
+            country=rng.choice(["Germany", "UK", "Canada", "USA"]),
+            degree_level=rng.choice(["bachelors", "masters", "phd"]),
+            cost_level=rng.choice(["low", "medium", "high"]),
+            competition_level=rng.choice(["low", "medium", "high"]),
+            tuition_per_year=rng.randrange(0, 70000, 1000),
+        )
+        for i in range(1, count + 1)
+    ]
+
+
+def _naive(universities, max_budget_per_year=None, countries=None, degree_level=None):
+    """Each facet counted over the rows passing every filter but its own."""
+    def passes(uni, skip):
+        return (
+            (skip == "tuition" or not max_budget_per_year or uni.tuition_per_year <= max_budget_per_year)
+            and (skip == "country" or not countries or uni.country in countries)
+            and (skip == "degree_level" or not degree_level or uni.degree_level == degree_level)
+        )
+
+    values = {
+        "country": lambda u: u.country,
+        "degree_level": lambda u: u.degree_level,
+        "cost_level": lambda u: u.cost_level,
+        "competition_level": lambda u: u.competition_level,
+        "tuition": lambda u: university_facets.tuition_bucket(u.tuition_per_year),
+    }
+    result = {name: dict(Counter(value(u) for u in universities if passes(u, name))) for name, value in values.items()}
+    result["total"] = sum(1 for u in universities if passes(u, None))
+    return result
+
+
+def test_counts_match_naive_count():
+    universities = _random_universities(400, seed=1)
+    cube = university_facets.FacetCube()
+    cube.rebuild(_catalog(universities))
+    for filters in [
+        {},
+        {"max_budget_per_year": 25000},
+        {"countries": ["UK"]},
+        {"countries": ["UK", "Canada"], "degree_level": "masters", "max_budget_per_year": 40000},
+    ]:
+        assert cube.counts(**filters) == _naive(universities, **filters)
+
+
+def test_selected_facet_keeps_other_values():
+    universities = [
+        make_university(1, country="Germany"),
+        make_university(2, country="UK"),
+        make_university(3, country="UK", degree_level="phd"),
+    ]
+    cube = university_facets.FacetCube()
+    cube.rebuild(_catalog(universities))
+    counts = cube.counts(countries=["Germany"])
+    assert counts["country"] == {"Germany": 1, "UK": 2}
+    assert counts["degree_level"] == {"masters": 1}
+    assert counts["total"] == 1
+
+
+def test_sync_applies_only_changed_rows():
+    universities = _random_universities(200, seed=2)
+    cube = university_facets.FacetCube()
+    cube.rebuild(_catalog(universities, version=1))
+
+    changed = {u.id: u for u in universities}
+    changed[5] = make_university(5, country="Japan", tuition_per_year=99000)
+    del changed[6]
+    changed[201] = make_university(201, country="UK")
+    catalog = _catalog(list(changed.values()), version=2, previous_version=1, changed_ids={5, 6, 201})
+
+    rebuilt = []
+    cube.rebuild = lambda catalog: rebuilt.append(catalog)
+    cube.sync(catalog)
+    assert rebuilt == []
+    assert cube.version == 2
+
+    fresh = university_facets.FacetCube()
+    fresh.rebuild(catalog)
+    assert cube.cells == fresh.cells
+    assert cube.rows == fresh.rows
+
+
+def test_sync_rebuilds_when_changes_are_unknown():
+    cube = university_facets.FacetCube()
+    cube.rebuild(_catalog([make_university(1)], version=1))
+    catalog = _catalog([make_university(2, country="UK")], version=3, previous_version=2, changed_ids={2})
+    cube.sync(catalog)
+    assert set(cube.rows) == {2}
+    assert cube.version == 3
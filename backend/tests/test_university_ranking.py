@@ -0,0 +1,88 @@
+import llm
+from university_ranking import categorize, normalize_country, normalize_degree, rank_universities, score_university
+
+
+def _uni(university_id, **fields):
+    values = {
+        "id": university_id,
+        "name": f"University {university_id}",
+        "country": "Germany",
+        "field_of_study": "Computer Science",
+        "degree_level": "masters",
+        "tuition_per_year": 10000,
+    }
+    values.update(fields)
+    return values
+
+
+PROFILE = {
+    "preferred_countries": "Germany,UK",
+    "field_of_study": "Computer Science",
+    "intended_degree": "MS",
+    "budget_per_year": 20000,
+}
+
+
+def test_aliases():
+    assert normalize_country(" UK ") == "united kingdom"
+    assert normalize_country("Holland") == "netherlands"
+    assert normalize_country("Japan") == "japan"
+    assert normalize_degree("M.Sc") == "masters"
+    assert normalize_degree("Bachelor's") == "bachelors"
+
+
+def test_perfect_match_scores_one():
+    uni = _uni(1)
+    assert score_university(uni, {"germany"}, 20000, {"computer", "science"}, "masters") == 1.0
+
+
+def test_budget_tapers_to_zero_at_twice_the_budget():
+    scores = [
+        score_university(_uni(1, tuition_per_year=tuition), set(), 20000, set(), "")
+        for tuition in (15000, 20000, 30000, 40000, 60000)
+    ]
+    assert scores == sorted(scores, reverse=True)
+    assert scores[0] == scores[1]
+    assert scores[3] == scores[4]
+
+
+def test_semantic_similarity_beats_a_weaker_word_overlap():
+    uni = _uni(1, field_of_study="Artificial Intelligence")
+    literal = score_university(uni, set(), 0, {"machine", "learning"}, "")
+    semantic = score_university(uni, set(), 0, {"machine", "learning"}, "", field_similarity=0.8)
+    assert semantic > literal
+
+
+def test_rank_orders_by_relevance_then_tuition_then_id():
+    universities = [
+        _uni(1, country="USA"),
+        _uni(2, tuition_per_year=5000),
+        _uni(3, field_of_study="History"),
+        _uni(4),
+        _uni(5, country="United Kingdom"),
+    ]
+    ranked = rank_universities(PROFILE, universities, top_k=10)
+    assert [u["id"] for u in ranked] == [2, 4, 5, 3, 1]
+    assert [u["id"] for u in rank_universities(PROFILE, universities, top_k=2, exclude_ids={2})] == [4, 5]
+
+
+def test_categorize():
+    assert categorize(30000, "low", 20000) == "dream"
+    assert categorize(10000, "high", 20000) == "dream"
+    assert categorize(10000, "low", 20000) == "safe"
+    assert categorize(18000, "low", 20000) == "target"
+    assert categorize(10000, "medium", 20000) == "target"
+
+
+def test_prompt_lists_ranked_universities_within_the_token_budget():
+    ranked = rank_universities(PROFILE, [_uni(i, tuition_per_year=1000 * i) for i in range(1, 101)], top_k=100)
+    prompt = llm.build_system_prompt(
+        PROFILE, "discovering_universities", [], ranked, catalog_size=500, universities_token_budget=200, compact=False
+    )
+    listed = [line for line in prompt.splitlines() if line.startswith("- ID ")]
+    assert 0 < len(listed) < 100
+    assert sum(llm.estimate_tokens(line + "\n") for line in listed) <= 200
+    # Best matches first
+    assert listed[0].startswith("- ID 1:")
+    assert f"({len(listed)} of 500 in database)" in prompt
+    assert f"... and {500 - len(listed)} more." in prompt
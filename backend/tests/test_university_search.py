@@ -0,0 +1,61 @@
+import university_search
+from conftest import make_university
+
+
+def _index():
+    return university_search.SearchIndex(
+        [
+            make_university(1, name="Technical University of Munich", city="Munich", field_of_study="Computer Science"),
+            make_university(2, name="Munich Business School", city="Munich", field_of_study="Business Administration"),
+            make_university(3, name="University of Toronto", country="Canada", city="Toronto",
+                            field_of_study="Data Science", description="Strong links to Munich industry."),
+            make_university(4, name="University of Edinburgh", country="UK", city="Edinburgh",
+                            field_of_study="Artificial Intelligence"),
+        ]
+    )
+
+
+def _ids(hits):
+    return [university_id for university_id, _ in hits]
+
+
+def test_within_one_edit():
+    assert university_search._within_one_edit("munich", "munich")
+    assert university_search._within_one_edit("munich", "munch")  # deletion
+    assert university_search._within_one_edit("munich", "munichs")  # insertion
+    assert university_search._within_one_edit("munich", "munick")  # substitution
+    assert university_search._within_one_edit("munich", "mnuich")  # transposition
+    assert not university_search._within_one_edit("munich", "mnuihc")
+    assert not university_search._within_one_edit("munich", "mun")
+
+
+def test_name_match_outranks_description_match():
+    hits = _index().search("munich")
+    assert set(_ids(hits)) == {1, 2, 3}
+    assert _ids(hits)[-1] == 3
+    scores = [score for _, score in hits]
+    assert scores == sorted(scores, reverse=True)
+
+
+def test_every_token_must_match():
+    assert _ids(_index().search("munich business")) == [2]
+    assert _index().search("munich edinburgh") == []
+
+
+def test_prefix_and_typo_matches():
+    index = _index()
+    assert _ids(index.search("edin")) == [4]
+    assert _ids(index.search("edinbrugh")) == [4]
+    # An exact term beats a prefix match on the same token
+    exact = dict(index.search("toronto"))[3]
+    assert exact > dict(index.search("toront"))[3]
+
+
+def test_limit_and_tie_order():
+    hits = _index().search("university", limit=2)
+    assert len(hits) == 2
+    assert hits == sorted(hits, key=lambda item: (-item[1], item[0]))
+
+
+def test_empty_query():
+    assert _index().search("  ") == []
@@ -0,0 +1,44 @@
+import queue
+
+import pytest
+
+import university_catalog
+import user_recommendations
+
+
+@pytest.fixture
+def work_queue(monkeypatch):
+    """A fresh refresh queue (no worker consumes it)."""
+    work_queue = queue.Queue()
+    monkeypatch.setattr(user_recommendations, "_queue", work_queue)
+    monkeypatch.setattr(user_recommendations, "_pending", set())
+    return work_queue
+
+
+def _drain(work_queue) -> list:
+    items = []
+    while not work_queue.empty():
+        items.append(work_queue.get_nowait())
+    return items
+
+
+def test_inputs_key_tracks_only_scoring_inputs():
+    profile = {"field_of_study": "CS", "budget_per_year": 20000, "preferred_countries": ["Germany"]}
+    key = user_recommendations.inputs_key(profile)
+    assert user_recommendations.inputs_key({**profile, "gpa": 3.9, "sop_status": "ready"}) == key
+    assert user_recommendations.inputs_key({**profile, "budget_per_year": 30000}) != key
+
+
+def test_schedule_queues_each_user_once(work_queue):
+    for user_id in (1, 2, 1, 1):
+        user_recommendations.schedule(user_id)
+    assert _drain(work_queue) == [1, 2]
+
+
+def test_committed_catalog_writes_queue_a_catalog_refresh(work_queue, monkeypatch):
+    monkeypatch.setattr(university_catalog, "_change_listeners", [])
+    university_catalog.on_change(user_recommendations.catalog_changed)
+    university_catalog.on_change(user_recommendations.catalog_changed)
+    university_catalog._committed([3])
+    university_catalog._committed(None)
+    assert _drain(work_queue) == [user_recommendations.CATALOG_CHANGED]
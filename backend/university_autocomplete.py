@@ -0,0 +1,114 @@
+"""
+Type-ahead suggestions for /universities/autocomplete.
+
+Normalized keys live in sorted arrays, so a prefix is one binary search and
+the top N matches are the next N entries:
+
+- places: distinct cities and countries, with how many universities each has,
+- names: each university's full name, then every word-start suffix of it
+  ("toronto" finds "University of Toronto"), ranked after full-name matches.
+
+Rebuilt whenever the catalog is reloaded.
+"""
+
+import bisect
+import re
+import unicodedata
+from typing import Optional
+
+import university_catalog
+
+
+_NON_ALNUM = re.compile(r"[^a-z0-9]+")
+
+
+def normalize(text: str) -> str:
+    """Lowercase, strip accents and collapse punctuation to single spaces."""
+    decomposed = unicodedata.normalize("NFKD", text or "")
+    ascii_text = decomposed.encode("ascii", "ignore").decode("ascii")
+    return _NON_ALNUM.sub(" ", ascii_text.lower()).strip()
+
+
+def _prefix_range(keys: list[str], prefix: str) -> tuple[int, int]:
+    start = bisect.bisect_left(keys, prefix)
+    end = bisect.bisect_left(keys, prefix + "\uffff", lo=start)
+    return start, end
+
+
+class AutocompleteIndex:
+    def __init__(self, universities):
+        counts: dict[tuple[str, str], int] = {}
+        labels: dict[tuple[str, str], str] = {}
+        full: list[tuple[str, int]] = []
+        suffixes: list[tuple[str, int]] = []
+        self.by_id = {}
+
+        for uni in universities:
+            self.by_id[uni.id] = uni
+            for kind, value in (("city", uni.city), ("country", uni.country)):
+                key = normalize(value)
+                if key:
+                    counts[(key, kind)] = counts.get((key, kind), 0) + 1
+                    labels.setdefault((key, kind), value)
+            name = normalize(uni.name)
+            full.append((name, uni.id))
+            words = name.split(" ")
+            for i in range(1, len(words)):
+                suffixes.append((" ".join(words[i:]), uni.id))
+
+        places = sorted(counts)
+        self._place_keys = [key for key, _ in places]
+        self._places = [
+            {"type": kind, "label": labels[(key, kind)], "count": counts[(key, kind)]}
+            for key, kind in places
+        ]
+        full.sort()
+        suffixes.sort()
+        self._name_keys = [key for key, _ in full]
+        self._name_ids = [uid for _, uid in full]
+        self._suffix_keys = [key for key, _ in suffixes]
+        self._suffix_ids = [uid for _, uid in suffixes]
+
+    def suggest(self, query: str, limit: int = 8) -> list[dict]:
+        prefix = normalize(query)
+        if not prefix:
+            return []
+
+        start, end = _prefix_range(self._place_keys, prefix)
+        # Few places share a prefix; show the ones with the most universities first
+        places = sorted(self._places[start:end], key=lambda p: -p["count"])[: max(1, limit // 3)]
+        suggestions = [dict(p) for p in places]
+
+        seen: set[int] = set()
+        for keys, ids in ((self._name_keys, self._name_ids), (self._suffix_keys, self._suffix_ids)):
+            start, end = _prefix_range(keys, prefix)
+            for i in range(start, end):
+                if len(suggestions) >= limit:
+                    return suggestions
+                if ids[i] in seen:
+                    continue
+                seen.add(ids[i])
+                uni = self.by_id[ids[i]]
+                suggestions.append(
+                    {
+                        "type": "university",
+                        "label": uni.name,
+                        "university_id": uni.id,
+                        "country": uni.country,
+                        "city": uni.city,
+                    }
+                )
+        return suggestions
+
+
+_index: Optional[AutocompleteIndex] = None
+_indexed_catalog: Optional[university_catalog.CatalogIndex] = None
+
+
+def get_index(catalog: university_catalog.CatalogIndex) -> AutocompleteIndex:
+    """The autocomplete index for `catalog`, rebuilt when the catalog is reloaded."""
+    global _index, _indexed_catalog
+    if _indexed_catalog is not catalog:
+        _index = AutocompleteIndex(catalog.all())
+        _indexed_catalog = catalog
+    return _index
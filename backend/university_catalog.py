@@ -0,0 +1,357 @@
+"""
+Process-local, indexed copy of the university catalog.
+
+The catalog is small and read-mostly, so /universities answers filters from
+memory instead of Postgres:
+
+- hash indexes by country and by degree level,
+- an array sorted by (tuition, id) for budget range scans and keyset
+  pagination (bisect),
+- an inverted index of normalized field-of-study tokens.
+
+The copy carries the catalog version stored in `catalog_versions`. Catalog
+writes call invalidate(), which bumps that version in the writer's
+transaction, records which universities changed in `catalog_changes`, and
+drops the local copy once that transaction commits; other workers notice the
+new version within
+CATALOG_REFRESH_SECONDS and reload. A reloaded copy knows which ids changed
+since the copy it replaced, so derived aggregates (university_facets) can
+update just those rows. Counsellor context snapshots record the catalog
+version they were built from and rebuild when it moves; background work that
+should follow a write (user_recommendations) registers with on_change.
+"""
+
+import base64
+import binascii
+import bisect
+import itertools
+import re
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime
+from typing import Callable, Iterable, Optional
+
+from sqlalchemy import delete, event, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+
+import models
+import schemas
+import shortlist_categories
+from config import get_settings
+
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+
+
+def _tokens(text: str) -> list[str]:
+    return _TOKEN.findall((text or "").lower())
+
+
+class CatalogIndex:
+    """Immutable in-memory catalog with secondary indexes."""
+
+    def __init__(
+        self,
+        universities: Iterable[schemas.UniversityBase],
+        version: int,
+        previous_version: Optional[int] = None,
+        changed_ids: Optional[set[int]] = None,
+    ):
+        self.version = version
+        # Ids changed since the copy at `previous_version` (None: unknown)
+        self.previous_version = previous_version
+        self.changed_ids = changed_ids
+        self.loaded_at = time.time()
+        self.by_id: dict[int, schemas.UniversityBase] = {}
+        self.by_country: dict[str, set[int]] = defaultdict(set)
+        self.by_degree: dict[str, set[int]] = defaultdict(set)
+        self.field_postings: dict[str, set[int]] = defaultdict(set)
+        self._field_lower: dict[int, str] = {}
+
+        for uni in sorted(universities, key=lambda u: u.id):
+            self.by_id[uni.id] = uni
+            self.by_country[uni.country].add(uni.id)
+            self.by_degree[uni.degree_level].add(uni.id)
+            self._field_lower[uni.id] = uni.field_of_study.lower()
+            for token in _tokens(uni.field_of_study):
+                self.field_postings[token].add(uni.id)
+
+        by_tuition = sorted(self.by_id.values(), key=lambda u: (u.tuition_per_year, u.id))
+        self._tuition_keys = [u.tuition_per_year for u in by_tuition]
+        self._tuition_ids = [u.id for u in by_tuition]
+        self._tuition_order = [(u.tuition_per_year, u.id) for u in by_tuition]
+
+    def __len__(self) -> int:
+        return len(self.by_id)
+
+    def changes_since(self, version: int) -> Optional[set[int]]:
+        """Ids changed since catalog `version`, or None if they aren't known."""
+        if version == self.version:
+            return set()
+        if version == self.previous_version:
+            return self.changed_ids
+        return None
+
+    def get(self, university_id: int) -> Optional[schemas.UniversityBase]:
+        return self.by_id.get(university_id)
+
+    def all(self) -> list[schemas.UniversityBase]:
+        return list(self.by_id.values())
+
+    def _field_candidates(self, query: str) -> set[int]:
+        """Ids whose field contains `query` as a case-insensitive substring (like ILIKE '%q%')."""
+        needle = query.lower()
+        candidates: Optional[set[int]] = None
+        # Every token of the query is a substring of some token of a matching field
+        for token in _tokens(needle):
+            matching: set[int] = set()
+            for field_token, ids in self.field_postings.items():
+                if token in field_token:
+                    matching |= ids
+            candidates = matching if candidates is None else candidates & matching
+            if not candidates:
+                return set()
+        if candidates is None:
+            candidates = set(self.by_id)
+        return {i for i in candidates if needle in self._field_lower[i]}
+
+    def _matching_ids(
+        self,
+        max_budget_per_year: Optional[int] = None,
+        countries: Optional[list[str]] = None,
+        field_of_study: Optional[str] = None,
+        degree_level: Optional[str] = None,
+    ) -> Optional[set[int]]:
+        """Ids matching the filters, or None when there are no filters."""
+        sets: list[set[int]] = []
+        if max_budget_per_year:
+            end = bisect.bisect_right(self._tuition_keys, max_budget_per_year)
+            sets.append(set(self._tuition_ids[:end]))
+        if countries:
+            sets.append(set().union(*(self.by_country.get(c, set()) for c in countries)))
+        if degree_level:
+            sets.append(self.by_degree.get(degree_level, set()))
+        if field_of_study:
+            sets.append(self._field_candidates(field_of_study))
+
+        if not sets:
+            return None
+        # Intersect smallest first
+        sets.sort(key=len)
+        ids = set(sets[0])
+        for other in sets[1:]:
+            ids &= other
+            if not ids:
+                break
+        return ids
+
+    def filter(
+        self,
+        max_budget_per_year: Optional[int] = None,
+        countries: Optional[list[str]] = None,
+        field_of_study: Optional[str] = None,
+        degree_level: Optional[str] = None,
+    ) -> list[schemas.UniversityBase]:
+        """The same matches as the SQL filters on /universities, in id order."""
+        ids = self._matching_ids(max_budget_per_year, countries, field_of_study, degree_level)
+        if ids is None:
+            return self.all()
+        return [self.by_id[i] for i in sorted(ids)]
+
+    def page(
+        self,
+        limit: int,
+        after: Optional[tuple[int, int]] = None,
+        max_budget_per_year: Optional[int] = None,
+        countries: Optional[list[str]] = None,
+        field_of_study: Optional[str] = None,
+        degree_level: Optional[str] = None,
+    ) -> tuple[list[schemas.UniversityBase], Optional[tuple[int, int]]]:
+        """
+        One keyset page of the filtered catalog ordered by (tuition, id):
+        the rows after the `after` key, and the key to continue from (None
+        on the last page). Walks the tuition-sorted array from the cursor
+        instead of sorting the whole result.
+        """
+        ids = self._matching_ids(max_budget_per_year, countries, field_of_study, degree_level)
+        start = bisect.bisect_right(self._tuition_order, after) if after is not None else 0
+        end = len(self._tuition_order)
+        if max_budget_per_year:
+            end = bisect.bisect_right(self._tuition_keys, max_budget_per_year)
+
+        if ids is not None and len(ids) * 8 < end - start:
+            # Few matches: cheaper to order them than to walk past the misses
+            keys = sorted((self.by_id[i].tuition_per_year, i) for i in ids)
+            keys = keys[bisect.bisect_right(keys, after) if after is not None else 0:]
+            candidates = [university_id for _, university_id in keys[: limit + 1]]
+        else:
+            candidates = (
+                i for i in itertools.islice(self._tuition_ids, start, end) if ids is None or i in ids
+            )
+
+        rows: list[schemas.UniversityBase] = []
+        for university_id in candidates:
+            if len(rows) == limit:
+                last = rows[-1]
+                return rows, (last.tuition_per_year, last.id)
+            rows.append(self.by_id[university_id])
+        return rows, None
+
+
+def encode_cursor(key: tuple[int, int]) -> str:
+    """Opaque keyset cursor for a (tuition, id) key."""
+    return base64.urlsafe_b64encode(f"{key[0]}:{key[1]}".encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[int, int]:
+    """Inverse of encode_cursor; ValueError for anything malformed."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        tuition, university_id = raw.split(":")
+        return int(tuition), int(university_id)
+    except (binascii.Error, UnicodeDecodeError, ValueError) as exc:
+        raise ValueError("Invalid cursor") from exc
+
+
+_catalog: Optional[CatalogIndex] = None
+# The copy invalidate() dropped, to tell the next one what changed since
+_last: Optional[CatalogIndex] = None
+_checked_at = 0.0
+# Bumped by invalidate(), so a load that started before it is not installed
+_generation = 0
+# Only guards the swap of the module state above; never held across database
+# I/O, since get_catalog also runs inside AsyncSession.run_sync on the event loop
+_lock = threading.Lock()
+# Called with the written university ids (None: all) after a catalog write
+# in this worker commits; see on_change
+_change_listeners: list[Callable[[Optional[list[int]]], None]] = []
+
+
+def _read_version(db: Session) -> int:
+    row = db.get(models.CatalogVersion, 1)
+    return row.version if row else 0
+
+
+# How many versions of change records to keep
+CHANGE_HISTORY = 100
+
+
+def _changed_ids(db: Session, since: int, until: int) -> Optional[set[int]]:
+    """
+    Ids changed by versions (since, until], or None if one of them changed
+    the whole catalog or wasn't recorded.
+    """
+    rows = db.execute(
+        select(models.CatalogChange.version, models.CatalogChange.university_id).where(
+            models.CatalogChange.version > since,
+            models.CatalogChange.version <= until,
+        )
+    ).all()
+    if {version for version, _ in rows} != set(range(since + 1, until + 1)):
+        return None
+    if any(university_id is None for _, university_id in rows):
+        return None
+    return {university_id for _, university_id in rows}
+
+
+def _load(db: Session, previous: Optional[CatalogIndex] = None) -> CatalogIndex:
+    version = _read_version(db)
+    universities = [
+        schemas.UniversityBase.model_validate(u) for u in db.query(models.University).all()
+    ]
+    if previous is None or previous.version > version:
+        return CatalogIndex(universities, version)
+    return CatalogIndex(
+        universities,
+        version,
+        previous_version=previous.version,
+        changed_ids=_changed_ids(db, previous.version, version),
+    )
+
+
+def get_catalog(db: Session) -> CatalogIndex:
+    """
+    The current catalog index. Loads it on first use or after invalidation;
+    otherwise checks the stored version at most every CATALOG_REFRESH_SECONDS.
+    Concurrent callers may load at the same time; the first result wins.
+    """
+    global _catalog, _checked_at
+    with _lock:
+        catalog, last, checked_at, generation = _catalog, _last, _checked_at, _generation
+    now = time.monotonic()
+    if catalog is not None and now - checked_at < get_settings().catalog_refresh_seconds:
+        return catalog
+    if catalog is not None and _read_version(db) == catalog.version:
+        with _lock:
+            if _catalog is catalog:
+                _checked_at = now
+        return catalog
+
+    loaded = _load(db, catalog or last)
+    with _lock:
+        if _generation != generation:
+            # Invalidated while loading: serve what was read, but don't keep it
+            return loaded
+        if _catalog is None or _catalog is catalog or _catalog.version < loaded.version:
+            _catalog = loaded
+            _checked_at = now
+        return _catalog
+
+
+def invalidate(db: Session, university_ids: Optional[Iterable[int]] = None) -> None:
+    """
+    Call from catalog writes, before the commit (after a flush, so new rows
+    have ids): bumps the catalog version, records the written
+    `university_ids` (None: the whole catalog changed) and recategorizes the
+    shortlist links to them. This worker's copy is dropped when `db` commits.
+    """
+    stmt = pg_insert(models.CatalogVersion).values(id=1, version=1, updated_at=datetime.utcnow())
+    version = db.execute(
+        stmt.on_conflict_do_update(
+            index_elements=[models.CatalogVersion.id],
+            set_={
+                "version": models.CatalogVersion.version + 1,
+                "updated_at": stmt.excluded.updated_at,
+            },
+        ).returning(models.CatalogVersion.version)
+    ).scalar_one()
+    ids = sorted(set(university_ids)) if university_ids is not None else None
+    if ids != []:
+        db.execute(
+            models.CatalogChange.__table__.insert(),
+            [{"version": version, "university_id": university_id} for university_id in ids or [None]],
+        )
+    db.execute(delete(models.CatalogChange).where(models.CatalogChange.version <= version - CHANGE_HISTORY))
+    # Shortlist categories depend on tuition and competition level
+    shortlist_categories.recategorize_universities(db, ids)
+    # Dropped before the commit, a concurrent get_catalog could reload the
+    # old version and keep it as current until the next version check
+    event.listen(db, "after_commit", lambda session: _committed(ids), once=True)
+
+
+def on_change(listener: Callable[[Optional[list[int]]], None]) -> None:
+    """
+    Have `listener(university_ids)` called after each catalog write in this
+    worker commits. It runs in the writer's thread, so it should only queue
+    work.
+    """
+    if listener not in _change_listeners:
+        _change_listeners.append(listener)
+
+
+def _committed(university_ids: Optional[list[int]]) -> None:
+    _drop_local_copy()
+    for listener in _change_listeners:
+        listener(university_ids)
+
+
+def _drop_local_copy(session: Optional[Session] = None) -> None:
+    """Forget this worker's copy, so the next get_catalog reloads it."""
+    global _catalog, _last, _generation
+    with _lock:
+        if _catalog is not None:
+            _last = _catalog
+        _catalog = None
+        _generation += 1
@@ -0,0 +1,174 @@
+"""
+Facet counts for /universities/facets.
+
+The catalog is aggregated into cells keyed by (country, degree level, cost
+level, competition level, tuition bucket); each cell keeps its universities'
+tuitions sorted, so a budget filter is a bisect per cell. A request sums the
+matching cells instead of counting rows, so its cost depends on the number of
+distinct cells, not on the catalog size.
+
+When the catalog is reloaded, only the rows the catalog write recorded as
+changed (CatalogIndex.changes_since) are moved between cells; the cells are
+rebuilt only when the changes aren't known.
+
+A field-of-study filter can't be answered from the cells (it is a substring
+match), so with one the matching rows are counted directly.
+"""
+
+import bisect
+import threading
+from collections import defaultdict
+from typing import Any, Optional
+
+import university_catalog
+
+
+# (lower bound, upper bound exclusive or None, label)
+TUITION_BUCKETS = [
+    (0, 10000, "under_10k"),
+    (10000, 20000, "10k_20k"),
+    (20000, 35000, "20k_35k"),
+    (35000, 50000, "35k_50k"),
+    (50000, None, "over_50k"),
+]
+# Facets in cell key order
+FACETS = ("country", "degree_level", "cost_level", "competition_level", "tuition")
+
+
+def tuition_bucket(tuition: int) -> str:
+    for low, high, label in TUITION_BUCKETS:
+        if tuition >= low and (high is None or tuition < high):
+            return label
+    return TUITION_BUCKETS[0][2]
+
+
+def _value(value) -> str:
+    return getattr(value, "value", value)
+
+
+def _cell_key(uni) -> tuple[str, str, str, str, str]:
+    return (
+        uni.country,
+        uni.degree_level,
+        _value(uni.cost_level),
+        _value(uni.competition_level),
+        tuition_bucket(uni.tuition_per_year),
+    )
+
+
+class FacetCube:
+    def __init__(self):
+        # cell key -> sorted tuitions of the universities in it
+        self.cells: dict[tuple, list[int]] = defaultdict(list)
+        # university id -> (cell key, tuition), to undo a row on change
+        self.rows: dict[int, tuple[tuple, int]] = {}
+        # Catalog version the cells reflect
+        self.version: Optional[int] = None
+
+    def add(self, uni) -> None:
+        key = _cell_key(uni)
+        bisect.insort(self.cells[key], uni.tuition_per_year)
+        self.rows[uni.id] = (key, uni.tuition_per_year)
+
+    def remove(self, university_id: int) -> None:
+        key, tuition = self.rows.pop(university_id)
+        tuitions = self.cells[key]
+        del tuitions[bisect.bisect_left(tuitions, tuition)]
+        if not tuitions:
+            del self.cells[key]
+
+    def rebuild(self, catalog: university_catalog.CatalogIndex) -> None:
+        self.cells.clear()
+        self.rows.clear()
+        for uni in catalog.all():
+            self.add(uni)
+        self.version = catalog.version
+
+    def apply(self, catalog: university_catalog.CatalogIndex, university_ids: set[int]) -> None:
+        """Move just `university_ids` to their cells in `catalog` (dropping deleted ones)."""
+        for university_id in university_ids:
+            uni = catalog.get(university_id)
+            row = self.rows.get(university_id)
+            if uni is not None and row == (_cell_key(uni), uni.tuition_per_year):
+                continue
+            if row is not None:
+                self.remove(university_id)
+            if uni is not None:
+                self.add(uni)
+        self.version = catalog.version
+
+    def sync(self, catalog: university_catalog.CatalogIndex) -> None:
+        """Bring the cells up to `catalog`: its changed rows if known, else everything."""
+        changed = catalog.changes_since(self.version) if self.version is not None else None
+        if changed is None:
+            self.rebuild(catalog)
+        else:
+            self.apply(catalog, changed)
+
+    def counts(
+        self,
+        max_budget_per_year: Optional[int] = None,
+        countries: Optional[list[str]] = None,
+        degree_level: Optional[str] = None,
+    ) -> dict[str, Any]:
+        """
+        Counts per facet value. Each facet applies every filter except its
+        own, so the other values of a selected facet still show their counts.
+        """
+        country_filter = set(countries) if countries else None
+        facets: dict[str, dict[str, int]] = {name: defaultdict(int) for name in FACETS}
+        total = 0
+        for key, tuitions in self.cells.items():
+            in_budget = (
+                bisect.bisect_right(tuitions, max_budget_per_year)
+                if max_budget_per_year
+                else len(tuitions)
+            )
+            # Whether the cell passes each facet's own filter
+            passes = {
+                "country": country_filter is None or key[0] in country_filter,
+                "degree_level": degree_level is None or key[1] == degree_level,
+                "tuition": in_budget > 0,
+            }
+            for name, value in zip(FACETS, key):
+                if not all(ok for facet, ok in passes.items() if facet != name):
+                    continue
+                # The budget is the tuition facet's filter: it counts every tuition
+                count = len(tuitions) if name == "tuition" else in_budget
+                if count:
+                    facets[name][value] += count
+            if all(passes.values()):
+                total += in_budget
+        return {"total": total, **{name: dict(values) for name, values in facets.items()}}
+
+
+def _count_rows(universities, countries, degree_level, max_budget_per_year) -> dict[str, Any]:
+    """Facet counts straight from rows, same semantics as FacetCube.counts."""
+    cube = FacetCube()
+    for uni in universities:
+        cube.add(uni)
+    return cube.counts(max_budget_per_year, countries, degree_level)
+
+
+_cube = FacetCube()
+_cube_catalog: Optional[university_catalog.CatalogIndex] = None
+_lock = threading.Lock()
+
+
+def get_facets(
+    catalog: university_catalog.CatalogIndex,
+    max_budget_per_year: Optional[int] = None,
+    countries: Optional[list[str]] = None,
+    field_of_study: Optional[str] = None,
+    degree_level: Optional[str] = None,
+) -> dict[str, Any]:
+    global _cube_catalog
+    if field_of_study:
+        matching = catalog.filter(field_of_study=field_of_study)
+        return _count_rows(matching, countries, degree_level, max_budget_per_year)
+
+    with _lock:
+        if _cube_catalog is not catalog:
+            _cube.sync(catalog)
+            _cube_catalog = catalog
+        return _cube.counts(max_budget_per_year, countries, degree_level)
@@ -0,0 +1,165 @@
+"""
+Relevance ranking of catalog universities against a student profile.
+
+Used to pick which universities go into the counsellor prompt: instead of
+the first rows of the table, the programs that best match the student's
+countries, budget, field and degree.
+"""
+
+import re
+from typing import Iterable, Optional
+
+
+# Weights for each signal; a perfect match on everything scores 1.0
+COUNTRY_WEIGHT = 0.30
+BUDGET_WEIGHT = 0.30
+FIELD_WEIGHT = 0.25
+DEGREE_WEIGHT = 0.15
+
+# Onboarding and the seed data don't always spell countries the same way
+COUNTRY_ALIASES = {
+    "usa": "united states",
+    "us": "united states",
+    "united states of america": "united states",
+    "america": "united states",
+    "uk": "united kingdom",
+    "england": "united kingdom",
+    "great britain": "united kingdom",
+    "britain": "united kingdom",
+    "holland": "netherlands",
+    "the netherlands": "netherlands",
+}
+
+DEGREE_ALIASES = {
+    "ms": "masters",
+    "msc": "masters",
+    "ma": "masters",
+    "master": "masters",
+    "master's": "masters",
+    "masters": "masters",
+    "bs": "bachelors",
+    "bsc": "bachelors",
+    "ba": "bachelors",
+    "bachelor": "bachelors",
+    "bachelor's": "bachelors",
+    "bachelors": "bachelors",
+    "undergraduate": "bachelors",
+    "mba": "mba",
+    "phd": "phd",
+    "doctorate": "phd",
+}
+
+# Words that don't say anything about the subject
+_STOPWORDS = {"and", "of", "in", "the", "for", "studies", "&"}
+_TOKEN = re.compile(r"[a-z0-9]+")
+
+
+def normalize_country(country: str) -> str:
+    value = (country or "").strip().lower()
+    return COUNTRY_ALIASES.get(value, value)
+
+
+def normalize_degree(degree: str) -> str:
+    value = (degree or "").strip().lower().replace(".", "")
+    return DEGREE_ALIASES.get(value, value)
+
+
+def field_tokens(text: str) -> set[str]:
+    return {t for t in _TOKEN.findall((text or "").lower()) if t not in _STOPWORDS}
+
+
+def _budget_score(tuition: int, budget: int) -> float:
+    """1.0 within budget, tapering to 0 at twice the budget."""
+    if not budget:
+        return 0.5
+    if tuition <= budget:
+        return 1.0
+    return max(0.0, 1.0 - (tuition - budget) / budget)
+
+
+def score_university(
+    uni: dict,
+    countries: set[str],
+    budget: int,
+    target_fields: set[str],
+    degree: str,
+    field_similarity: float = 0.0,
+) -> float:
+    """
+    Relevance of one catalog entry to the profile, in [0, 1].
+    `field_similarity` (0-1, e.g. from semantic_index) counts when it beats
+    the literal field-word overlap.
+    """
+    score = 0.0
+    if not countries or normalize_country(uni.get("country", "")) in countries:
+        score += COUNTRY_WEIGHT
+    score += BUDGET_WEIGHT * _budget_score(uni.get("tuition_per_year") or 0, budget)
+
+    overlap = 0.0
+    uni_fields = field_tokens(uni.get("field_of_study", ""))
+    if target_fields and uni_fields:
+        overlap = len(target_fields & uni_fields) / len(uni_fields)
+    score += FIELD_WEIGHT * min(1.0, max(overlap, field_similarity))
+
+    if not degree or normalize_degree(uni.get("degree_level", "")) == degree:
+        score += DEGREE_WEIGHT
+    return score
+
+
+# Dream/target/safe thresholds, as multiples of the student's budget
+DREAM_TUITION_RATIO = 1.2
+SAFE_TUITION_RATIO = 0.8
+
+
+def categorize(tuition: int, competition_level: str, budget: int) -> str:
+    """
+    "dream", "target" or "safe" for a program, from its tuition against the
+    budget and its competition level ("low", "medium", "high").
+    """
+    if tuition > budget * DREAM_TUITION_RATIO or competition_level == "high":
+        return "dream"
+    if tuition < budget * SAFE_TUITION_RATIO and competition_level == "low":
+        return "safe"
+    return "target"
+
+
+def rank_universities(
+    profile: dict,
+    universities: Iterable[dict],
+    top_k: int,
+    exclude_ids: Optional[set[int]] = None,
+    field_similarity: Optional[dict[int, float]] = None,
+) -> list[dict]:
+    """
+    Return the `top_k` catalog entries most relevant to `profile`, best
+    first. Universities in `exclude_ids` (already shortlisted) are skipped.
+    `field_similarity` maps university ids to how close their program is to
+    the student's goal (see score_university).
+    """
+    countries = profile.get("preferred_countries") or []
+    if isinstance(countries, str):
+        countries = countries.split(",")
+    country_set = {normalize_country(c) for c in countries if c.strip()}
+
+    # The target field matters most; the current major is a weaker hint
+    target_fields = field_tokens(profile.get("field_of_study", "")) or field_tokens(
+        profile.get("degree_major", "")
+    )
+    degree = normalize_degree(profile.get("intended_degree", ""))
+    budget = profile.get("budget_per_year") or 0
+    exclude_ids = exclude_ids or set()
+    field_similarity = field_similarity or {}
+
+    scored = [
+        (
+            score_university(
+                u, country_set, budget, target_fields, degree, field_similarity.get(u.get("id"), 0.0)
+            ),
+            u,
+        )
+        for u in universities
+        if u.get("id") not in exclude_ids
+    ]
+    # Ties go to the cheaper program, then the lower id, so the order is stable
+    scored.sort(key=lambda pair: (-pair[0], pair[1].get("tuition_per_year") or 0, pair[1].get("id") or 0))
+    return [u for _, u in scored[:top_k]]
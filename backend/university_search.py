@@ -0,0 +1,266 @@
+"""
+Ranked full-text search over the university catalog.
+
+Two backends answer /universities/search:
+
+- "postgres": a weighted tsvector over name, field, city/country and
+  description, GIN-indexed (see models.SCHEMA_UPGRADES), with prefix
+  matching in the tsquery and a pg_trgm similarity fallback for typos.
+- "memory": an in-process inverted index with BM25 ranking, prefix
+  expansion and typo tolerance (edit distance 1, via a deletion index).
+  Used when UNIVERSITY_SEARCH_BACKEND=memory, off Postgres, or when the
+  Postgres query fails.
+
+Either way the hits are resolved through the in-memory catalog.
+"""
+
+import bisect
+import heapq
+import math
+import re
+from collections import defaultdict
+from typing import Iterable, Optional
+
+from sqlalchemy import text
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+
+import semantic_index
+import university_catalog
+from config import get_settings
+
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+
+# Field weights (BM25F-style): a hit in the name counts most
+FIELD_WEIGHTS = {
+    "name": 3.0,
+    "field_of_study": 2.0,
+    "city": 1.5,
+    "country": 1.5,
+    "description": 1.0,
+}
+# How much a prefix or typo match is worth relative to an exact term
+PREFIX_WEIGHT = 0.7
+FUZZY_WEIGHT = 0.5
+MIN_PREFIX_LENGTH = 2
+MIN_FUZZY_LENGTH = 4
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+
+def tokenize(text: str) -> list[str]:
+    return _TOKEN.findall((text or "").lower())
+
+
+def _deletes(term: str) -> set[str]:
+    """Every string one deletion away from `term`."""
+    return {term[:i] + term[i + 1:] for i in range(len(term))}
+
+
+def _within_one_edit(a: str, b: str) -> bool:
+    """Levenshtein distance <= 1, counting an adjacent transposition as one edit."""
+    if a == b:
+        return True
+    la, lb = len(a), len(b)
+    if abs(la - lb) > 1:
+        return False
+    if la == lb:
+        diffs = [i for i in range(la) if a[i] != b[i]]
+        if len(diffs) == 1:
+            return True
+        return (
+            len(diffs) == 2
+            and diffs[1] == diffs[0] + 1
+            and a[diffs[0]] == b[diffs[1]]
+            and a[diffs[1]] == b[diffs[0]]
+        )
+    if la > lb:
+        a, b = b, a
+    # b is one longer: skipping one character of b must give a
+    i = 0
+    while i < len(a) and a[i] == b[i]:
+        i += 1
+    return a[i:] == b[i + 1:]
+
+
+class SearchIndex:
+    """Inverted index over the catalog with BM25 scoring."""
+
+    def __init__(self, universities: Iterable):
+        # term -> {doc id: weighted term frequency, then BM25 score}
+        self.postings: dict[str, dict[int, float]] = defaultdict(dict)
+        self.doc_length: dict[int, float] = {}
+
+        for uni in universities:
+            length = 0.0
+            for field, weight in FIELD_WEIGHTS.items():
+                for term in tokenize(getattr(uni, field, "") or ""):
+                    doc_tf = self.postings[term]
+                    doc_tf[uni.id] = doc_tf.get(uni.id, 0.0) + weight
+                    length += weight
+            self.doc_length[uni.id] = length
+
+        self.doc_count = len(self.doc_length)
+        avg_length = (sum(self.doc_length.values()) / self.doc_count) if self.doc_count else 0.0
+        # Replace term frequencies by BM25 scores, so a query only sums and compares
+        for term, docs in self.postings.items():
+            idf = math.log(1 + (self.doc_count - len(docs) + 0.5) / (len(docs) + 0.5))
+            for doc_id, tf in docs.items():
+                norm = 1 - BM25_B + BM25_B * self.doc_length[doc_id] / (avg_length or 1.0)
+                docs[doc_id] = idf * tf * (BM25_K1 + 1) / (tf + BM25_K1 * norm)
+        # Sorted vocabulary for prefix ranges, deletion index for typos
+        self.vocabulary = sorted(self.postings)
+        self.deletion_index: dict[str, list[str]] = defaultdict(list)
+        for term in self.vocabulary:
+            if len(term) >= MIN_FUZZY_LENGTH - 1:
+                for deleted in _deletes(term):
+                    self.deletion_index[deleted].append(term)
+
+    def _prefix_terms(self, prefix: str) -> list[str]:
+        start = bisect.bisect_left(self.vocabulary, prefix)
+        end = bisect.bisect_left(self.vocabulary, prefix + "\uffff")
+        return self.vocabulary[start:end]
+
+    def _fuzzy_terms(self, token: str) -> set[str]:
+        candidates = set(self.deletion_index.get(token, ()))  # token is a term minus one char
+        for deleted in _deletes(token):
+            if deleted in self.postings:  # term is the token minus one char
+                candidates.add(deleted)
+            candidates.update(self.deletion_index.get(deleted, ()))  # substitutions, swaps
+        return {term for term in candidates if _within_one_edit(token, term)}
+
+    def expand(self, token: str) -> dict[str, float]:
+        """Index terms a query token matches, with the weight of each match."""
+        matches: dict[str, float] = {}
+        if token in self.postings:
+            matches[token] = 1.0
+        if len(token) >= MIN_PREFIX_LENGTH:
+            for term in self._prefix_terms(token):
+                matches.setdefault(term, PREFIX_WEIGHT)
+        if len(token) >= MIN_FUZZY_LENGTH:
+            for term in self._fuzzy_terms(token):
+                matches.setdefault(term, FUZZY_WEIGHT)
+        return matches
+
+    def _token_scores(self, token: str, candidates: Optional[dict[int, float]]) -> dict[int, float]:
+        """Best score per document over the terms `token` matches, limited to `candidates`."""
+        token_scores: dict[int, float] = {}
+        for term, weight in self.expand(token).items():
+            docs = self.postings[term]
+            if candidates is not None and len(candidates) < len(docs):
+                pairs = ((d, docs[d]) for d in candidates if d in docs)
+            else:
+                pairs = docs.items()
+            for doc_id, score in pairs:
+                score *= weight
+                # A token counts once per document: its best matching term
+                if score > token_scores.get(doc_id, 0.0):
+                    token_scores[doc_id] = score
+        return token_scores
+
+    def search(self, query: str, limit: int = 20) -> list[tuple[int, float]]:
+        """(university id, score) pairs, best first. Every query token must match."""
+        tokens = list(dict.fromkeys(tokenize(query)))
+        if not tokens:
+            return []
+        # Longest (usually rarest) token first, so later tokens only score surviving documents
+        tokens.sort(key=len, reverse=True)
+        scores: Optional[dict[int, float]] = None
+        for token in tokens:
+            token_scores = self._token_scores(token, scores)
+            if scores is None:
+                scores = token_scores
+            else:
+                scores = {d: s + token_scores[d] for d, s in scores.items() if d in token_scores}
+            if not scores:
+                return []
+        top = heapq.nsmallest(limit, scores.items(), key=lambda item: (-item[1], item[0]))
+        return top
+
+
+_index: Optional[SearchIndex] = None
+_indexed_catalog: Optional[university_catalog.CatalogIndex] = None
+
+
+def get_index(catalog: university_catalog.CatalogIndex) -> SearchIndex:
+    """The search index for `catalog`, rebuilt when the catalog is reloaded."""
+    global _index, _indexed_catalog
+    if _indexed_catalog is not catalog:
+        _index = SearchIndex(catalog.all())
+        _indexed_catalog = catalog
+    return _index
+
+
+# Keep in sync with ix_universities_search in models.SCHEMA_UPGRADES, or
+# Postgres won't use the index
+SEARCH_VECTOR_SQL = (
+    "setweight(to_tsvector('english', name), 'A') || "
+    "setweight(to_tsvector('english', field_of_study), 'B') || "
+    "setweight(to_tsvector('english', coalesce(city, '') || ' ' || country), 'C') || "
+    "setweight(to_tsvector('english', coalesce(description, '')), 'D')"
+)
+
+_TSQUERY_SQL = text(
+    f"""
+    SELECT id, ts_rank_cd({SEARCH_VECTOR_SQL}, query) AS score
+    FROM universities, to_tsquery('english', :tsquery) AS query
+    WHERE {SEARCH_VECTOR_SQL} @@ query
+    ORDER BY score DESC, id
+    LIMIT :limit
+    """
+)
+
+_TRIGRAM_SQL = text(
+    """
+    SELECT id, greatest(similarity(lower(name), :q), similarity(lower(field_of_study), :q)) AS score
+    FROM universities
+    WHERE lower(name) % :q OR lower(field_of_study) % :q
+    ORDER BY score DESC, id
+    LIMIT :limit
+    """
+)
+
+
+def _search_postgres(db: Session, query: str, limit: int) -> list[tuple[int, float]]:
+    tokens = tokenize(query)
+    if not tokens:
+        return []
+    # Every token must match; each also matches as a prefix
+    tsquery = " & ".join(f"{token}:*" for token in tokens)
+    with db.begin_nested():
+        rows = db.execute(_TSQUERY_SQL, {"tsquery": tsquery, "limit": limit}).all()
+        if not rows:
+            # No lexical match: fall back to trigram similarity for typos
+            rows = db.execute(_TRIGRAM_SQL, {"q": " ".join(tokens), "limit": limit}).all()
+    return [(row.id, float(row.score)) for row in rows]
+
+
+def search(
+    db: Session, query: str, limit: int = 20, semantic: bool = False
+) -> tuple[str, list[tuple[object, float]]]:
+    """
+    Search the catalog. Returns (backend used, [(university, score), ...])
+    with universities from the in-memory catalog, best first. `semantic`
+    ranks by meaning (cosine over the semantic index) instead of keywords.
+    """
+    catalog = university_catalog.get_catalog(db)
+    backend = "semantic" if semantic else get_settings().university_search_backend
+    hits = None
+    if semantic:
+        hits = semantic_index.get_index(catalog).top_k(query, limit)
+    elif backend == "postgres" and db.get_bind().dialect.name == "postgresql":
+        try:
+            hits = _search_postgres(db, query, limit)
+        except SQLAlchemyError:
+            hits = None
+    if hits is None:
+        backend = "memory"
+        hits = get_index(catalog).search(query, limit)
+
+    results = []
+    for university_id, score in hits:
+        university = catalog.get(university_id)
+        if university is not None:
+            results.append((university, score))
+    return backend, results
@@ -0,0 +1,265 @@
+"""
+"Students like you also shortlisted": item-to-item co-occurrence.
+
+`university_cooccurrences` is a sparse matrix over pairs of universities
+that appear on the same student's list. A shortlisted link counts 1 and a
+locked one 2, and a pair scores the product of its two link weights, summed
+over students. It is maintained incrementally: every shortlist, lock, unlock
+and remove calls record_change() in the same transaction, which adjusts the
+pairs with the student's other universities, and schedule() after the
+commit, which has a worker thread recompute the top-K neighbour lists of the
+universities involved. record_change locks the student's users row before
+reading their links, so concurrent changes to one list see each other; pair
+rows are always written in primary key order, so concurrent changes touching
+the same pairs queue up instead of deadlocking.
+
+Reads only touch `university_neighbours` by primary key, so /similar is
+O(K) and never scans `user_universities`. rebuild() recomputes everything
+from `user_universities` (run this module to backfill).
+"""
+
+import json
+import queue
+import threading
+from collections import defaultdict
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import case, delete, func, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session, aliased
+
+import models
+from config import get_settings
+from database import SessionLocal
+
+
+LINK_WEIGHTS = {
+    models.UniversityStatusEnum.SHORTLISTED: 1,
+    models.UniversityStatusEnum.LOCKED: 2,
+}
+
+
+def link_weight(status: Optional[models.UniversityStatusEnum]) -> int:
+    """A link's weight in the matrix; 0 for no link."""
+    return LINK_WEIGHTS.get(status, 0)
+
+
+def record_change(
+    db: Session, user_id: int, university_id: int, old_weight: int, new_weight: int
+) -> set[int]:
+    """
+    The user's link to `university_id` went from `old_weight` to
+    `new_weight` (see link_weight). Call before the commit; returns the
+    universities whose neighbour lists need refreshing, for schedule()
+    once the commit succeeds.
+    """
+    delta = new_weight - old_weight
+    if delta == 0:
+        return set()
+    # Serialize changes to one user's list: otherwise two transactions adding
+    # links concurrently each miss the other's uncommitted link, and their
+    # pair is never counted. NO KEY UPDATE, since the writers already hold the
+    # KEY SHARE lock their link's foreign key takes on the same row.
+    db.execute(
+        select(models.User.id).where(models.User.id == user_id).with_for_update(key_share=True)
+    )
+    others = db.execute(
+        select(models.UserUniversity.university_id, models.UserUniversity.status).where(
+            models.UserUniversity.user_id == user_id,
+            models.UserUniversity.university_id != university_id,
+        )
+    ).all()
+    if not others:
+        return set()
+
+    rows = []
+    for other_id, status in others:
+        amount = delta * link_weight(status)
+        rows.append({"university_id": university_id, "other_id": other_id, "weight": amount})
+        rows.append({"university_id": other_id, "other_id": university_id, "weight": amount})
+    # Lock pair rows in key order, like every other writer
+    rows.sort(key=lambda row: (row["university_id"], row["other_id"]))
+    stmt = pg_insert(models.UniversityCooccurrence).values(rows)
+    db.execute(
+        stmt.on_conflict_do_update(
+            index_elements=[
+                models.UniversityCooccurrence.university_id,
+                models.UniversityCooccurrence.other_id,
+            ],
+            set_={"weight": models.UniversityCooccurrence.weight + stmt.excluded.weight},
+        )
+    )
+    return {university_id} | {other_id for other_id, _ in others}
+
+
+def refresh_neighbours(db: Session, university_ids: set[int]) -> None:
+    """
+    Recompute the stored top-K lists of `university_ids` from the matrix and
+    drop their pairs that no longer score.
+    """
+    if not university_ids:
+        return
+    db.execute(
+        delete(models.UniversityCooccurrence).where(
+            models.UniversityCooccurrence.university_id.in_(university_ids),
+            models.UniversityCooccurrence.weight <= 0,
+        )
+    )
+    top_k = get_settings().similar_universities_top_k
+    rank = (
+        func.row_number()
+        .over(
+            partition_by=models.UniversityCooccurrence.university_id,
+            order_by=(
+                models.UniversityCooccurrence.weight.desc(),
+                models.UniversityCooccurrence.other_id,
+            ),
+        )
+        .label("rank")
+    )
+    ranked = (
+        select(
+            models.UniversityCooccurrence.university_id,
+            models.UniversityCooccurrence.other_id,
+            models.UniversityCooccurrence.weight,
+            rank,
+        )
+        .where(
+            models.UniversityCooccurrence.university_id.in_(university_ids),
+            models.UniversityCooccurrence.weight > 0,
+        )
+        .subquery()
+    )
+    neighbours: dict[int, list[list[int]]] = {university_id: [] for university_id in university_ids}
+    for row in db.execute(
+        select(ranked.c.university_id, ranked.c.other_id, ranked.c.weight)
+        .where(ranked.c.rank <= top_k)
+        .order_by(ranked.c.university_id, ranked.c.rank)
+    ):
+        neighbours[row.university_id].append([row.other_id, row.weight])
+
+    now = datetime.utcnow()
+    stmt = pg_insert(models.UniversityNeighbours).values(
+        [
+            {"university_id": university_id, "data": json.dumps(items), "updated_at": now}
+            for university_id, items in sorted(neighbours.items())
+        ]
+    )
+    db.execute(
+        stmt.on_conflict_do_update(
+            index_elements=[models.UniversityNeighbours.university_id],
+            set_={"data": stmt.excluded.data, "updated_at": stmt.excluded.updated_at},
+        )
+    )
+
+
+def neighbours(db: Session, university_id: int, limit: int) -> list[tuple[int, int]]:
+    """(university id, weight) pairs most often chosen alongside `university_id`."""
+    row = db.get(models.UniversityNeighbours, university_id)
+    if row is None:
+        return []
+    return [(other_id, weight) for other_id, weight in json.loads(row.data)[:limit]]
+
+
+def for_user(db: Session, university_ids: set[int], limit: int) -> list[tuple[int, int]]:
+    """
+    Universities most often chosen alongside any of `university_ids` (a
+    student's list), excluding those, as (university id, summed weight).
+    """
+    if not university_ids:
+        return []
+    scores: dict[int, int] = defaultdict(int)
+    for row in db.query(models.UniversityNeighbours).filter(
+        models.UniversityNeighbours.university_id.in_(university_ids)
+    ):
+        for other_id, weight in json.loads(row.data):
+            if other_id not in university_ids:
+                scores[other_id] += weight
+    return sorted(scores.items(), key=lambda item: (-item[1], item[0]))[:limit]
+
+
+def rebuild(db: Session) -> None:
+    """Recompute the matrix and every neighbour list from `user_universities`."""
+    a = aliased(models.UserUniversity)
+    b = aliased(models.UserUniversity)
+
+    def weight(link):
+        return case(
+            (link.status == models.UniversityStatusEnum.LOCKED, LINK_WEIGHTS[models.UniversityStatusEnum.LOCKED]),
+            else_=LINK_WEIGHTS[models.UniversityStatusEnum.SHORTLISTED],
+        )
+
+    db.execute(delete(models.UniversityNeighbours))
+    db.execute(delete(models.UniversityCooccurrence))
+    pairs = (
+        select(a.university_id, b.university_id, func.sum(weight(a) * weight(b)))
+        .join(b, (a.user_id == b.user_id) & (a.university_id != b.university_id))
+        .group_by(a.university_id, b.university_id)
+    )
+    db.execute(
+        models.UniversityCooccurrence.__table__.insert().from_select(
+            ["university_id", "other_id", "weight"], pairs
+        )
+    )
+    university_ids = set(
+        db.execute(select(models.UniversityCooccurrence.university_id).distinct()).scalars()
+    )
+    refresh_neighbours(db, university_ids)
+    db.commit()
+
+
+# -------------------------
+# Background worker
+# -------------------------
+
+_queue: "queue.Queue[Optional[set[int]]]" = queue.Queue()
+_worker: Optional[threading.Thread] = None
+
+
+def schedule(university_ids: set[int]) -> None:
+    """Queue a neighbour list refresh for `university_ids`."""
+    if university_ids:
+        _queue.put(set(university_ids))
+
+
+def _run() -> None:
+    while True:
+        university_ids = _queue.get()
+        if university_ids is None:
+            return
+        # Refresh everything queued so far in one pass
+        stop = False
+        while not _queue.empty():
+            more = _queue.get_nowait()
+            if more is None:
+                stop = True
+                break
+            university_ids |= more
+        try:
+            with SessionLocal() as db:
+                refresh_neighbours(db, university_ids)
+                db.commit()
+        except Exception as e:
+            print(f"Neighbour refresh failed for {len(university_ids)} universities: {e.__class__.__name__}")
+        if stop:
+            return
+
+
+def start_worker() -> None:
+    global _worker
+    if _worker is None or not _worker.is_alive():
+        _worker = threading.Thread(target=_run, name="university-similarity", daemon=True)
+        _worker.start()
+
+
+def stop_worker() -> None:
+    if _worker is not None and _worker.is_alive():
+        _queue.put(None)
+        _worker.join(timeout=5)
+
+
+if __name__ == "__main__":
+    with SessionLocal() as session:
+        rebuild(session)
+        print("Rebuilt university co-occurrence neighbours.")
@@ -0,0 +1,199 @@
+"""
+Materialized recommendation lists, refreshed in the background.
+
+Each user's best dream/target/safe programs live in `user_recommendations`,
+so /recommendations reads one row by primary key instead of scoring the
+catalog on the request path. A worker thread recomputes lists:
+
+- when the profile inputs that drive the scoring change
+  (create_or_update_profile marks the row stale and queues the user),
+- after a catalog write commits in this worker (university_catalog.on_change):
+  every list built from an older catalog version is queued.
+
+A list read while stale (or built from an older catalog, e.g. after a write
+in another worker) is still served, flagged, and queued as well.
+"""
+
+import hashlib
+import json
+import queue
+import threading
+from datetime import datetime
+from typing import Any, Optional, Union
+
+from sqlalchemy import select, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+
+import counsellor_context
+import models
+import recommendation_engine
+import university_catalog
+from database import SessionLocal
+
+
+# Stored per category; /recommendations can ask for up to this many
+STORED_PER_CATEGORY = 20
+
+# Profile fields the scoring depends on
+INPUT_FIELDS = ("intended_degree", "field_of_study", "degree_major", "preferred_countries", "budget_per_year")
+
+
+def inputs_key(profile: dict) -> str:
+    inputs = {field: profile.get(field) for field in INPUT_FIELDS}
+    return hashlib.sha256(json.dumps(inputs, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def refresh(db: Session, user_id: int) -> Optional[models.UserRecommendations]:
+    """Recompute and store the user's lists. None if the profile isn't complete."""
+    profile = db.query(models.Profile).filter(models.Profile.user_id == user_id).first()
+    if profile is None or not profile.is_complete:
+        return None
+    profile_dict = counsellor_context.profile_to_dict(profile)
+    catalog = university_catalog.get_catalog(db)
+    ranked = recommendation_engine.get_matrix(catalog).recommend(profile_dict, STORED_PER_CATEGORY)
+    data = json.dumps(
+        {category: [[uni.id, round(score, 4)] for uni, score in hits] for category, hits in ranked.items()}
+    )
+
+    values = dict(
+        user_id=user_id,
+        stale=False,
+        inputs_key=inputs_key(profile_dict),
+        catalog_version=catalog.version,
+        data=data,
+        updated_at=datetime.utcnow(),
+    )
+    stmt = pg_insert(models.UserRecommendations).values(**values)
+    db.execute(
+        stmt.on_conflict_do_update(
+            index_elements=[models.UserRecommendations.user_id],
+            set_={key: stmt.excluded[key] for key in values if key != "user_id"},
+        )
+    )
+    db.commit()
+    return db.get(models.UserRecommendations, user_id, populate_existing=True)
+
+
+def profile_changed(db: Session, user_id: int, profile: dict) -> bool:
+    """
+    Call from profile writes, before the commit: marks the user's lists stale
+    if the scoring inputs changed. True if a refresh should be scheduled
+    after committing (also when nothing is stored yet).
+    """
+    row = db.get(models.UserRecommendations, user_id)
+    if row is None:
+        return True
+    if row.inputs_key == inputs_key(profile):
+        return False
+    db.execute(
+        update(models.UserRecommendations)
+        .where(models.UserRecommendations.user_id == user_id)
+        .values(stale=True)
+        .execution_options(synchronize_session=False)
+    )
+    return True
+
+
+def read(
+    db: Session, user_id: int, limit: int, exclude_ids: set[int]
+) -> Optional[dict[str, Any]]:
+    """
+    The user's stored lists, resolved through the catalog: up to `limit`
+    programs per category, skipping `exclude_ids`, plus "stale" and
+    "updated_at". Computed inline only the first time.
+    """
+    catalog = university_catalog.get_catalog(db)
+    row = db.get(models.UserRecommendations, user_id)
+    if row is None:
+        row = refresh(db, user_id)
+        if row is None:
+            return None
+
+    stale = row.stale or row.catalog_version != catalog.version
+    if stale:
+        schedule(user_id)
+
+    result: dict[str, Any] = {"stale": stale, "updated_at": row.updated_at}
+    for category, hits in json.loads(row.data).items():
+        items = []
+        for university_id, score in hits:
+            university = catalog.get(university_id)
+            if university is None or university_id in exclude_ids:
+                continue
+            items.append((university, score))
+            if len(items) == limit:
+                break
+        result[category] = items
+    return result
+
+
+# -------------------------
+# Background worker
+# -------------------------
+
+# Queued instead of a user id: queue every list built from an older catalog
+CATALOG_CHANGED = "catalog"
+
+_queue: "queue.Queue[Union[int, str, None]]" = queue.Queue()
+_pending: set[Union[int, str]] = set()
+_pending_lock = threading.Lock()
+_worker: Optional[threading.Thread] = None
+
+
+def schedule(user_id: Union[int, str]) -> None:
+    """Queue a refresh unless one is already waiting for this user."""
+    with _pending_lock:
+        if user_id in _pending:
+            return
+        _pending.add(user_id)
+    _queue.put(user_id)
+
+
+def catalog_changed(university_ids: Optional[list[int]] = None) -> None:
+    """Catalog write listener: every list may rank differently now."""
+    schedule(CATALOG_CHANGED)
+
+
+def _outdated_users(db: Session) -> list[int]:
+    version = university_catalog.get_catalog(db).version
+    return list(
+        db.execute(
+            select(models.UserRecommendations.user_id)
+            .where(models.UserRecommendations.catalog_version < version)
+            .order_by(models.UserRecommendations.user_id)
+        ).scalars()
+    )
+
+
+def _run() -> None:
+    while True:
+        item = _queue.get()
+        if item is None:
+            return
+        # Changes from here on queue another refresh
+        with _pending_lock:
+            _pending.discard(item)
+        try:
+            with SessionLocal() as db:
+                if item == CATALOG_CHANGED:
+                    for user_id in _outdated_users(db):
+                        schedule(user_id)
+                else:
+                    refresh(db, item)
+        except Exception as e:
+            print(f"Recommendation refresh failed for {item}: {e.__class__.__name__}")
+
+
+def start_worker() -> None:
+    global _worker
+    university_catalog.on_change(catalog_changed)
+    if _worker is None or not _worker.is_alive():
+        _worker = threading.Thread(target=_run, name="user-recommendations", daemon=True)
+        _worker.start()
+
+
+def stop_worker() -> None:
+    if _worker is not None and _worker.is_alive():
+        _queue.put(None)
+        _worker.join(timeout=5)
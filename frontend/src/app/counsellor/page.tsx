@@ -283,7 +283,7 @@ function CounsellorContent() {
           });
 
           // Get AI response
-          const res = await fetch(`${API_BASE_URL}/counsellor`, {
+          const res = await fetch(`${API_BASE_URL}/counsellor?session_id=${currentSessionId}`, {
             method: "POST",
             headers: {
               "Content-Type": "application/json",
@@ -356,7 +356,7 @@ function CounsellorContent() {
         body: JSON.stringify({ role: "user", content: userMessage.content }),
       });
 
-      const res = await fetch(`${API_BASE_URL}/counsellor`, {
+      const res = await fetch(`${API_BASE_URL}/counsellor?session_id=${currentSessionId}`, {
         method: "POST",
         headers: {
           "Content-Type": "application/json",